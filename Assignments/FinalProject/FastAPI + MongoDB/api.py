@@ -1,14 +1,29 @@
 # Libraries for FastAPI
-from fastapi import FastAPI, Query, File, UploadFile, Path, HTTPException
+from fastapi import FastAPI, Query, File, UploadFile, Path, HTTPException, Request, BackgroundTasks
 from fastapi.middleware.cors import CORSMiddleware
-from fastapi.responses import RedirectResponse, Response,  FileResponse
-from mongoManager import MongoManager
+from fastapi.responses import RedirectResponse, Response,  FileResponse, StreamingResponse
+from mongoManager import MongoManager, pool_stats, plan_recorder, id_query
+from bsonResponse import BSONJSONResponse, dumps_bson
+from models import Person, Candy, CandyUpdate, UserRegistration, UserLogin, LocationData, ROUTE_FIELDS
+from asyncApi import router as async_router
+from imageBuild import IMAGE_SIZES, render_and_record
+from categoryStats import refresh_category_stats, category_id_for
+from queryCache import catalog_cache
+from priceIndex import catalog_price_index
+from searchIndex import catalog_search_index
+from suggestIndex import catalog_suggest_index
+from catalogIndex import refresh_indexes, fallback_response
+from conditionalGet import conditional, catalog_response
+from responseCompression import CompressionMiddleware
+from catalogFacets import facet_filter, candy_facets
+from starlette.concurrency import run_in_threadpool
 from pydantic import BaseModel
 from pymongo import MongoClient
 from pymongo.errors import PyMongoError  
-from typing import List
+from typing import List, Optional
 import base64
 import json
+import re
 import uvicorn
 import os
 from random import shuffle
@@ -25,37 +40,6 @@ def hash_password(password: str):
     return pwd_context.hash(password)
 
 
-class Person(BaseModel):
-    firstName: str
-    lastName: str 
-    email: str
-    password: str 
-
-class Candy(BaseModel):
-    name: str
-    category: str
-    description: str
-    price: float
-    quantity: int
-    image_url: str
-
-# Data model for user registration
-class UserRegistration(BaseModel):
-    first: str
-    last: str
-    email: str
-    password: str
-
-# Data model for user login
-class UserLogin(BaseModel):
-    email: str
-    password: str
-
-class LocationData(BaseModel):
-    email: str
-    latitude: float
-    longitude: float
-    timestamp: datetime = datetime.utcnow()
 
 
 
@@ -116,6 +100,7 @@ app = FastAPI(
         "name": "Apache 2.0",
         "url": "https://www.apache.org/licenses/LICENSE-2.0.html",
     },
+    default_response_class=BSONJSONResponse,
 )
 
 
@@ -128,6 +113,13 @@ app.add_middleware(
     allow_headers=["*"],
 )
 
+# gzip / brotli for clients that accept it; the stable catalog views are compressed
+# once per catalog version and kept in the query cache (see responseCompression.py)
+app.add_middleware(CompressionMiddleware, cache=catalog_cache)
+
+# Async (Motor backed) versions of the data routes, served under /async
+app.include_router(async_router)
+
 
 """
   _      ____   _____          _         _____ _                _____ _____ ______  _____
@@ -143,9 +135,22 @@ maybe you create your own country file, which would be great. But try to impleme
 organizes your ability to access a countries polygon data.
 """
 
-mm = MongoManager(db='candy_store')
+# Set CANDY_EXPLAIN=1 to record the query plan of every distinct query shape
+# (see /admin/query-plans). Each shape is explained once per worker.
+# Catalog reads are cached per worker in catalog_cache (see queryCache.py and
+# /admin/cache-stats); every write through mm invalidates the collection it touched.
+mm = MongoManager(db='candy_store', explain=os.environ.get("CANDY_EXPLAIN") == "1", query_cache=catalog_cache)
 mm.setDb('candy_store')
 
+# Collections the routes below read from. Their existence is checked once at
+# startup and every route gets its own cached, read-only handle through
+# mm.collection_for(...) instead of re-pointing the shared manager.
+COLLECTIONS = ["candies", "categories", "users", "locations", "images"]
+
+# In-memory candy indexes (None when turned off), started at startup and
+# refreshed after every candy write (see catalogIndex.py)
+CATALOG_INDEXES = [catalog_price_index, catalog_search_index, catalog_suggest_index]
+
 """
   _      ____   _____          _        __  __ ______ _______ _    _  ____  _____   _____
  | |    / __ \ / ____|   /\   | |      |  \/  |  ____|__   __| |  | |/ __ \|  __ \ / ____|
@@ -158,6 +163,76 @@ This is where methods you write to help with any routes written below should go.
 a module written that you include with statements above.  
 """
 
+NDJSON_MEDIA_TYPE = "application/x-ndjson"
+
+# Documents pulled from the cursor per round trip (and per chunk written) when streaming
+STREAM_BATCH_SIZE = 500
+
+
+def wants_ndjson(request: Request):
+    """True when the client asked for newline delimited JSON in its Accept header."""
+    return NDJSON_MEDIA_TYPE in request.headers.get("accept", "")
+
+
+def ndjson_response(documents, batch_size=STREAM_BATCH_SIZE):
+    """
+    Streams documents as newline delimited JSON, one document per line.
+    Lines are grouped into chunks of batch_size documents so memory stays flat
+    no matter how many documents the cursor produces.
+    """
+    def lines():
+        chunk = []
+        for doc in documents:
+            chunk.append(dumps_bson(doc))
+            if len(chunk) >= batch_size:
+                yield b"\n".join(chunk) + b"\n"
+                chunk = []
+        if chunk:
+            yield b"\n".join(chunk) + b"\n"
+
+    return StreamingResponse(lines(), media_type=NDJSON_MEDIA_TYPE)
+
+
+# Header carrying the continuation token for the next page of a paginated route
+NEXT_PAGE_HEADER = "X-Next-Page-Token"
+
+
+def fetch(handle, **kwargs):
+    """
+    Runs handle.get(**kwargs) for a paginated route, turning a malformed `after`
+    token into a 400. Documents come back raw (BSON values untouched) because
+    every data route encodes them with BSONJSONResponse.
+    """
+    kwargs.setdefault("raw", True)
+    try:
+        return handle.get(**kwargs)
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+
+
+def data_response(content, next_token=None):
+    """
+    Wraps route output in a BSONJSONResponse so FastAPI skips jsonable_encoder,
+    with the next page's token in the X-Next-Page-Token header when there is one.
+    """
+    headers = {NEXT_PAGE_HEADER: next_token} if next_token else None
+    return BSONJSONResponse(content, headers=headers)
+
+
+def affected_candies(candies, query):
+    """
+    _id and category_id of the candies matching query, read before a write so their
+    category stats and catalog index entries can be refreshed after it.
+    """
+    return candies.get(query=query, projection={"category_id": 1}, raw=True)["data"]
+
+
+def refresh_after_write(background_tasks, category_ids, candy_ids):
+    """Queues the category stats refresh and the catalog index refreshes of a write."""
+    background_tasks.add_task(refresh_category_stats, mm, category_ids)
+    background_tasks.add_task(refresh_indexes, CATALOG_INDEXES, candy_ids)
+
+
 
 
 """
@@ -173,6 +248,19 @@ a module written that you include with statements above.
 """
 
 
+@app.on_event("startup")
+def check_collections():
+    """
+    Resolve collection handles once per worker instead of once per request,
+    and create any index from INDEX_SPECS that is missing.
+    """
+    mm.ensure_collections(COLLECTIONS)
+    mm.ensure_indexes()
+    for index in CATALOG_INDEXES:
+        if index is not None:
+            index.start(mm.collection_for("candies"))
+
+
 @app.get("/")
 async def docs_redirect():
     """Api's base route that displays the information created above in the ApiInfo section."""
@@ -180,43 +268,68 @@ async def docs_redirect():
 
 
 @app.get("/candies")
-def list_all_candies():
+def list_all_candies(request: Request, limit: int = Query(0, ge=0), after: Optional[str] = None):
     """
     Retrieve a list of all candies available in the store.
+    Send `Accept: application/x-ndjson` to stream one candy per line instead.
+    Pass `limit` and then the returned `next_token` as `after` to page through the list.
+    Responses carry an ETag; send it back in If-None-Match to get a 304 while the list is unchanged.
     """
-    mm.setCollection('candies')
-    result = mm.get()
-    return result
+    candies = mm.collection_for("candies")
+
+    if wants_ndjson(request):
+        return ndjson_response(fetch(
+            candies, stream=True, batch_size=STREAM_BATCH_SIZE, limit=limit, after=after,
+            projection=ROUTE_FIELDS["/candies"]))
+
+    etag, cached = conditional(request, candies)
+    if cached:
+        return cached
+
+    result = fetch(candies, limit=limit, after=after, projection=ROUTE_FIELDS["/candies"], cache=True)
+    return catalog_response(data_response(result, result.get("next_token")), result, etag, candies)
 
 
 @app.get("/categories")
-def list_all_categories():
+def list_all_categories(request: Request):
     """
     Retrieve a list of all candies available in the store.
     """    
-    mm.setCollection("categories")
-    
+    handle = mm.collection_for("categories")
+    etag, cached = conditional(request, handle)
+    if cached:
+        return cached
+
     # Get all categories
-    categories = mm.get(filter = {"name"})
+    categories = handle.get(projection = ROUTE_FIELDS["/categories"], raw = True, cache = True)
     
     # Check if categories were found
     if categories:
-        return categories
+        return catalog_response(BSONJSONResponse(categories), categories, etag, handle)
     else:
         # Return 404 Not Found if no categories were found
         raise HTTPException(status_code=404, detail="Categories not found")
 
 
 @app.get("/candies/category/{category}")
-def candies_by_category(category: str):
+def candies_by_category(request: Request, category: str, limit: int = Query(0, ge=0), after: Optional[str] = None):
     """
     Search for candies based on a query string (e.g., name, category, flavor).
+    Pass `limit` and then the returned `next_token` as `after` to page through the list.
     """
-    mm.setCollection('candies')
-    result = mm.get(
+    candies = mm.collection_for("candies")
+    etag, cached = conditional(request, candies)
+    if cached:
+        return cached
+
+    result = fetch(
+        candies,
+        limit = limit,
+        after = after,
         query = {"category":category},
-        filter = {"_id":0,"name":1,"count":1})
-    return result
+        projection = ROUTE_FIELDS["/candies/category/{category}"],
+        cache = True)
+    return catalog_response(data_response(result, result.get("next_token")), result, etag, candies)
 
 
 @app.get("/candies/id/{id}")
@@ -224,45 +337,146 @@ def get_candy_by_id(id: str):
     """
     Get detailed information about a specific candy.
     """
-    mm.setCollection('candies')
-    result = mm.get(query = {"id": id},
-    filter={"id": 0, "name": 1, "price": 1, "category": 1})
-    return result
+    candies = mm.collection_for("candies")
+    result = candies.get(query = {"id": id},
+    projection = ROUTE_FIELDS["/candies/id/{id}"],
+    raw = True)
+    return BSONJSONResponse(result)
 
 
 @app.get("/candies/price")
-def candies_by_price_range(min_price: float = Query(..., gt=0), max_price: float = Query(..., gt=0)):
-    mm.setCollection("candies")
-    return mm.get(
-        query={"price": {"$gte": min_price, "$lte": max_price}},
-        filter={"_id": 0, "name": 1, "price": 1, "category": 1},
-    )
+def candies_by_price_range(request: Request, min_price: float = Query(..., gt=0), max_price: float = Query(..., gt=0),
+                           category_id: Optional[int] = None):
+    """
+    Candies priced between min_price and max_price (inclusive), cheapest first.
+    Pass `category_id` to only get candies of that category.
+    """
+    candies = mm.collection_for("candies")
+    etag, cached = conditional(request, candies)
+    if cached:
+        return cached
+
+    result = None
+    if catalog_price_index is not None:
+        result = catalog_price_index.price_range(min_price, max_price, category_id)
+    if result is None:
+        query = {"price": {"$gte": min_price, "$lte": max_price}}
+        if category_id is not None:
+            query["category_id"] = category_id
+        result = fallback_response(candies.get(
+            query=query,
+            projection=ROUTE_FIELDS["/candies/price"],
+            sort_criteria=[("price", 1)],
+            raw=True,
+            cache=True,
+        ))
+    return catalog_response(BSONJSONResponse(result), result, etag, candies)
+
+
+@app.get("/candies/search")
+def search_candies(request: Request, query: str = Query(..., min_length=1),
+                   limit: int = Query(20, ge=1, le=100), offset: int = Query(0, ge=0)):
+    """
+    Candies whose name or category matches query, best matches first. Misspelled
+    and partial words still match (see searchIndex.py).
+    """
+    candies = mm.collection_for("candies")
+    etag, cached = conditional(request, candies)
+    if cached:
+        return cached
+
+    result = None
+    if catalog_search_index is not None:
+        result = catalog_search_index.search(query, limit, offset)
+    if result is None:
+        matches = {"name": {"$regex": re.escape(query), "$options": "i"}}
+        found = candies.get(
+            query=matches,
+            projection=ROUTE_FIELDS["/candies/search"],
+            sort_criteria=[("name", 1)],
+            skip=offset,
+            limit=limit,
+            raw=True,
+            cache=True,
+        )
+        total = candies.collection.count_documents(matches) if found["success"] else None
+        result = fallback_response(found, result_size=total, limit=limit, offset=offset, matched={})
+    return catalog_response(BSONJSONResponse(result), result, etag, candies)
+
+
+@app.get("/candies/suggest")
+def suggest_candies(request: Request, prefix: str = Query(..., min_length=1), limit: int = Query(10, ge=1, le=50)):
+    """
+    Names (and ids) of candies completing prefix, for the search box: names starting
+    with it first, then names with a word starting with it (see suggestIndex.py).
+    """
+    candies = mm.collection_for("candies")
+    etag, cached = conditional(request, candies)
+    if cached:
+        return cached
+
+    result = None
+    if catalog_suggest_index is not None:
+        result = catalog_suggest_index.suggest(prefix, limit)
+    if result is None:
+        result = candies.get(
+            query={"name": {"$regex": "^" + re.escape(prefix), "$options": "i"}},
+            projection=ROUTE_FIELDS["/candies/suggest"],
+            sort_criteria=[("name", 1)],
+            limit=limit,
+            raw=True,
+            cache=True,
+        )
+    return catalog_response(BSONJSONResponse(result), result, etag, candies)
+
+
+@app.get("/candies/facets")
+def faceted_candies(request: Request, category_id: Optional[int] = None,
+                    min_price: Optional[float] = Query(None, ge=0), max_price: Optional[float] = Query(None, ge=0),
+                    limit: int = Query(20, ge=1, le=100), offset: int = Query(0, ge=0)):
+    """
+    A page of the candies matching the filter (cheapest first) together with the
+    number of matches per category and per price bucket, in one request.
+    """
+    candies = mm.collection_for("candies")
+    etag, cached = conditional(request, candies)
+    if cached:
+        return cached
+
+    result = candy_facets(candies, facet_filter(category_id, min_price, max_price), limit, offset)
+    return catalog_response(BSONJSONResponse(result), result, etag, candies)
 
 
 @app.get("/image")
 def get_image(img_id:str):
-    mm.setCollection('candies')
-    result = mm.get(query = {'id':img_id})
+    candies = mm.collection_for("candies")
+    result = candies.get(query = {'id':img_id})
 
     return FileResponse(result['data']['img_url'])
 
 
 # Route to fetch all users
 @app.get("/users")
-def get_all_users():
+def get_all_users(request: Request, limit: int = Query(0, ge=0), after: Optional[str] = None):
     """
     Retrieve all users from the database.
+    Send `Accept: application/x-ndjson` to stream one user per line instead.
+    Pass `limit` and then the X-Next-Page-Token header as `after` to page through the list.
     """
-    # Set the collection to the users collection
-    mm.setCollection("users")
-    
+    users = mm.collection_for("users")
+
+    if wants_ndjson(request):
+        return ndjson_response(fetch(
+            users, stream=True, batch_size=STREAM_BATCH_SIZE, limit=limit, after=after,
+            projection=ROUTE_FIELDS["/users"]))
+
     # Retrieve all users from the database
-    users_result = mm.get()
+    users_result = fetch(users, limit=limit, after=after, projection=ROUTE_FIELDS["/users"])
     
     if users_result.get("success", False):
         # Extract user data from the result
         users_data = users_result.get("data", [])
-        return users_data
+        return data_response(users_data, users_result.get("next_token"))
     else:
         # Handle error case
         return {"error": "Failed to retrieve users"}
@@ -273,15 +487,14 @@ def get_user_by_email(email: str):
     """
     Retrieve user details by email address.
     """
-    # Initialize the MongoDB manager and set the collection to users
-    mm = MongoManager(db="candy_store", collection="users")
+    users = mm.collection_for("users")
     
     # Find the user by email and omit sensitive information like the password
-    user = mm.find_user_by_email(email)
+    user = users.find_user_by_email(email)
 
     if user:
         # If user is found, return the user details
-        return user
+        return BSONJSONResponse(user)
     else:
         # Raise an HTTP exception if the user is not found
         raise HTTPException(status_code=404, detail="User not found")
@@ -289,14 +502,14 @@ def get_user_by_email(email: str):
 
 @app.post("/register")
 def register(user: UserRegistration):
-    mm = MongoManager(db='candy_store', collection='users')
-    return mm.register_user(user.dict())
+    users = mm.collection_for("users")
+    return users.register_user(user.dict())
 
 
 @app.post("/login")
 def login(user: UserLogin):
-    mm = MongoManager(db='candy_store', collection='users')
-    return mm.login_user(user.email, user.password)
+    users = mm.collection_for("users")
+    return users.login_user(user.email, user.password)
 
 
 @app.post("/post-location")
@@ -304,10 +517,10 @@ def post_location(location: LocationData):
     """
     Insert a new location into the 'locations' collection, ensuring only one location per user.
     """
-    mm.setCollection("locations")
+    locations = mm.collection_for("locations")
 
     # Insert or update location using 'upsert' to avoid multiple locations for the same user
-    result = mm.add_location(
+    result = locations.add_location(
         email=location.email,
         latitude=location.latitude,
         longitude=location.longitude,
@@ -325,14 +538,13 @@ def get_user_location_by_email(email: str):
     """
     Get all locations for a specific user by email.
     """
-    # Initialize the MongoDB manager and set the collection to locations
-    mm = MongoManager(db="candy_store", collection="locations")
+    locations = mm.collection_for("locations")
 
     # Retrieve location for the given email, sorted by timestamp
-    location = mm.find_user_location(email)
+    location = locations.find_user_location(email)
 
     if location:
-        return location
+        return BSONJSONResponse(location)
     else:
         raise HTTPException(status_code=404, detail="No locations found for this email")
 
@@ -342,30 +554,35 @@ def get_locations_within_radius(latitude: float, longitude: float, radius: float
     """
     Get all locations within a given radius from specified latitude and longitude.
     """
-    mm.setCollection("locations")
-
     # Retrieve all locations within the specified radius
-    locations = mm.get_locations_within_radius(latitude, longitude, radius)
+    locations = mm.collection_for("locations").get_locations_within_radius(latitude, longitude, radius)
 
     if locations:
-        return locations
+        return BSONJSONResponse(locations)
     else:
         raise HTTPException(status_code=404, detail="No locations found within the specified radius")
 
 
 @app.get("/locations")
-def get_all_locations():
+def get_all_locations(request: Request, limit: int = Query(0, ge=0), after: Optional[str] = None):
     """
     Retrieve all locations from the 'locations' collection.
+    Send `Accept: application/x-ndjson` to stream one location per line instead.
+    Pass `limit` and then the X-Next-Page-Token header as `after` to page through the list.
     """
-    mm.setCollection("locations")
+    locations = mm.collection_for("locations")
+
+    if wants_ndjson(request):
+        return ndjson_response(fetch(
+            locations, stream=True, batch_size=STREAM_BATCH_SIZE, limit=limit, after=after,
+            projection=ROUTE_FIELDS["/locations"]))
 
     # Get all locations
-    all_locations = mm.get()
+    all_locations = fetch(locations, limit=limit, after=after, projection=ROUTE_FIELDS["/locations"])
 
     if all_locations.get("success", False):
         users_locations = all_locations.get("data", [])
-        return users_locations
+        return data_response(users_locations, all_locations.get("next_token"))
     else:
         raise HTTPException(status_code=404, detail="No locations found")
 
@@ -383,11 +600,17 @@ async def upload_image(file: UploadFile = File(...)):
         file.file.close()  # Close the file stream after use
 
         # Save image metadata to MongoDB
-        mm.setCollection("images")
-        inserted_id = mm.save_image(file_path, {"filename": file.filename})
+        images = mm.collection_for("images")
+        inserted_id = images.save_image(file_path, {"filename": file.filename})
 
         if inserted_id:
-            return {"message": "Image uploaded successfully", "image_id": str(inserted_id)}
+            # Render the sized variants once now so serving them never transcodes
+            variants = await run_in_threadpool(render_and_record, images, inserted_id, file_path)
+            return {
+                "message": "Image uploaded successfully",
+                "image_id": str(inserted_id),
+                "sizes": sorted(variants) if variants else [],
+            }
         else:
             raise HTTPException(status_code=500, detail="Failed to save image in the database")
     except Exception as e:
@@ -395,15 +618,31 @@ async def upload_image(file: UploadFile = File(...)):
     
 
 @app.get("/images/{image_id}")
-async def get_image(image_id: str):
-    mm = MongoManager(db="candy_store", collection="images")
+async def get_image(image_id: str, size: Optional[str] = None):
+    """
+    Serve an uploaded image (by image id) or a catalog image (by candy id).
+    Pass `size` (thumb, medium or full) for a pre-rendered WebP variant; without it,
+    or if the image has not been rendered yet, the original file is returned.
+    """
+    if size is not None and size not in IMAGE_SIZES:
+        raise HTTPException(status_code=400, detail=f"size must be one of {', '.join(IMAGE_SIZES)}")
+
+    images = mm.collection_for("images")
 
     try:
-        image_metadata = mm.get_image(image_id)
+        image_metadata = images.get_image(image_id)
         
         if not image_metadata:
             raise HTTPException(status_code=404, detail="Image not found in the database.")
 
+        variant = image_metadata["variants"].get(size)
+        if variant and os.path.isfile(variant["path"]):
+            return FileResponse(
+                variant["path"],
+                media_type="image/webp",
+                headers={"Cache-Control": "public, max-age=86400"},
+            )
+
         file_path = image_metadata.get("path")
 
         if not file_path or not os.path.isfile(file_path):
@@ -417,14 +656,25 @@ async def get_image(image_id: str):
 
 
 @app.get("/images")
-def get_all_images():
-    mm.setCollection("images")
-    
+def get_all_images(request: Request, limit: int = Query(0, ge=0), after: Optional[str] = None):
+    """
+    Retrieve metadata for every uploaded image.
+    Send `Accept: application/x-ndjson` to stream one image per line instead.
+    Pass `limit` and then the X-Next-Page-Token header as `after` to page through the list.
+    """
+    images = mm.collection_for("images")
+
+    if wants_ndjson(request):
+        return ndjson_response(fetch(
+            images, stream=True, batch_size=STREAM_BATCH_SIZE, limit=limit, after=after,
+            projection=ROUTE_FIELDS["/images"]))
+
+    images_result = fetch(images, limit=limit, after=after, projection=ROUTE_FIELDS["/images"])
+
     try:
-        images_result = mm.get()
         if images_result.get("success", False):
             all_images = images_result.get("data", [])
-            return all_images
+            return data_response(all_images, images_result.get("next_token"))
         else:
             raise HTTPException(status_code=500, detail="Error retrieving images from the database.")
     except Exception as e:
@@ -432,40 +682,133 @@ def get_all_images():
    
 
 @app.post("/candies")
-def add_new_candy(candy: Candy):
+def add_new_candy(candy: Candy, background_tasks: BackgroundTasks):
     """
     Add a new candy to the store's inventory.
     """
-    mm.setCollection("candies")
+    candies = mm.collection_for("candies")
     candy_dict = candy.dict()
-    mm.post(candy_dict)
+    candy_dict["category_id"] = category_id_for(mm, candy.category)
+    candies.post(candy_dict)
+
+    # Re-aggregate just this candy's category once the response is sent
+    refresh_after_write(background_tasks, [candy_dict["category_id"]], [candy_dict["_id"]])
     return {"message": "Candy added successfully"}
 
 
 @app.put("/candies/{candy_id}")
-def update_candy_info(candy_id: str):
+def update_candy_info(candy_id: str, candy: CandyUpdate, background_tasks: BackgroundTasks):
     """
-    Update information about an existing candy.
+    Update information about an existing candy, by its _id or catalog id.
+    Only the fields sent in the body are changed.
     """
-    mm.setCollection('candies')
-    result = mm.update(query={"id": candy_id})
-    if result:
-        return {"message": "Candy info update failed"}
-    else:
-        return {"message": "Candy info updated successfully"} 
+    update = candy.dict(exclude_unset=True)
+    if not update:
+        raise HTTPException(status_code=400, detail="No fields to update")
+
+    candies = mm.collection_for("candies")
+    query = id_query(candy_id)
+    affected = affected_candies(candies, query)
+    category_ids = [found.get("category_id") for found in affected]
+
+    if "category" in update:
+        update["category_id"] = category_id_for(mm, update["category"])
+        category_ids.append(update["category_id"])
+
+    result = candies.put(query, update)
+    if result.matched_count == 0:
+        raise HTTPException(status_code=404, detail="Candy not found")
+
+    refresh_after_write(background_tasks, category_ids, [found["_id"] for found in affected])
+    return {"message": "Candy info updated successfully", "updated_count": result.modified_count}
 
 @app.delete("/candies/{candy_id}")
-def delete_candy(candy_id: str):
+def delete_candy(candy_id: str, background_tasks: BackgroundTasks):
     """
-    Remove a candy from the store's inventory by its ID.
+    Remove a candy from the store's inventory by its _id or catalog id.
     """
-    mm.setCollection("candies")
-    result = mm.delete(query={"_id": candy_id})
+    candies = mm.collection_for("candies")
+    query = id_query(candy_id)
+    affected = affected_candies(candies, query)
 
-    if result["success"]:
-        return {"message": "Candy deleted successfully"}
-    else:
-        raise HTTPException(status_code=404, detail=result["message"])        
+    result = candies.delete(query)
+
+    if result is None:
+        raise HTTPException(status_code=500, detail="Error deleting candy")
+    if result.deleted_count == 0:
+        raise HTTPException(status_code=404, detail="Candy not found")
+
+    refresh_after_write(
+        background_tasks, [found.get("category_id") for found in affected], [found["_id"] for found in affected])
+    return {"message": "Candy deleted successfully", "deleted_count": result.deleted_count}
+
+
+@app.get("/admin/pool-stats")
+def get_pool_stats():
+    """
+    Connection pool statistics for every shared MongoClient in this worker.
+    """
+    return pool_stats()
+
+
+@app.get("/admin/cache-stats")
+def get_cache_stats(reset: bool = False):
+    """
+    Hits, misses, evictions, size and per-collection generations of this worker's
+    catalog cache. Pass reset=true to zero the counters.
+    """
+    if catalog_cache is None:
+        return {"enabled": False}
+    stats = catalog_cache.stats()
+    if reset:
+        catalog_cache.reset_stats()
+    return {"enabled": True, **stats}
+
+
+@app.get("/admin/price-index")
+def get_price_index_stats():
+    """
+    Size, age and lookup/fallback counters of the in-memory price index
+    (CANDY_PRICE_INDEX=1, see priceIndex.py).
+    """
+    if catalog_price_index is None:
+        return {"enabled": False}
+    return {"enabled": True, **catalog_price_index.stats()}
+
+
+@app.get("/admin/search-index")
+def get_search_index_stats():
+    """
+    Size, age and lookup/fallback counters of the in-memory search index
+    (on unless CANDY_SEARCH_INDEX=0, see searchIndex.py).
+    """
+    if catalog_search_index is None:
+        return {"enabled": False}
+    return {"enabled": True, **catalog_search_index.stats()}
+
+
+@app.get("/admin/suggest-index")
+def get_suggest_index_stats():
+    """
+    Size, age and lookup/fallback counters of the in-memory autocomplete index
+    (on unless CANDY_SUGGEST_INDEX=0, see suggestIndex.py).
+    """
+    if catalog_suggest_index is None:
+        return {"enabled": False}
+    return {"enabled": True, **catalog_suggest_index.stats()}
+
+
+@app.get("/admin/query-plans")
+def get_query_plans(reset: bool = False):
+    """
+    Winning plan, keys examined, docs examined and docs returned for every query
+    shape explained in this worker (COLLSCANs first). Needs CANDY_EXPLAIN=1.
+    Pass reset=true to clear the recorded plans so shapes are explained again.
+    """
+    plans = plan_recorder.stats()
+    if reset:
+        plan_recorder.reset()
+    return plans
 
 
 """
@@ -0,0 +1,307 @@
+"""
+Async versions of the data routes in api.py.
+
+Every route here awaits AsyncMongoManager directly on the event loop instead of
+running on FastAPI's threadpool. They are mounted under /async by api.py so both
+paths can be compared side by side (see benchmarks/bench_async.py).
+"""
+
+from fastapi import APIRouter, Query, HTTPException, BackgroundTasks, Request
+from typing import Optional
+import re
+from asyncMongoManager import AsyncMongoManager, async_pool_stats
+from models import Candy, CandyUpdate, LocationData, ROUTE_FIELDS
+from mongoManager import id_query
+from categoryStats import refresh_category_stats_async, category_id_for_async
+from bsonResponse import BSONJSONResponse
+from queryCache import catalog_cache
+from priceIndex import catalog_price_index
+from searchIndex import catalog_search_index
+from suggestIndex import catalog_suggest_index
+from catalogIndex import refresh_indexes, fallback_response
+from conditionalGet import conditional, catalog_response
+from catalogFacets import facet_filter, candy_facets_async
+
+
+router = APIRouter(prefix="/async", tags=["async"])
+
+amm = AsyncMongoManager(db="candy_store", query_cache=catalog_cache)
+
+# Same in-memory indexes as api.py, which starts them
+CATALOG_INDEXES = [catalog_price_index, catalog_search_index, catalog_suggest_index]
+
+
+@router.get("/candies")
+async def list_all_candies(request: Request):
+    """
+    Retrieve a list of all candies available in the store.
+    """
+    candies = amm.collection_for("candies")
+    etag, cached = conditional(request, candies)
+    if cached:
+        return cached
+
+    result = await candies.get(projection=ROUTE_FIELDS["/candies"], raw=True, cache=True)
+    return catalog_response(BSONJSONResponse(result), result, etag, candies)
+
+
+@router.get("/categories")
+async def list_all_categories(request: Request):
+    """
+    Retrieve a list of all candy categories.
+    """
+    handle = amm.collection_for("categories")
+    etag, cached = conditional(request, handle)
+    if cached:
+        return cached
+
+    categories = await handle.get(projection=ROUTE_FIELDS["/categories"], raw=True, cache=True)
+
+    if categories:
+        return catalog_response(BSONJSONResponse(categories), categories, etag, handle)
+    else:
+        raise HTTPException(status_code=404, detail="Categories not found")
+
+
+@router.get("/candies/category/{category}")
+async def candies_by_category(request: Request, category: str):
+    """
+    Retrieve every candy in a category.
+    """
+    candies = amm.collection_for("candies")
+    etag, cached = conditional(request, candies)
+    if cached:
+        return cached
+
+    result = await candies.get(
+        query={"category": category},
+        projection=ROUTE_FIELDS["/candies/category/{category}"],
+        raw=True,
+        cache=True,
+    )
+    return catalog_response(BSONJSONResponse(result), result, etag, candies)
+
+
+@router.get("/candies/id/{id}")
+async def get_candy_by_id(id: str):
+    """
+    Get detailed information about a specific candy.
+    """
+    return BSONJSONResponse(await amm.collection_for("candies").get(
+        query={"id": id},
+        projection=ROUTE_FIELDS["/candies/id/{id}"],
+        raw=True,
+    ))
+
+
+@router.get("/candies/price")
+async def candies_by_price_range(request: Request, min_price: float = Query(..., gt=0), max_price: float = Query(..., gt=0),
+                                 category_id: Optional[int] = None):
+    candies = amm.collection_for("candies")
+    etag, cached = conditional(request, candies)
+    if cached:
+        return cached
+
+    result = None
+    if catalog_price_index is not None:
+        result = catalog_price_index.price_range(min_price, max_price, category_id)
+    if result is None:
+        query = {"price": {"$gte": min_price, "$lte": max_price}}
+        if category_id is not None:
+            query["category_id"] = category_id
+        result = fallback_response(await candies.get(
+            query=query,
+            projection=ROUTE_FIELDS["/candies/price"],
+            sort_criteria=[("price", 1)],
+            raw=True,
+            cache=True,
+        ))
+    return catalog_response(BSONJSONResponse(result), result, etag, candies)
+
+
+@router.get("/candies/search")
+async def search_candies(request: Request, query: str = Query(..., min_length=1),
+                         limit: int = Query(20, ge=1, le=100), offset: int = Query(0, ge=0)):
+    candies = amm.collection_for("candies")
+    etag, cached = conditional(request, candies)
+    if cached:
+        return cached
+
+    result = None
+    if catalog_search_index is not None:
+        result = catalog_search_index.search(query, limit, offset)
+    if result is None:
+        matches = {"name": {"$regex": re.escape(query), "$options": "i"}}
+        found = await candies.get(
+            query=matches,
+            projection=ROUTE_FIELDS["/candies/search"],
+            sort_criteria=[("name", 1)],
+            skip=offset,
+            limit=limit,
+            raw=True,
+            cache=True,
+        )
+        total = (await candies.collection.count_documents(matches)) if found["success"] else None
+        result = fallback_response(found, result_size=total, limit=limit, offset=offset, matched={})
+    return catalog_response(BSONJSONResponse(result), result, etag, candies)
+
+
+@router.get("/candies/suggest")
+async def suggest_candies(request: Request, prefix: str = Query(..., min_length=1), limit: int = Query(10, ge=1, le=50)):
+    candies = amm.collection_for("candies")
+    etag, cached = conditional(request, candies)
+    if cached:
+        return cached
+
+    result = None
+    if catalog_suggest_index is not None:
+        result = catalog_suggest_index.suggest(prefix, limit)
+    if result is None:
+        result = await candies.get(
+            query={"name": {"$regex": "^" + re.escape(prefix), "$options": "i"}},
+            projection=ROUTE_FIELDS["/candies/suggest"],
+            sort_criteria=[("name", 1)],
+            limit=limit,
+            raw=True,
+            cache=True,
+        )
+    return catalog_response(BSONJSONResponse(result), result, etag, candies)
+
+
+@router.get("/candies/facets")
+async def faceted_candies(request: Request, category_id: Optional[int] = None,
+                          min_price: Optional[float] = Query(None, ge=0), max_price: Optional[float] = Query(None, ge=0),
+                          limit: int = Query(20, ge=1, le=100), offset: int = Query(0, ge=0)):
+    candies = amm.collection_for("candies")
+    etag, cached = conditional(request, candies)
+    if cached:
+        return cached
+
+    result = await candy_facets_async(candies, facet_filter(category_id, min_price, max_price), limit, offset)
+    return catalog_response(BSONJSONResponse(result), result, etag, candies)
+
+
+@router.get("/users")
+async def get_all_users():
+    """
+    Retrieve all users from the database.
+    """
+    users_result = await amm.collection_for("users").get(projection=ROUTE_FIELDS["/users"], raw=True)
+
+    if users_result.get("success", False):
+        return BSONJSONResponse(users_result.get("data", []))
+    else:
+        return {"error": "Failed to retrieve users"}
+
+
+@router.post("/post-location")
+async def post_location(location: LocationData):
+    """
+    Insert or update the location of a user, keeping one location per user.
+    """
+    result = await amm.collection_for("locations").add_location(
+        email=location.email,
+        latitude=location.latitude,
+        longitude=location.longitude,
+        timestamp=location.timestamp
+    )
+
+    if result.get("success", False):
+        return {"message": "Location posted successfully"}
+    else:
+        raise HTTPException(status_code=500, detail=result.get("message", "Failed to post location"))
+
+
+@router.get("/locations/within-radius")
+async def get_locations_within_radius(latitude: float, longitude: float, radius: float):
+    """
+    Get all locations within a given radius from specified latitude and longitude.
+    """
+    locations = await amm.collection_for("locations").get_locations_within_radius(latitude, longitude, radius)
+
+    if locations:
+        return BSONJSONResponse(locations)
+    else:
+        raise HTTPException(status_code=404, detail="No locations found within the specified radius")
+
+
+@router.get("/locations")
+async def get_all_locations():
+    """
+    Retrieve all locations from the 'locations' collection.
+    """
+    all_locations = await amm.collection_for("locations").get(projection=ROUTE_FIELDS["/locations"], raw=True)
+
+    if all_locations.get("success", False):
+        return BSONJSONResponse(all_locations.get("data", []))
+    else:
+        raise HTTPException(status_code=404, detail="No locations found")
+
+
+@router.post("/candies")
+async def add_new_candy(candy: Candy, background_tasks: BackgroundTasks):
+    """
+    Add a new candy to the store's inventory.
+    """
+    candy_dict = candy.dict()
+    candy_dict["category_id"] = await category_id_for_async(amm, candy.category)
+    await amm.collection_for("candies").post(candy_dict)
+
+    background_tasks.add_task(refresh_category_stats_async, amm, [candy_dict["category_id"]])
+    background_tasks.add_task(refresh_indexes, CATALOG_INDEXES, [candy_dict["_id"]])
+    return {"message": "Candy added successfully"}
+
+
+@router.put("/candies/{candy_id}")
+async def update_candy_info(candy_id: str, candy: CandyUpdate, background_tasks: BackgroundTasks):
+    """
+    Update information about an existing candy, by its _id or catalog id.
+    Only the fields sent in the body are changed.
+    """
+    update = candy.dict(exclude_unset=True)
+    if not update:
+        raise HTTPException(status_code=400, detail="No fields to update")
+
+    candies = amm.collection_for("candies")
+    query = id_query(candy_id)
+    found = (await candies.get(query=query, projection={"category_id": 1}, raw=True))["data"]
+    category_ids = [candy.get("category_id") for candy in found]
+
+    if "category" in update:
+        update["category_id"] = await category_id_for_async(amm, update["category"])
+        category_ids.append(update["category_id"])
+
+    result = await candies.put(query, update)
+    if result.matched_count == 0:
+        raise HTTPException(status_code=404, detail="Candy not found")
+
+    background_tasks.add_task(refresh_category_stats_async, amm, category_ids)
+    background_tasks.add_task(refresh_indexes, CATALOG_INDEXES, [candy["_id"] for candy in found])
+    return {"message": "Candy info updated successfully", "updated_count": result.modified_count}
+
+
+@router.delete("/candies/{candy_id}")
+async def delete_candy(candy_id: str, background_tasks: BackgroundTasks):
+    """
+    Remove a candy from the store's inventory by its _id or catalog id.
+    """
+    candies = amm.collection_for("candies")
+    query = id_query(candy_id)
+    found = (await candies.get(query=query, projection={"category_id": 1}, raw=True))["data"]
+
+    result = await candies.delete(query=query)
+
+    if result["success"]:
+        background_tasks.add_task(refresh_category_stats_async, amm, [candy.get("category_id") for candy in found])
+        background_tasks.add_task(refresh_indexes, CATALOG_INDEXES, [candy["_id"] for candy in found])
+        return {"message": "Candy deleted successfully", "deleted_count": result["deleted_count"]}
+    else:
+        raise HTTPException(status_code=404, detail=result["message"])
+
+
+@router.get("/admin/pool-stats")
+async def get_pool_stats():
+    """
+    Connection pool statistics for every shared Motor client in this worker.
+    """
+    return async_pool_stats()
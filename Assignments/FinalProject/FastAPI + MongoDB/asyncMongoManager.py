@@ -0,0 +1,269 @@
+"""
+Async counterpart of MongoManager backed by Motor.
+
+The sync manager runs on FastAPI's threadpool, which caps the number of in-flight
+database calls per worker. AsyncMongoManager mirrors the data methods of
+MongoManager (get, get2, post, put, delete, add_location and
+get_locations_within_radius) as coroutines so the routes in asyncApi.py can await
+them directly on the event loop.
+"""
+
+from motor.motor_asyncio import AsyncIOMotorClient
+from pymongo.errors import PyMongoError
+from bson import ObjectId
+from threading import Lock
+import copy
+
+from mongoManager import ClientRegistry, build_connection_url, pool_options_from, normalize_projection, convert_document
+from queryCache import invalidates_cache_async
+
+
+# Motor clients cannot be shared with sync code, so they get their own registry.
+# Motor does not connect until the first awaited operation, so there is no ping.
+async_client_registry = ClientRegistry(client_class=AsyncIOMotorClient, ping=False)
+
+
+def async_pool_stats():
+    """Shortcut for async_client_registry.stats()."""
+    return async_client_registry.stats()
+
+
+class AsyncMongoManager:
+    def __init__(self, **kwargs):
+        self.connection_url = build_connection_url(**kwargs)
+
+        # Borrow the process-wide Motor client for this url
+        self.client = async_client_registry.get(self.connection_url, **pool_options_from(kwargs))
+
+        db = kwargs.get("db", None)
+        collection = kwargs.get("collection", None)
+
+        self.db = self.client[db] if db is not None else None
+        self.collection = None
+        if self.db is not None and collection is not None:
+            self.collection = self.db[collection]
+
+        # Optional queryCache.QueryCache for get(cache=True); writes invalidate it
+        self.query_cache = kwargs.get("query_cache", None)
+
+        # Cache of handles handed out by collection_for()
+        self._handles = {}
+        self._handles_lock = Lock()
+
+
+    def __str__(self):
+        name = self.collection.name if self.collection is not None else None
+        return f"url: {self.connection_url} coll: {name}"
+
+
+    def collection_for(self, collection_name):
+        """
+        Returns an AsyncMongoManager bound to a single collection.
+        Same contract as MongoManager.collection_for.
+
+        :param collection_name: Name of the collection to bind to.
+        :return: AsyncMongoManager bound to collection_name.
+        """
+        if self.db is None:
+            raise ValueError("No database selected.")
+
+        with self._handles_lock:
+            handle = self._handles.get(collection_name)
+            if handle is None:
+                handle = copy.copy(self)
+                handle.collection = self.db[collection_name]
+                self._handles[collection_name] = handle
+        return handle
+
+
+    async def get(self, **kwargs):
+        """
+        Retrieves documents from the collection based on the provided criteria.
+
+        :param query: Dictionary for filtering documents.
+        :param projection: Fields to return, as a {field: 0|1} dict or a set/list of names.
+        :param skip: Integer specifying the number of documents to skip.
+        :param limit: Integer specifying the maximum number of documents to return.
+        :param sort_criteria: List of tuples specifying field and direction to sort by.
+        :param raw: If True, leave ObjectIds and other BSON values as they are.
+        :param cache: Serve the result from (and store it in) the manager's query_cache.
+        :return: The keyword arguments plus success, result_size and data.
+        """
+        query = kwargs.get("query", {})
+        projection = normalize_projection(kwargs.get("projection", kwargs.get("filter")))
+        sort_criteria = kwargs.get("sort_criteria", [("_id", 1)])
+        skip = kwargs.get("skip", 0)
+        limit = kwargs.get("limit", 0)
+        raw = kwargs.get("raw", False)
+
+        cache = self.query_cache if kwargs.get("cache", False) else None
+        if cache is not None:
+            find_args = {"query": query, "projection": projection, "strip": set(), "sort": sort_criteria,
+                         "skip": skip, "limit": limit, "raw": raw}
+            key = cache.key(self.collection.full_name, find_args, kind="async find")
+            cached = cache.get(key)
+            if cached is not None:
+                kwargs["success"] = True
+                kwargs["result_size"] = len(cached["data"])
+                kwargs["data"] = cached["data"]
+                return kwargs
+
+        try:
+            cursor = self.collection.find(query, projection).sort(sort_criteria).skip(skip).limit(limit)
+
+            data = []
+            async for item in cursor:
+                data.append(item if raw else convert_document(item))
+
+            kwargs["success"] = True
+            kwargs["result_size"] = len(data)
+            kwargs["data"] = data
+
+            if cache is not None:
+                cache.put(key, {"data": data})
+            return kwargs
+        except PyMongoError as e:
+            kwargs["success"] = False
+            kwargs["error"] = str(e)
+            return kwargs
+
+
+    async def get2(self, **kwargs):
+        """
+        Retrieves raw documents from the collection based on the provided criteria.
+
+        :param query: Dictionary for filtering documents using MongoDB query syntax.
+        :param projection: Fields to return, as a {field: 0|1} dict or a set/list of names.
+        :param skip: Integer specifying the number of documents to skip.
+        :param limit: Integer specifying the maximum number of documents to return.
+        :param sort_criteria: List of tuples specifying field and direction to sort by.
+        :return: Dictionary with the operation's success status, result size, and data.
+        """
+        query = kwargs.get("query", {})
+        projection = normalize_projection(kwargs.get("projection", kwargs.get("filter")))
+        skip = kwargs.get("skip", 0)
+        limit = kwargs.get("limit", 10)
+        sort_criteria = kwargs.get("sort_criteria", [("_id", 1)])
+
+        try:
+            cursor = self.collection.find(query, projection).sort(sort_criteria).skip(skip).limit(limit)
+            result_list = await cursor.to_list(length=None)
+            return {
+                "success": True,
+                "result_size": len(result_list),
+                "data": result_list
+            }
+        except PyMongoError as e:
+            return {
+                "success": False,
+                "error": str(e)
+            }
+
+
+    @invalidates_cache_async
+    async def post(self, document):
+        """Inserts a single document (dict) or many documents (list)."""
+        if isinstance(document, dict):
+            return await self.collection.insert_one(document)
+        elif isinstance(document, list):
+            return await self.collection.insert_many(document)
+
+
+    @invalidates_cache_async
+    async def put(self, filter_query, update_data, upsert=False):
+        """
+        Updates documents in the collection based on the provided criteria.
+
+        :param filter_query: Dictionary specifying the criteria to select documents to update.
+        :param update_data: Dictionary of update operators, or plain fields to $set.
+        :param upsert: If True, a new document is inserted if no document matches the filter_query.
+        :return: Result of the update operation.
+        """
+        if self.collection is None:
+            raise ValueError("Collection not set.")
+
+        if not any(key.startswith("$") for key in update_data.keys()):
+            update_data = {"$set": update_data}
+
+        return await self.collection.update_many(filter_query, update_data, upsert=upsert)
+
+
+    @invalidates_cache_async
+    async def delete(self, query):
+        """
+        Deletes every document matching query, like MongoManager.delete() (a catalog
+        id can be listed in several categories). A string _id is converted to an ObjectId.
+
+        :return: Dictionary with success status, message and deleted_count.
+        """
+        if self.collection is None:
+            raise ValueError("Collection not set.")
+
+        try:
+            if '_id' in query and isinstance(query['_id'], str):
+                if ObjectId.is_valid(query['_id']):
+                    query['_id'] = ObjectId(query['_id'])
+                else:
+                    return {"success": False, "message": "Invalid ObjectId format."}
+
+            result = await self.collection.delete_many(query)
+
+            if result.deleted_count > 0:
+                return {"success": True, "message": "Documents deleted successfully.", "deleted_count": result.deleted_count}
+            else:
+                return {"success": False, "message": "Document not found."}
+        except PyMongoError as e:
+            return {"success": False, "message": f"Error occurred while deleting data: {str(e)}"}
+
+
+    async def add_location(self, email, latitude, longitude, timestamp):
+        """
+        Inserts or updates a user's location in the 'locations' collection as a GeoJSON point.
+        Runs on the locations handle whatever handle it is called on, so the write
+        and the cache invalidation hit the same collection.
+
+        :return: Dictionary indicating the success status of the operation.
+        """
+        return await self.collection_for("locations")._upsert_location(email, latitude, longitude, timestamp)
+
+
+    @invalidates_cache_async
+    async def _upsert_location(self, email, latitude, longitude, timestamp):
+        """add_location() on the locations handle: self.collection is the collection written."""
+        try:
+            locations = self.collection
+
+            location_data = {
+                "email": email,
+                "location": {"type": "Point", "coordinates": [longitude, latitude]},
+                "timestamp": timestamp
+            }
+
+            # Use upsert to ensure only one location per user
+            await locations.update_one({"email": email}, {"$set": location_data}, upsert=True)
+
+            return {"success": True, "message": "Location data updated successfully"}
+        except PyMongoError as e:
+            return {"success": False, "message": f"Error updating location data: {str(e)}"}
+
+
+    async def get_locations_within_radius(self, latitude, longitude, radius):
+        """
+        Returns every location within radius meters of (latitude, longitude), or None on error.
+        """
+        try:
+            # The 2dsphere index comes from INDEX_SPECS (MongoManager.ensure_indexes at startup)
+            query = {
+                "location": {
+                    "$geoWithin": {
+                        "$centerSphere": [
+                            [longitude, latitude],
+                            radius / 6378100.0  # Convert radius to radians (Earth's radius)
+                        ]
+                    }
+                }
+            }
+            return await self.collection.find(query).to_list(length=None)
+        except PyMongoError as e:
+            print(f"Error retrieving locations within radius: {e}")
+            return None
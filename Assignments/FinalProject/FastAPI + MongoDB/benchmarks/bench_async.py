@@ -0,0 +1,142 @@
+"""
+Compares throughput of the sync routes in api.py against the async (Motor backed)
+routes mounted under /async, at a high number of concurrent connections.
+
+Start the api first (for example `gunicorn -c gunicorn_conf.py api:app` or
+`uvicorn api:app --port 8084`), then run:
+
+    python benchmarks/bench_async.py http://localhost:8084 --connections 500 --seconds 20
+
+Each connection is a keep-alive HTTP/1.1 socket that issues requests back to back,
+so the number of in-flight requests equals --connections. Only the standard library
+is used so the numbers are not skewed by a client library.
+"""
+
+import argparse
+import asyncio
+import statistics
+import time
+from urllib.parse import urlsplit
+
+
+# Route pairs that hit the database: (label, sync path, async path)
+ROUTES = [
+    ("price range", "/candies/price?min_price=10&max_price=20", "/async/candies/price?min_price=10&max_price=20"),
+    ("by category", "/candies/category/Retro", "/async/candies/category/Retro"),
+    ("by id", "/candies/id/42689216610491", "/async/candies/id/42689216610491"),
+]
+
+
+async def read_response(reader):
+    """Reads one HTTP/1.1 response and returns its status code."""
+    status_line = await reader.readline()
+    if not status_line:
+        raise ConnectionError("connection closed")
+    status = int(status_line.split()[1])
+
+    length = None
+    chunked = False
+    while True:
+        line = await reader.readline()
+        if line in (b"\r\n", b"\n", b""):
+            break
+        name, _, value = line.decode("latin-1").partition(":")
+        name = name.strip().lower()
+        if name == "content-length":
+            length = int(value.strip())
+        elif name == "transfer-encoding" and "chunked" in value.lower():
+            chunked = True
+
+    if chunked:
+        while True:
+            size = int((await reader.readline()).strip(), 16)
+            await reader.readexactly(size + 2)
+            if size == 0:
+                break
+    elif length:
+        await reader.readexactly(length)
+
+    return status
+
+
+async def connection_worker(host, port, path, deadline, latencies, errors):
+    """Sends requests for path on one keep-alive connection until deadline."""
+    request = f"GET {path} HTTP/1.1\r\nHost: {host}\r\nAccept: application/json\r\n\r\n".encode()
+    reader = writer = None
+
+    while time.perf_counter() < deadline:
+        try:
+            if writer is None:
+                reader, writer = await asyncio.open_connection(host, port)
+            start = time.perf_counter()
+            writer.write(request)
+            status = await read_response(reader)
+            if status >= 400:
+                errors.append(status)
+            else:
+                latencies.append(time.perf_counter() - start)
+        except (OSError, ConnectionError, asyncio.IncompleteReadError, ValueError) as e:
+            errors.append(type(e).__name__)
+            if writer is not None:
+                writer.close()
+            reader = writer = None
+
+    if writer is not None:
+        writer.close()
+
+
+async def run(base_url, path, connections, seconds):
+    """Runs one load test and returns a summary dict."""
+    parts = urlsplit(base_url)
+    host = parts.hostname
+    port = parts.port or 80
+
+    latencies = []
+    errors = []
+    deadline = time.perf_counter() + seconds
+    started = time.perf_counter()
+
+    await asyncio.gather(*[
+        connection_worker(host, port, path, deadline, latencies, errors)
+        for _ in range(connections)
+    ])
+
+    elapsed = time.perf_counter() - started
+    latencies.sort()
+
+    def pct(p):
+        if not latencies:
+            return float("nan")
+        return latencies[min(len(latencies) - 1, int(len(latencies) * p))] * 1000
+
+    return {
+        "requests": len(latencies),
+        "errors": len(errors),
+        "req_per_sec": len(latencies) / elapsed,
+        "p50_ms": pct(0.50),
+        "p99_ms": pct(0.99),
+        "mean_ms": statistics.fmean(latencies) * 1000 if latencies else float("nan"),
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("base_url", nargs="?", default="http://localhost:8084")
+    parser.add_argument("--connections", type=int, default=500)
+    parser.add_argument("--seconds", type=float, default=20)
+    args = parser.parse_args()
+
+    print(f"{args.connections} connections, {args.seconds}s per run against {args.base_url}\n")
+    print(f"{'route':<14}{'path':<7}{'req/s':>10}{'p50 ms':>10}{'p99 ms':>10}{'errors':>9}")
+
+    for label, sync_path, async_path in ROUTES:
+        for kind, path in (("sync", sync_path), ("async", async_path)):
+            result = asyncio.run(run(args.base_url, path, args.connections, args.seconds))
+            print(
+                f"{label:<14}{kind:<7}{result['req_per_sec']:>10.1f}"
+                f"{result['p50_ms']:>10.1f}{result['p99_ms']:>10.1f}{result['errors']:>9}"
+            )
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,81 @@
+"""
+Compares the old response path (MongoManager's per-document ObjectId conversion,
+then FastAPI's jsonable_encoder, then JSONResponse) with BSONJSONResponse rendering
+the raw documents in one pass, on 1k, 10k and 100k synthetic candy documents that
+carry nested ObjectIds, datetimes and Decimal128 prices. No database is needed.
+
+    python benchmarks/bench_encoder.py
+"""
+
+import os
+import sys
+import time
+from datetime import datetime, timedelta
+from decimal import Decimal
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from bson import ObjectId, Decimal128
+from fastapi.encoders import jsonable_encoder
+from fastapi.responses import JSONResponse
+
+from bsonResponse import BSONJSONResponse
+from mongoManager import convert_document
+
+
+SIZES = [1_000, 10_000, 100_000]
+REPEAT = 3
+
+
+def make_documents(n):
+    """Candy shaped documents with the BSON types the locations/images collections carry."""
+    now = datetime(2024, 4, 23, 10, 0, 0)
+    return [
+        {
+            "_id": ObjectId(),
+            "id": str(42688376078523 + i),
+            "name": f"Sour Patch Kids Assorted - {i % 10}lb",
+            "price": 28.99 + (i % 50),
+            "price_exact": Decimal128(Decimal("28.99") + i % 50),
+            "category": "Gummy Candy",
+            "category_id": i % 35,
+            "updated_at": now + timedelta(seconds=i),
+            "image": {"_id": ObjectId(), "created_at": now, "sizes": ["thumb", "medium", "full"]},
+        }
+        for i in range(n)
+    ]
+
+
+def old_path(documents):
+    """What a route returning mm.get() went through before."""
+    data = [convert_document(doc) for doc in documents]
+    # Without custom encoders jsonable_encoder cannot handle the nested ObjectId at all
+    encoded = jsonable_encoder({"data": data}, custom_encoder={ObjectId: str, Decimal128: str})
+    return JSONResponse(encoded).body
+
+
+def new_path(documents):
+    return BSONJSONResponse({"data": documents}).body
+
+
+def best_of(fn, documents):
+    best = float("inf")
+    size = 0
+    for _ in range(REPEAT):
+        start = time.perf_counter()
+        size = len(fn(documents))
+        best = min(best, time.perf_counter() - start)
+    return best, size
+
+
+def main():
+    print(f"{'docs':>8}{'old ms':>12}{'new ms':>12}{'speedup':>10}{'bytes':>14}")
+    for n in SIZES:
+        documents = make_documents(n)
+        old_time, _ = best_of(old_path, documents)
+        new_time, size = best_of(new_path, documents)
+        print(f"{n:>8,}{old_time * 1000:>12.1f}{new_time * 1000:>12.1f}{old_time / new_time:>9.1f}x{size:>14,}")
+
+
+if __name__ == "__main__":
+    main()
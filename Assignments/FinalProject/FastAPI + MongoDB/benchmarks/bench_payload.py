@@ -0,0 +1,59 @@
+"""
+Measures how many bytes each route sends before and after the per-route field
+allow-lists in models.ROUTE_FIELDS, by running the route's query through
+MongoManager.get with and without the projection and JSON encoding the result.
+
+Run it from the FastAPI + MongoDB folder against a loaded candy_store:
+
+    python benchmarks/bench_payload.py
+"""
+
+import json
+import os
+import sys
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from mongoManager import MongoManager
+from models import ROUTE_FIELDS
+
+
+# Route -> (collection, query) used by that route in api.py
+ROUTE_QUERIES = {
+    "/candies": ("candies", {}),
+    "/categories": ("categories", {}),
+    "/candies/category/{category}": ("candies", {"category": "Retro"}),
+    "/candies/id/{id}": ("candies", {"id": "42689216610491"}),
+    "/candies/price": ("candies", {"price": {"$gte": 10, "$lte": 20}}),
+    "/users": ("users", {}),
+    "/locations": ("locations", {}),
+    "/images": ("images", {}),
+}
+
+
+def measure(handle, query, projection):
+    """Returns (encoded bytes, seconds) for one get() call."""
+    start = time.perf_counter()
+    result = handle.get(query=query, projection=projection)
+    body = json.dumps(result.get("data", []), default=str).encode()
+    return len(body), time.perf_counter() - start
+
+
+def main():
+    mm = MongoManager(db="candy_store")
+
+    print(f"{'route':<32}{'before':>12}{'after':>12}{'saved':>8}{'ms before':>11}{'ms after':>10}")
+    for route, (collection, query) in ROUTE_QUERIES.items():
+        handle = mm.collection_for(collection)
+        before, t_before = measure(handle, query, None)
+        after, t_after = measure(handle, query, ROUTE_FIELDS[route])
+        saved = 100 * (1 - after / before) if before else 0.0
+        print(
+            f"{route:<32}{before:>12,}{after:>12,}{saved:>7.1f}%"
+            f"{t_before * 1000:>11.1f}{t_after * 1000:>10.1f}"
+        )
+
+
+if __name__ == "__main__":
+    main()
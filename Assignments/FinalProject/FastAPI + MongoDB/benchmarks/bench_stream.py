@@ -0,0 +1,106 @@
+"""
+Peak memory (RSS) of reading candyDB.json style files of growing size with
+json.load versus candyStream.iter_candies. The files are generated from the real
+candyDB.json by repeating its categories under new names; each reader runs in a
+fresh process so its peak RSS is not hidden by an earlier run. No database is needed.
+
+    python benchmarks/bench_stream.py [path/to/candyDB.json] [--sizes 0.3,3,30,300]
+
+Sizes are in MB. The streaming column includes importing candyStream (pymongo,
+rich), which is most of its fixed footprint.
+"""
+
+import json
+import os
+import resource
+import subprocess
+import sys
+import tempfile
+import time
+
+HERE = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, HERE)
+
+DEFAULT_SOURCE = os.path.join(HERE, "..", "..", "A05", "FastAPI + MongoDB", "candyDB.json")
+DEFAULT_SIZES_MB = [0.3, 3, 30, 300]
+
+
+def write_scaled(source, path, target_bytes):
+    """Writes a candyDB.json style file of about target_bytes, one category at a time."""
+    with open(source) as f:
+        categories = json.load(f)
+
+    written = 0
+    copy = 0
+    with open(path, "w") as out:
+        out.write("{")
+        while written < target_bytes:
+            for name, candies in categories.items():
+                text = json.dumps({f"{name}-{copy}": candies}, indent=4)[1:-1]
+                out.write(("," if written else "") + text)
+                written += len(text) + 1
+                if written >= target_bytes:
+                    break
+            copy += 1
+        out.write("}")
+    return os.path.getsize(path)
+
+
+def measure(reader, path):
+    """Runs in the child process: reads path with reader, prints candies, seconds and peak RSS."""
+    start = time.perf_counter()
+    count = 0
+    if reader == "json.load":
+        with open(path) as f:
+            data = json.load(f)
+        count = sum(len(candies) for candies in data.values())
+    elif reader == "iter_candies":
+        from candyStream import iter_candies
+        with open(path) as f:
+            for _ in iter_candies(f):
+                count += 1
+    seconds = time.perf_counter() - start
+
+    # ru_maxrss is in KB on Linux
+    peak_mb = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024
+    print(json.dumps({"count": count, "seconds": seconds, "peak_mb": peak_mb}))
+
+
+def run(reader, path):
+    output = subprocess.run(
+        [sys.executable, __file__, "--measure", reader, path],
+        check=True, capture_output=True, text=True,
+    ).stdout
+    return json.loads(output)
+
+
+def main(argv):
+    sizes = DEFAULT_SIZES_MB
+    if "--sizes" in argv:
+        sizes = [float(size) for size in argv[argv.index("--sizes") + 1].split(",")]
+        del argv[argv.index("--sizes"):argv.index("--sizes") + 2]
+    source = argv[0] if argv else DEFAULT_SOURCE
+
+    baseline = run("none", source)["peak_mb"]
+    print(f"interpreter baseline: {baseline:.1f} MB RSS")
+    print(f"{'file MB':>9}{'candies':>11}{'json.load MB':>14}{'s':>7}{'stream MB':>11}{'s':>7}")
+
+    with tempfile.TemporaryDirectory() as tmp:
+        for size in sizes:
+            path = os.path.join(tmp, "candyDB.json")
+            file_bytes = write_scaled(source, path, int(size * 1024 * 1024))
+            loaded = run("json.load", path)
+            streamed = run("iter_candies", path)
+            assert loaded["count"] == streamed["count"]
+            print(
+                f"{file_bytes / 1024 / 1024:>9.1f}{streamed['count']:>11,}"
+                f"{loaded['peak_mb']:>14.1f}{loaded['seconds']:>7.2f}"
+                f"{streamed['peak_mb']:>11.1f}{streamed['seconds']:>7.2f}"
+            )
+
+
+if __name__ == "__main__":
+    if sys.argv[1:2] == ["--measure"]:
+        measure(sys.argv[2], sys.argv[3])
+    else:
+        main(sys.argv[1:])
@@ -0,0 +1,75 @@
+"""
+JSON response class that serializes documents straight out of pymongo.
+
+FastAPI normally walks every returned value with jsonable_encoder and then encodes
+the result again with json.dumps. BSONJSONResponse skips the first walk: it hands the
+raw BSON-decoded documents to the C JSON encoder (or orjson when it is installed)
+with a default() hook for the BSON types, so ObjectId, datetime and Decimal128 are
+converted at any nesting depth in a single pass.
+
+Routes must return a BSONJSONResponse instance (not a dict) for FastAPI to skip
+jsonable_encoder.
+"""
+
+from fastapi.responses import JSONResponse
+from bson import ObjectId, Decimal128
+from bson.binary import Binary
+from bson.regex import Regex
+from datetime import datetime, date
+from decimal import Decimal
+from uuid import UUID
+import base64
+import json
+
+try:
+    import orjson
+except ImportError:
+    orjson = None
+
+
+def bson_default(value):
+    """
+    Converts the BSON (and a few Python) types the JSON encoder does not know about.
+    Called by the encoder only for values it cannot handle itself.
+    """
+    if isinstance(value, ObjectId):
+        return str(value)
+    if isinstance(value, (datetime, date)):
+        return value.isoformat()
+    if isinstance(value, Decimal128):
+        return float(value.to_decimal())
+    if isinstance(value, Decimal):
+        return float(value)
+    if isinstance(value, UUID):
+        return str(value)
+    if isinstance(value, (Binary, bytes)):
+        return base64.b64encode(value).decode()
+    if isinstance(value, Regex):
+        return value.pattern
+    if isinstance(value, (set, frozenset, tuple)):
+        return list(value)
+    raise TypeError(f"Object of type {type(value).__name__} is not JSON serializable")
+
+
+if orjson is not None:
+    def dumps_bson(content):
+        """Encodes content (dicts, lists and BSON values) to JSON bytes."""
+        return orjson.dumps(content, default=bson_default, option=orjson.OPT_NON_STR_KEYS)
+else:
+    _encoder = json.JSONEncoder(
+        default=bson_default,
+        ensure_ascii=False,
+        allow_nan=False,
+        separators=(",", ":"),
+    )
+
+    def dumps_bson(content):
+        """Encodes content (dicts, lists and BSON values) to JSON bytes."""
+        return _encoder.encode(content).encode("utf-8")
+
+
+class BSONJSONResponse(JSONResponse):
+    """JSONResponse that renders raw pymongo documents with dumps_bson."""
+
+    def render(self, content) -> bytes:
+        return dumps_bson(content)
@@ -0,0 +1,438 @@
+"""
+Storage tiers behind queryCache.QueryCache.
+
+    MemoryBackend        Per-process LRU. Every gunicorn worker keeps its own copy.
+    SharedMemoryBackend  sqlite database on /dev/shm, shared by every worker on the host.
+    RedisBackend         Any server speaking the Redis protocol (redis-server, or
+                         cacheServer.py as a local stand-in), shared across hosts.
+
+A backend stores entries under (namespace, generation, arguments) keys and keeps
+the current generation of every namespace. Shared backends keep the generations in
+the shared store, so when one worker bumps a collection after a write, every worker
+builds its keys (and ETags) from the new generation at once: the old entries are
+dropped for all of them together. Shared backends store BSON bytes; MemoryBackend
+stores the values themselves.
+
+A shared backend that fails (server down, locked database) counts an error and
+behaves like an empty cache instead of failing the request. Its epoch and
+generations read as None meanwhile, which turns caching and ETags off.
+
+Backend interface (duck typed, like the rest of the cache):
+
+    shared                      True when values must be BSON bytes
+    epoch                       token that tells this store's generations from an earlier one's
+    get(key, now)               the stored value, or None when missing or expired
+    set(key, value, size, expires)
+    generation(namespace)
+    bump(namespace)             starts a new generation and drops the namespace's entries
+    clear()                     drops every entry (generations are kept)
+    stats(), reset_stats()
+"""
+
+from collections import OrderedDict, defaultdict
+from functools import wraps
+from threading import Lock, Thread, local
+import hashlib
+import json
+import os
+import secrets
+import sqlite3
+import tempfile
+import time
+
+from respClient import RespClient, RespError
+
+
+# Errors after which a shared backend falls back to behaving like an empty cache
+BACKEND_ERRORS = (OSError, sqlite3.Error, RespError)
+
+
+def fail_open(default=None):
+    """Makes a backend method count an error and return default when its store fails."""
+    def decorator(method):
+        @wraps(method)
+        def wrapper(self, *args, **kwargs):
+            try:
+                return method(self, *args, **kwargs)
+            except BACKEND_ERRORS as e:
+                self._count("errors")
+                self.last_error = f"{type(e).__name__}: {e}"
+                return default
+        return wrapper
+    return decorator
+
+
+class BackendCounters:
+    """Per-process expired / evictions / errors counters shared by the backends."""
+
+    def _init_counters(self):
+        self._counter_lock = Lock()
+        self._counters = {"expired": 0, "evictions": 0, "errors": 0}
+        self.last_error = None
+
+    def _count(self, counter, amount=1):
+        with self._counter_lock:
+            self._counters[counter] += amount
+
+    def counters(self):
+        with self._counter_lock:
+            return dict(self._counters)
+
+    def reset_stats(self):
+        with self._counter_lock:
+            self._counters = {counter: 0 for counter in self._counters}
+        self.last_error = None
+
+
+class MemoryBackend(BackendCounters):
+    """Thread-safe LRU of one process; the default."""
+
+    shared = False
+
+    def __init__(self, max_entries=1024, max_bytes=64 * 1024 * 1024):
+        self.max_entries = max_entries
+        self.max_bytes = max_bytes
+        self.epoch = secrets.token_hex(4)
+
+        # key -> (expires at, size, value); oldest first
+        self._entries = OrderedDict()
+        self._generations = defaultdict(int)
+        self._bytes = 0
+        self._lock = Lock()
+        self._init_counters()
+
+    def get(self, key, now):
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None:
+                return None
+
+            expires, size, value = entry
+            if expires <= now:
+                self._remove(key)
+                self._count("expired")
+                return None
+
+            self._entries.move_to_end(key)
+            return value
+
+    def set(self, key, value, size, expires):
+        with self._lock:
+            if key in self._entries:
+                self._remove(key)
+            self._entries[key] = (expires, size, value)
+            self._bytes += size
+
+            while len(self._entries) > self.max_entries or self._bytes > self.max_bytes:
+                self._remove(next(iter(self._entries)))
+                self._count("evictions")
+            return True
+
+    def generation(self, namespace):
+        with self._lock:
+            return self._generations[namespace]
+
+    def bump(self, namespace):
+        with self._lock:
+            self._generations[namespace] += 1
+            for key in [key for key in self._entries if key[0] == namespace]:
+                self._remove(key)
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+            self._bytes = 0
+
+    def stats(self):
+        with self._lock:
+            return {
+                **self.counters(),
+                "entries": len(self._entries),
+                "bytes": self._bytes,
+                "generations": dict(self._generations),
+            }
+
+    def _remove(self, key):
+        _, size, _ = self._entries.pop(key)
+        self._bytes -= size
+
+
+def default_shm_path():
+    """/dev/shm/candy_cache.sqlite3, or the temp directory where there is no /dev/shm."""
+    directory = "/dev/shm" if os.path.isdir("/dev/shm") else tempfile.gettempdir()
+    return os.path.join(directory, "candy_cache.sqlite3")
+
+
+SHM_SCHEMA = """
+CREATE TABLE IF NOT EXISTS entries (
+    namespace TEXT NOT NULL,
+    generation INTEGER NOT NULL,
+    arguments TEXT NOT NULL,
+    value BLOB NOT NULL,
+    size INTEGER NOT NULL,
+    expires REAL NOT NULL,
+    used REAL NOT NULL,
+    PRIMARY KEY (namespace, generation, arguments)
+);
+CREATE INDEX IF NOT EXISTS entries_used ON entries (used);
+CREATE TABLE IF NOT EXISTS generations (namespace TEXT PRIMARY KEY, generation INTEGER NOT NULL);
+CREATE TABLE IF NOT EXISTS meta (name TEXT PRIMARY KEY, value TEXT NOT NULL);
+"""
+
+ENTRY_KEY = "namespace = ? AND generation = ? AND arguments = ?"
+
+
+class SharedMemoryBackend(BackendCounters):
+    """
+    LRU shared by the processes of one host through a sqlite database on tmpfs.
+    WAL mode lets readers run while a worker writes; nothing is fsynced because the
+    file is a cache that dies with the host anyway.
+    """
+
+    shared = True
+
+    def __init__(self, path=None, max_entries=1024, max_bytes=64 * 1024 * 1024):
+        """
+        :param path: Database file (default /dev/shm/candy_cache.sqlite3). Delete it to reset the tier.
+        """
+        self.path = path or default_shm_path()
+        self.max_entries = max_entries
+        self.max_bytes = max_bytes
+        self._local = local()
+        self._epoch = None
+        self._init_counters()
+
+    def _connection(self):
+        """This thread's connection; reopened after a fork so workers never share one."""
+        if getattr(self._local, "pid", None) != os.getpid():
+            connection = sqlite3.connect(self.path, timeout=5, isolation_level=None, check_same_thread=False)
+            connection.execute("PRAGMA journal_mode=WAL")
+            connection.execute("PRAGMA synchronous=OFF")
+            connection.executescript(SHM_SCHEMA)
+            self._local.connection, self._local.pid = connection, os.getpid()
+        return self._local.connection
+
+    @property
+    @fail_open()
+    def epoch(self):
+        if self._epoch is None:
+            connection = self._connection()
+            connection.execute("INSERT OR IGNORE INTO meta VALUES ('epoch', ?)", (secrets.token_hex(4),))
+            self._epoch = connection.execute("SELECT value FROM meta WHERE name = 'epoch'").fetchone()[0]
+        return self._epoch
+
+    @fail_open()
+    def get(self, key, now):
+        connection = self._connection()
+        row = connection.execute(f"SELECT value, expires FROM entries WHERE {ENTRY_KEY}", key).fetchone()
+        if row is None:
+            return None
+        if row[1] <= now:
+            connection.execute(f"DELETE FROM entries WHERE {ENTRY_KEY}", key)
+            self._count("expired")
+            return None
+
+        # LRU order to the second, so a hot entry is not rewritten on every hit
+        connection.execute(f"UPDATE entries SET used = ? WHERE {ENTRY_KEY} AND used < ?", (now, *key, now - 1))
+        return row[0]
+
+    @fail_open(False)
+    def set(self, key, value, size, expires):
+        connection = self._connection()
+        connection.execute("BEGIN IMMEDIATE")
+        try:
+            connection.execute(
+                "INSERT OR REPLACE INTO entries VALUES (?, ?, ?, ?, ?, ?, ?)",
+                (*key, value, size, expires, time.time()),
+            )
+            count, total = connection.execute("SELECT count(*), total(size) FROM entries").fetchone()
+            while count > self.max_entries or total > self.max_bytes:
+                oldest = connection.execute(
+                    "SELECT namespace, generation, arguments, size FROM entries ORDER BY used LIMIT 1").fetchone()
+                connection.execute(f"DELETE FROM entries WHERE {ENTRY_KEY}", oldest[:3])
+                count, total = count - 1, total - oldest[3]
+                self._count("evictions")
+            connection.execute("COMMIT")
+        except BaseException:
+            connection.execute("ROLLBACK")
+            raise
+        return True
+
+    @fail_open()
+    def generation(self, namespace):
+        row = self._connection().execute(
+            "SELECT generation FROM generations WHERE namespace = ?", (namespace,)).fetchone()
+        return row[0] if row else 0
+
+    @fail_open()
+    def bump(self, namespace):
+        connection = self._connection()
+        connection.execute("BEGIN IMMEDIATE")
+        try:
+            connection.execute(
+                "INSERT INTO generations VALUES (?, 1) "
+                "ON CONFLICT (namespace) DO UPDATE SET generation = generation + 1", (namespace,))
+            connection.execute("DELETE FROM entries WHERE namespace = ?", (namespace,))
+            connection.execute("COMMIT")
+        except BaseException:
+            connection.execute("ROLLBACK")
+            raise
+
+    @fail_open()
+    def clear(self):
+        self._connection().execute("DELETE FROM entries")
+
+    def stats(self):
+        stats = {**self.counters(), "path": self.path, "last_error": self.last_error}
+        try:
+            connection = self._connection()
+            stats["entries"], stats["bytes"] = connection.execute(
+                "SELECT count(*), CAST(total(size) AS INTEGER) FROM entries").fetchone()
+            stats["generations"] = dict(connection.execute("SELECT namespace, generation FROM generations"))
+        except sqlite3.Error as e:
+            stats["last_error"] = str(e)
+        return stats
+
+
+class RedisBackend(BackendCounters):
+    """
+    Cache tier in a Redis (or cacheServer.py) database, shared across hosts.
+
+    Entries are plain keys that expire through the server's ttl:
+
+        <prefix>entry:<namespace>:<generation>:<sha1 of the arguments>
+
+    Generations live in the <prefix>generations hash. bump() increments the hash
+    and publishes the new generation on <prefix>invalidate; every worker mirrors
+    the hash from that channel in a background thread, so building a key, or an
+    ETag, costs no round trip. Entries of old generations are never read again and
+    expire on their own. Size the server with maxmemory and volatile-lru (only keys
+    with a ttl are evicted, so the generations are kept). A bump lost while the
+    server is down is covered by the ttl, like a write made outside the api.
+    """
+
+    shared = True
+
+    def __init__(self, client=None, prefix="candy:cache:"):
+        """
+        :param client: respClient.RespClient (default redis://localhost:6379/0).
+        :param prefix: Prefix of every key, so several apps can share a server.
+        """
+        self.client = client or RespClient()
+        self.prefix = prefix
+        self.generations_key = prefix + "generations"
+        self.channel = prefix + "invalidate"
+        self._epoch = None
+
+        self._mirror = {}
+        self._mirror_lock = Lock()
+        self._listening = False
+        self._listener_pid = None
+        self._init_counters()
+
+    def entry_key(self, key):
+        namespace, generation, arguments = key
+        digest = hashlib.sha1(arguments.encode()).hexdigest()
+        return f"{self.prefix}entry:{namespace}:{generation}:{digest}"
+
+    @property
+    @fail_open()
+    def epoch(self):
+        if self._epoch is None:
+            epoch_key = self.prefix + "epoch"
+            _, epoch = self.client.pipeline(("SET", epoch_key, secrets.token_hex(4), "NX"), ("GET", epoch_key))
+            self._epoch = epoch.decode()
+        return self._epoch
+
+    @fail_open()
+    def get(self, key, now):
+        return self.client.execute("GET", self.entry_key(key))
+
+    @fail_open(False)
+    def set(self, key, value, size, expires):
+        ttl_ms = int((expires - time.time()) * 1000)
+        if ttl_ms <= 0:
+            return False
+        self.client.execute("SET", self.entry_key(key), value, "PX", ttl_ms)
+        return True
+
+    def generation(self, namespace):
+        self._ensure_listener()
+        if self._listening:
+            with self._mirror_lock:
+                return self._mirror.get(namespace, 0)
+        return self._fetch_generation(namespace)
+
+    @fail_open()
+    def bump(self, namespace):
+        generation = self.client.execute("HINCRBY", self.generations_key, namespace, 1)
+        self._mirror_generation(namespace, generation)
+        self.client.execute("PUBLISH", self.channel, json.dumps([namespace, generation]))
+
+    def clear(self):
+        """Entries expire through their ttl; bump the namespaces to drop them sooner."""
+
+    def stats(self):
+        with self._mirror_lock:
+            generations = dict(self._mirror)
+        stats = {
+            **self.counters(),
+            "url": self.client.url,
+            "listening": self._listening,
+            "generations": generations,
+            "last_error": self.last_error,
+        }
+        try:
+            stats["server_keys"] = self.client.execute("DBSIZE")
+        except BACKEND_ERRORS as e:
+            stats["last_error"] = str(e)
+        return stats
+
+    @fail_open()
+    def _fetch_generation(self, namespace):
+        generation = int(self.client.execute("HGET", self.generations_key, namespace) or 0)
+        self._mirror_generation(namespace, generation)
+        return generation
+
+    def _mirror_generation(self, namespace, generation):
+        with self._mirror_lock:
+            # Messages can arrive after a resync read a newer value; never go back
+            self._mirror[namespace] = max(self._mirror.get(namespace, 0), generation)
+
+    def _ensure_listener(self):
+        """Starts this process' listener thread (after a fork the parent's does not exist)."""
+        if self._listener_pid == os.getpid():
+            return
+        with self._mirror_lock:
+            if self._listener_pid == os.getpid():
+                return
+            self._listener_pid = os.getpid()
+            self._listening = False
+        Thread(target=self._listen, name="cache-invalidation", daemon=True).start()
+
+    def _listen(self):
+        """
+        Mirrors the generations hash from the invalidation channel. After every
+        (re)subscribe the whole hash is read again, so nothing published while the
+        connection was down is missed. Until then generation() asks the server.
+        """
+        delay = 0.5
+        while True:
+            try:
+                for kind, _, data in self.client.subscribe(self.channel):
+                    if kind == b"subscribe":
+                        everything = self.client.execute("HGETALL", self.generations_key)
+                        for namespace, generation in zip(everything[::2], everything[1::2]):
+                            self._mirror_generation(namespace.decode(), int(generation))
+                        self._listening = True
+                        delay = 0.5
+                        continue
+
+                    namespace, generation = json.loads(data)
+                    self._mirror_generation(namespace, generation)
+            except BACKEND_ERRORS + (ValueError,) as e:
+                self._count("errors")
+                self.last_error = f"listener: {type(e).__name__}: {e}"
+            self._listening = False
+            time.sleep(delay)
+            delay = min(delay * 2, 10)
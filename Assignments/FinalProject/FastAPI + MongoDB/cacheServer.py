@@ -0,0 +1,260 @@
+"""
+Stand-in for redis-server covering the commands the shared cache tier uses, for
+development machines and CI without Redis installed. It speaks RESP2, so
+respClient.py (or redis-cli) cannot tell it apart for these commands:
+
+    PING ECHO AUTH SELECT QUIT GET SET (EX/PX/NX/XX) DEL EXISTS INCR
+    HGET HSET HINCRBY HGETALL PUBLISH SUBSCRIBE UNSUBSCRIBE DBSIZE FLUSHDB FLUSHALL
+
+Everything lives in one asyncio loop, so every command is atomic like in Redis.
+Keys with a ttl expire lazily on access and in a sweep every second. With
+--max-mb the least recently used keys that have a ttl are evicted once values pass
+that size (Redis' maxmemory with volatile-lru), so the cache's generations and
+epoch, which have no ttl, are never evicted. There is a single database; SELECT
+and AUTH are accepted and ignored.
+
+    python cacheServer.py [--host 127.0.0.1] [--port 6379] [--max-mb 256]
+    CANDY_CACHE_BACKEND=redis CANDY_CACHE_URL=redis://127.0.0.1:6379/0 gunicorn -c gunicorn_conf.py api:app
+"""
+
+from collections import OrderedDict, defaultdict
+import argparse
+import asyncio
+import time
+
+
+class CacheServer:
+    def __init__(self, max_bytes=0):
+        """
+        :param max_bytes: Evict least recently used keys with a ttl past this many value bytes (0 = no limit).
+        """
+        self.max_bytes = max_bytes
+
+        # key -> value; oldest first. Values are bytes or, for hashes, dicts of bytes
+        self.data = OrderedDict()
+        self.expires = {}
+        self.bytes = 0
+        self.subscribers = defaultdict(set)
+
+    def size_of(self, value):
+        if isinstance(value, dict):
+            return sum(len(field) + len(item) for field, item in value.items())
+        return len(value)
+
+    def lookup(self, key):
+        """The live value of key (expiring it if due) and marks it recently used."""
+        if key in self.expires and self.expires[key] <= time.monotonic():
+            self.delete(key)
+        if key not in self.data:
+            return None
+        self.data.move_to_end(key)
+        return self.data[key]
+
+    def store(self, key, value, ttl_ms=None):
+        self.delete(key)
+        self.data[key] = value
+        self.bytes += self.size_of(value)
+        if ttl_ms is not None:
+            self.expires[key] = time.monotonic() + ttl_ms / 1000
+        self.evict()
+
+    def delete(self, key):
+        if key not in self.data:
+            return False
+        self.bytes -= self.size_of(self.data.pop(key))
+        self.expires.pop(key, None)
+        return True
+
+    def evict(self):
+        if not self.max_bytes or self.bytes <= self.max_bytes:
+            return
+        for key in [key for key in self.data if key in self.expires]:
+            self.delete(key)
+            if self.bytes <= self.max_bytes:
+                break
+
+    def sweep(self):
+        now = time.monotonic()
+        for key in [key for key, expires in self.expires.items() if expires <= now]:
+            self.delete(key)
+
+    def hash_for(self, key):
+        value = self.lookup(key)
+        if value is None:
+            value = {}
+            self.data[key] = value
+        elif not isinstance(value, dict):
+            raise TypeError
+        return value
+
+    def run(self, writer, command, args):
+        """Executes one command; returns the reply (an Exception for error replies)."""
+        if command == "PING":
+            return args[0] if args else "PONG"
+        if command == "ECHO":
+            return args[0]
+        if command in ("AUTH", "SELECT"):
+            return "OK"
+        if command == "GET":
+            value = self.lookup(args[0])
+            if isinstance(value, dict):
+                raise TypeError
+            return value
+        if command == "SET":
+            return self.set(args)
+        if command == "DEL":
+            return sum(self.delete(key) for key in args)
+        if command == "EXISTS":
+            return sum(self.lookup(key) is not None for key in args)
+        if command == "INCR":
+            value = int(self.lookup(args[0]) or 0) + 1
+            ttl = self.expires.get(args[0])
+            self.store(args[0], str(value).encode())
+            if ttl is not None:
+                self.expires[args[0]] = ttl
+            return value
+        if command == "HGET":
+            value = self.lookup(args[0])
+            return value.get(args[1]) if isinstance(value, dict) else None
+        if command == "HSET":
+            value = self.hash_for(args[0])
+            added = 0
+            for field, item in zip(args[1::2], args[2::2]):
+                added += field not in value
+                self.bytes += len(field) + len(item) - (len(field) + len(value[field]) if field in value else 0)
+                value[field] = item
+            return added
+        if command == "HINCRBY":
+            value = self.hash_for(args[0])
+            old = value.get(args[1], b"0")
+            new = str(int(old) + int(args[2])).encode()
+            self.bytes += len(new) - (len(old) if args[1] in value else -len(args[1]))
+            value[args[1]] = new
+            return int(new)
+        if command == "HGETALL":
+            value = self.lookup(args[0]) or {}
+            return [part for field, item in value.items() for part in (field, item)]
+        if command == "PUBLISH":
+            message = [b"message", args[0], args[1]]
+            subscribers = list(self.subscribers.get(args[0], ()))
+            for subscriber in subscribers:
+                subscriber.write(encode_reply(message))
+            return len(subscribers)
+        if command == "SUBSCRIBE":
+            for count, channel in enumerate(args, 1):
+                self.subscribers[channel].add(writer)
+                writer.write(encode_reply([b"subscribe", channel, count]))
+            return None
+        if command == "UNSUBSCRIBE":
+            for channel in args or list(self.subscribers):
+                self.subscribers[channel].discard(writer)
+                writer.write(encode_reply([b"unsubscribe", channel, 0]))
+            return None
+        if command == "DBSIZE":
+            self.sweep()
+            return len(self.data)
+        if command in ("FLUSHDB", "FLUSHALL"):
+            self.data.clear()
+            self.expires.clear()
+            self.bytes = 0
+            return "OK"
+        return ValueError(f"ERR unknown command '{command.lower()}'")
+
+    def set(self, args):
+        key, value = args[0], args[1]
+        options = [arg.decode().upper() for arg in args[2:]]
+        ttl_ms = None
+        if "EX" in options:
+            ttl_ms = int(options[options.index("EX") + 1]) * 1000
+        if "PX" in options:
+            ttl_ms = int(options[options.index("PX") + 1])
+
+        exists = self.lookup(key) is not None
+        if ("NX" in options and exists) or ("XX" in options and not exists):
+            return None
+        self.store(key, value, ttl_ms)
+        return "OK"
+
+    async def handle(self, reader, writer):
+        try:
+            while True:
+                args = await read_command(reader)
+                if args is None:
+                    break
+                if not args:
+                    continue
+                command = args[0].decode().upper()
+                if command == "QUIT":
+                    writer.write(b"+OK\r\n")
+                    break
+                try:
+                    reply = self.run(writer, command, args[1:])
+                except (IndexError, ValueError):
+                    reply = ValueError(f"ERR wrong number or type of arguments for '{command.lower()}' command")
+                except TypeError:
+                    reply = TypeError("WRONGTYPE Operation against a key holding the wrong kind of value")
+                if command not in ("SUBSCRIBE", "UNSUBSCRIBE"):
+                    writer.write(encode_reply(reply))
+                await writer.drain()
+        except (ConnectionError, asyncio.IncompleteReadError):
+            pass
+        finally:
+            for subscribers in self.subscribers.values():
+                subscribers.discard(writer)
+            writer.close()
+
+    async def sweeper(self):
+        while True:
+            await asyncio.sleep(1)
+            self.sweep()
+
+
+def encode_reply(reply):
+    if isinstance(reply, Exception):
+        return b"-%s\r\n" % str(reply).encode()
+    if reply is None:
+        return b"$-1\r\n"
+    if isinstance(reply, bool):
+        reply = int(reply)
+    if isinstance(reply, int):
+        return b":%d\r\n" % reply
+    if isinstance(reply, str):
+        return b"+%s\r\n" % reply.encode()
+    if isinstance(reply, bytes):
+        return b"$%d\r\n%s\r\n" % (len(reply), reply)
+    return b"*%d\r\n" % len(reply) + b"".join(encode_reply(item) for item in reply)
+
+
+async def read_command(reader):
+    """Reads one RESP array command, or an inline command (as typed into telnet)."""
+    line = await reader.readline()
+    if not line:
+        return None
+    if not line.startswith(b"*"):
+        return line.split()
+
+    args = []
+    for _ in range(int(line[1:])):
+        header = await reader.readline()
+        length = int(header[1:])
+        args.append((await reader.readexactly(length + 2))[:-2])
+    return args
+
+
+async def serve(host, port, max_bytes):
+    server = CacheServer(max_bytes)
+    listener = await asyncio.start_server(server.handle, host, port)
+    asyncio.create_task(server.sweeper())
+    print(f"cacheServer listening on {host}:{port}")
+    async with listener:
+        await listener.serve_forever()
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Stand-in Redis server for the shared cache tier.")
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=6379)
+    parser.add_argument("--max-mb", type=float, default=0, help="Evict least recently used keys with a ttl past this size")
+    args = parser.parse_args()
+
+    asyncio.run(serve(args.host, args.port, int(args.max_mb * 1024 * 1024)))
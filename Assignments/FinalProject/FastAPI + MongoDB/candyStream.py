@@ -0,0 +1,224 @@
+"""
+Streaming importer for the single file candyDB.json format:
+
+    {"gummy-candy": {"42688376078523": {"id": ..., "name": ..., "price": ...}, ...}, ...}
+
+json.load needs the whole document (and every candy as a Python object) in memory
+at once. iter_candies() instead reads the file in fixed size chunks and walks the
+two outer levels itself, handing only one candy at a time to the json decoder, so
+memory stays flat however big the file is. load_candydb() feeds the candies into
+the same bounded queue and bulk insert writers that loadMongo.load() uses, and
+invalidates the catalog cache the same way when it is done (see loadMongo.py).
+
+    python candyStream.py path/to/candyDB.json
+"""
+
+from threading import Thread, Lock
+import json
+import queue
+import re
+import sys
+import time
+from rich import print
+
+from mongoManager import MongoManager
+from loadMongo import MANIFEST_COLLECTION, invalidate_catalog, writer
+from categoryStats import refresh_category_stats
+from queryCache import catalog_cache
+
+
+CHUNK_SIZE = 1 << 16
+
+_WHITESPACE = re.compile(r"[ \t\n\r]*")
+
+
+class StreamReader:
+    """
+    A window over a text file that decodes one JSON value at a time.
+    Consumed text is dropped from the window, so it never holds much more than
+    one chunk plus the value being decoded.
+    """
+
+    def __init__(self, f, chunk_size=CHUNK_SIZE):
+        self.f = f
+        self.chunk_size = chunk_size
+        self.buffer = ""
+        self.pos = 0
+        self.eof = False
+        self.decoder = json.JSONDecoder()
+
+    def fill(self):
+        """Reads one more chunk. Returns False at end of file."""
+        if self.eof:
+            return False
+        chunk = self.f.read(self.chunk_size)
+        if not chunk:
+            self.eof = True
+            return False
+        # Drop what has already been consumed before growing the window
+        self.buffer = self.buffer[self.pos:] + chunk
+        self.pos = 0
+        return True
+
+    def peek(self):
+        """Returns the next non whitespace character (without consuming it), or '' at the end."""
+        while True:
+            self.pos = _WHITESPACE.match(self.buffer, self.pos).end()
+            if self.pos < len(self.buffer) or not self.fill():
+                return self.buffer[self.pos:self.pos + 1]
+
+    def expect(self, characters):
+        """Consumes the next non whitespace character, which must be one of characters."""
+        ch = self.peek()
+        if not ch or ch not in characters:
+            raise ValueError(f"Expected one of {characters!r} but found {ch!r}")
+        self.pos += 1
+        return ch
+
+    def value(self):
+        """Decodes the next JSON value, reading more of the file until it is complete."""
+        self.peek()
+        while True:
+            try:
+                value, end = self.decoder.raw_decode(self.buffer, self.pos)
+                # A number at the very end of the window may continue in the next chunk
+                if end < len(self.buffer) or self.eof:
+                    self.pos = end
+                    return value
+            except json.JSONDecodeError:
+                if self.eof:
+                    raise
+            self.fill()
+
+
+def iter_candies(f, chunk_size=CHUNK_SIZE):
+    """
+    Yields (category key, candy) for every candy in a candyDB.json style file
+    object, in file order, without loading the file.
+    """
+    reader = StreamReader(f, chunk_size)
+
+    reader.expect("{")
+    if reader.peek() == "}":
+        return
+
+    while True:
+        category = reader.value()
+        reader.expect(":")
+        reader.expect("{")
+
+        if reader.peek() != "}":
+            while True:
+                reader.value()  # the candy id, repeated inside the candy
+                reader.expect(":")
+                yield category, reader.value()
+                if reader.expect(",}") == "}":
+                    break
+        else:
+            reader.expect("}")
+
+        if reader.expect(",}") == "}":
+            return
+
+
+def load_candydb(path, **kwargs):
+    """
+    Loads a candyDB.json file into candies and categories with memory bounded by
+    the queue (queue_size * batch_size candies), not by the file size.
+
+    Categories are named like loadMongo names them (gummy-candy -> Gummy Candy).
+    Ids of categories that already exist are kept; new ones get the next free id.
+
+    :param path: candyDB.json file.
+    :param db: Database name (default candy_store).
+    :param drop: Drop candies, categories and the reload manifest first (default True).
+    :param writers: Insert threads (default 4).
+    :param batch_size: Candies per bulk insert (default 1000).
+    :param queue_size: Batches allowed to wait for a writer (default 8).
+    :return: Dictionary with categories, inserted, errors, seconds and docs_per_sec.
+    """
+    db_name = kwargs.get("db", None) or "candy_store"
+    drop = kwargs.get("drop", True)
+    writers = kwargs.get("writers", 4)
+    batch_size = kwargs.get("batch_size", 1000)
+    queue_size = kwargs.get("queue_size", 8)
+
+    db = MongoManager(query_cache=catalog_cache)
+
+    db.setDb(db_name)
+
+    if drop:
+        db.dropCollection("candies")
+
+        db.dropCollection("categories")
+
+        db.dropCollection(MANIFEST_COLLECTION)
+
+    categories = db.collection_for("categories")
+    category_ids = {category["name"]: category["_id"] for category in categories.get(raw=True)["data"]}
+    counts = {}
+
+    batches = queue.Queue(maxsize=queue_size)
+    stats = {"inserted": 0, "errors": []}
+    lock = Lock()
+
+    candies = db.collection_for("candies")
+    threads = [
+        Thread(target=writer, args=(candies, batches, stats, lock, batch_size), daemon=True)
+        for _ in range(writers)
+    ]
+    for thread in threads:
+        thread.start()
+
+    start = time.perf_counter()
+    batch = []
+    with open(path, encoding="utf-8") as f:
+        for key, item in iter_candies(f):
+            category = key.replace("-", " ").title()
+            if category not in category_ids:
+                category_ids[category] = max(category_ids.values(), default=-1) + 1
+
+            item["category"] = category
+            item["category_id"] = category_ids[category]
+            counts[category] = counts.get(category, 0) + 1
+
+            batch.append(item)
+            if len(batch) >= batch_size:
+                # Blocks while the writers are queue_size batches behind
+                batches.put(batch)
+                batch = []
+
+    if batch:
+        batches.put(batch)
+    for _ in threads:
+        batches.put(None)
+    for thread in threads:
+        thread.join()
+
+    categories.bulk(
+        {"op": "upsert", "filter": {"_id": category_ids[name]}, "update": {"name": name, "count": count}}
+        for name, count in counts.items()
+    )
+    print(refresh_category_stats(db, [category_ids[name] for name in counts]))
+
+    elapsed = time.perf_counter() - start
+    result = {
+        "categories": len(counts),
+        "inserted": stats["inserted"],
+        "errors": stats["errors"],
+        "seconds": round(elapsed, 2),
+        "docs_per_sec": round(stats["inserted"] / elapsed) if elapsed else 0,
+    }
+    print(f"Loaded {result['inserted']:,} candies in {result['categories']} categories "
+          f"in {result['seconds']}s ({result['docs_per_sec']:,} docs/sec), {len(result['errors'])} errors")
+
+    if drop:
+        print(db.ensure_indexes())
+
+    invalidate_catalog(db)
+
+    return result
+
+
+if __name__ == "__main__":
+    load_candydb(sys.argv[1] if len(sys.argv) > 1 else "./candyDB.json")
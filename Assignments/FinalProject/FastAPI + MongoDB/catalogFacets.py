@@ -0,0 +1,146 @@
+"""
+Faceted candy query behind /candies/facets: one page of candies matching a filter,
+plus per-category counts and a price histogram of everything the filter matches,
+in a single aggregation.
+
+    [{"$match": <category_id / price filter>},
+     {"$sort": {"price": 1, "_id": 1}},
+     {"$facet": {"data": [$skip, $limit, $project], "total": [$count],
+                 "categories": [$group by category_id], "prices": [$bucket on price]}}]
+
+The $match and $sort run before $facet, so the (category_id, price, _id) and
+(price, _id) indexes from INDEX_SPECS serve them; every facet then reads the
+matched documents once. Counts are for the current filter: picking a category
+narrows the histogram and picking a price range narrows the category counts.
+
+Results go through the query cache (queryCache.py) keyed on the pipeline, so they
+are dropped by the next candy write like any cached find.
+"""
+
+from pymongo.errors import PyMongoError
+from rich import print
+
+from models import ROUTE_FIELDS
+
+
+# Lower bounds of the price histogram buckets; prices from the last bound up share one bucket
+PRICE_BUCKETS = [0, 10, 25, 50, 100, 250]
+
+# $bucket id of candies without a usable price (missing, not a number or negative)
+OTHER_PRICES = "other"
+
+
+def facet_filter(category_id=None, min_price=None, max_price=None):
+    """The $match filter for the given facet selections (None means any)."""
+    query = {}
+    if category_id is not None:
+        query["category_id"] = category_id
+    price = {}
+    if min_price is not None:
+        price["$gte"] = min_price
+    if max_price is not None:
+        price["$lte"] = max_price
+    if price:
+        query["price"] = price
+    return query
+
+
+def facet_pipeline(query, limit=20, offset=0):
+    """Aggregation returning a page of candies matching query with its facets, in one document."""
+    return [
+        {"$match": query},
+        {"$sort": {"price": 1, "_id": 1}},
+        {"$facet": {
+            "data": [{"$skip": offset}, {"$limit": limit}, {"$project": ROUTE_FIELDS["/candies/facets"]}],
+            "total": [{"$count": "count"}],
+            "categories": [
+                {"$group": {"_id": "$category_id", "name": {"$first": "$category"}, "count": {"$sum": 1}}},
+                {"$sort": {"count": -1, "_id": 1}},
+            ],
+            "prices": [
+                {"$bucket": {
+                    "groupBy": "$price",
+                    "boundaries": PRICE_BUCKETS + [float("inf")],
+                    "default": OTHER_PRICES,
+                    "output": {"count": {"$sum": 1}},
+                }},
+            ],
+        }},
+    ]
+
+
+def format_facets(facets, limit, offset):
+    """Shapes the $facet output document like the other catalog responses."""
+    buckets, other = [], 0
+    for bucket in facets["prices"]:
+        if bucket["_id"] == OTHER_PRICES:
+            other = bucket["count"]
+            continue
+        position = PRICE_BUCKETS.index(bucket["_id"])
+        high = PRICE_BUCKETS[position + 1] if position + 1 < len(PRICE_BUCKETS) else None
+        buckets.append({"min_price": bucket["_id"], "max_price": high, "count": bucket["count"]})
+
+    return {
+        "success": True,
+        "result_size": facets["total"][0]["count"] if facets["total"] else 0,
+        "limit": limit,
+        "offset": offset,
+        "data": facets["data"],
+        "categories": [
+            {"category_id": category["_id"], "name": category["name"], "count": category["count"]}
+            for category in facets["categories"]
+        ],
+        "prices": buckets,
+        "unpriced": other,
+    }
+
+
+def candy_facets(candies, query, limit=20, offset=0):
+    """
+    Runs the facet aggregation on the candies handle of a MongoManager.
+
+    :param query: Filter from facet_filter().
+    :return: Dictionary with success, result_size (all matches), data (this page),
+             categories, prices and unpriced (matches without a usable price, in
+             no price bucket), or message on error.
+    """
+    pipeline = facet_pipeline(query, limit, offset)
+    cache = candies.query_cache
+    if cache is not None:
+        key = cache.pipeline_key(candies.collection.full_name, pipeline)
+        cached = cache.get(key)
+        if cached is not None:
+            return cached
+
+    try:
+        facets = next(candies.collection.aggregate(pipeline))
+    except PyMongoError as e:
+        print(f"Error computing candy facets: {e}")
+        return {"success": False, "message": str(e)}
+
+    result = format_facets(facets, limit, offset)
+    if cache is not None:
+        cache.put(key, result)
+    return result
+
+
+async def candy_facets_async(candies, query, limit=20, offset=0):
+    """Same as candy_facets for the candies handle of an AsyncMongoManager."""
+    pipeline = facet_pipeline(query, limit, offset)
+    cache = candies.query_cache
+    if cache is not None:
+        key = cache.pipeline_key(candies.collection.full_name, pipeline)
+        cached = cache.get(key)
+        if cached is not None:
+            return cached
+
+    try:
+        facets = (await candies.collection.aggregate(pipeline).to_list(None))[0]
+    except PyMongoError as e:
+        print(f"Error computing candy facets: {e}")
+        return {"success": False, "message": str(e)}
+
+    result = format_facets(facets, limit, offset)
+    if cache is not None:
+        cache.put(key, result)
+    return result
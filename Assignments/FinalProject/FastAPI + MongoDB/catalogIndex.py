@@ -0,0 +1,225 @@
+"""
+Lifecycle shared by the in-memory catalog indexes (priceIndex.py, searchIndex.py).
+
+An index is bound to the candies handle at startup and builds in the background;
+until the first build is done lookups return None and the route asks Mongo. The
+write routes pass the _ids they touched to refresh(), which re-reads those candies
+and updates their entries in place.
+
+Each index follows the candies collection's generation in the query cache
+(queryCache.py). A write made through any worker bumps it; while the index has
+not applied that write (another worker made it, or its refresh is still queued)
+lookups return None. If the generation does not catch up within stale_grace
+seconds the index rebuilds in the background. It also rebuilds every max_age
+seconds, to pick up writes made outside the api. That suits a read-mostly catalog;
+under a steady stream of writes from several workers the routes mostly ask Mongo.
+
+A subclass describes its data:
+
+    new_state()               empty state of a build
+    add(state, doc)           indexes one candy (doc has _id and the projection)
+    remove(state, key)        drops the candy with _id key, if indexed
+    after_load(state)         finishes a build (optional)
+    after_refresh(state)      runs after a refresh applied its changes (optional)
+    needs_compaction(state)   True to rebuild after a refresh (optional)
+    state_stats(state)        sizes reported by stats() (optional)
+
+and answers lookups by reading current_generation() and then calling
+readable_state() with it and the lock held. The generation is read before taking
+the lock because with a shared cache backend it may be I/O, which must not
+serialize concurrent lookups.
+"""
+
+from threading import Lock, Thread
+from pymongo.errors import PyMongoError
+from rich import print
+import time
+
+
+class CatalogIndex:
+    # Used in log messages and thread names
+    name = "catalog index"
+
+    def __init__(self, projection, **kwargs):
+        """
+        :param projection: Fields every indexed candy is loaded with (_id is always included).
+        :param max_age: Seconds before a background rebuild (default 300).
+        :param stale_grace: Seconds a generation mismatch may last before a rebuild (default 5).
+        """
+        self.projection = projection
+        self.max_age = kwargs.get("max_age", 300)
+        self.stale_grace = kwargs.get("stale_grace", 5)
+
+        self.handle = None
+        self.cache = None
+        self.generation = None
+        self.built_at = None
+        self._state = None
+        self._stale_since = None
+        self._lock = Lock()
+        self._rebuilding = Lock()
+        self._counters = {"lookups": 0, "fallbacks": 0, "refreshes": 0, "builds": 0, "build_seconds": None}
+
+    def new_state(self):
+        raise NotImplementedError
+
+    def add(self, state, doc):
+        raise NotImplementedError
+
+    def remove(self, state, key):
+        raise NotImplementedError
+
+    def after_load(self, state):
+        pass
+
+    def after_refresh(self, state):
+        pass
+
+    def needs_compaction(self, state):
+        return False
+
+    def state_stats(self, state):
+        return {}
+
+    def start(self, handle):
+        """Binds the index to the candies handle and starts the first build in the background."""
+        self.handle = handle
+        self.cache = handle.query_cache
+        self.schedule_rebuild()
+
+    def current_generation(self):
+        """The candies collection's generation in the cache (None without one). Read it outside the lock."""
+        if self.cache is None:
+            return None
+        return self.cache.generation(self.handle.collection.full_name)
+
+    def load(self, documents, generation=None):
+        """
+        Replaces the index with documents. Lookups keep using the old state until
+        the new one is complete.
+        """
+        start = time.perf_counter()
+        state = self.new_state()
+        for doc in documents:
+            self.add(state, doc)
+        self.after_load(state)
+
+        with self._lock:
+            self._state = state
+            self.generation = generation
+            self.built_at = time.monotonic()
+            self._stale_since = None
+            self._counters["builds"] += 1
+            self._counters["build_seconds"] = round(time.perf_counter() - start, 3)
+
+    def build(self):
+        """Loads every candy from Mongo. The generation is read first, so writes during the load force a rebuild."""
+        generation = self.current_generation()
+        self.load(self.handle.get(projection=self.projection, raw=True, stream=True, batch_size=10000), generation)
+
+    def schedule_rebuild(self):
+        """Starts a background build unless one is already running."""
+        if self.handle is None or not self._rebuilding.acquire(blocking=False):
+            return
+        Thread(target=self._rebuild, name=self.name.replace(" ", "-"), daemon=True).start()
+
+    def _rebuild(self):
+        try:
+            self.build()
+        except PyMongoError as e:
+            print(f"Error building the {self.name}: {e}")
+        finally:
+            self._rebuilding.release()
+
+    def _is_current(self, generation):
+        """True when the index has applied every write up to generation. Call with the lock held."""
+        now = time.monotonic()
+        if now - self.built_at > self.max_age:
+            self.schedule_rebuild()
+
+        if self.cache is None or generation == self.generation:
+            self._stale_since = None
+            return True
+
+        if self._stale_since is None:
+            self._stale_since = now
+        elif now - self._stale_since > self.stale_grace:
+            self.schedule_rebuild()
+        return False
+
+    def readable_state(self, generation):
+        """
+        The state to answer a lookup from, or None when the index is not built yet
+        or is behind a write. Call with the lock held.
+
+        :param generation: current_generation(), read before taking the lock.
+        """
+        self._counters["lookups"] += 1
+        if self._state is None or not self._is_current(generation):
+            self._counters["fallbacks"] += 1
+            return None
+        return self._state
+
+    def refresh(self, ids):
+        """
+        Re-reads the candies with these _ids after a write: changed candies are
+        re-indexed, deleted ones dropped. Runs as a background task of the write.
+        """
+        if self._state is None:
+            return
+        ids = list(ids)
+        generation = self.current_generation()
+        found = self.handle.get(query={"_id": {"$in": ids}}, projection=self.projection, raw=True)["data"]
+
+        with self._lock:
+            state = self._state
+            for key in ids:
+                self.remove(state, key)
+            for doc in found:
+                self.add(state, doc)
+            self.after_refresh(state)
+
+            # Only catch up if this was the one write the index was missing
+            if generation is not None and self.generation is not None and generation == self.generation + 1:
+                self.generation = generation
+            self._counters["refreshes"] += 1
+            compact = self.needs_compaction(state)
+
+        if compact:
+            self.schedule_rebuild()
+
+    def stats(self):
+        with self._lock:
+            state = self._state
+            return {
+                **self._counters,
+                "ready": state is not None,
+                **(self.state_stats(state) if state is not None else {}),
+                "generation": self.generation,
+                "age_seconds": round(time.monotonic() - self.built_at, 1) if self.built_at else None,
+            }
+
+
+def refresh_indexes(indexes, ids):
+    """Refreshes every enabled index (None entries are skipped) after a write touching ids."""
+    for index in indexes:
+        if index is not None:
+            index.refresh(ids)
+
+
+def fallback_response(result, **fields):
+    """
+    Shapes the get() result of a route's Mongo fallback like the index lookups'
+    responses: success, result_size, data and source, plus the given fields (a
+    result_size among them replaces the page length), without get()'s arguments.
+    """
+    if not result.get("success", False):
+        return {"success": False, "error": result.get("error")}
+    result_size = fields.pop("result_size", None)
+    return {
+        "success": True,
+        "result_size": len(result["data"]) if result_size is None else result_size,
+        **fields,
+        "data": result["data"],
+        "source": "database",
+    }
@@ -0,0 +1,195 @@
+"""
+Materialized per-category statistics (replaces fix_categories.py).
+
+An aggregation over candies groups by category_id and $merges the result back into
+categories, so each category document carries:
+
+    {"_id": <category_id>, "name": ..., "count": ..., "min_price": ..., "max_price": ...,
+     "avg_price": ..., "last_updated": <server time>}
+
+refresh_category_stats() rebuilds every category (after a load) or only the ids it
+is given (after the api adds, updates or deletes a candy), so a write only
+re-aggregates the candies of the categories it touched. Categories left without
+candies keep their document with a count of 0. Needs MongoDB 4.2+ ($merge, $$NOW).
+
+    python categoryStats.py
+"""
+
+from datetime import datetime
+from pymongo import DESCENDING, ReturnDocument
+from pymongo.errors import DuplicateKeyError, PyMongoError
+from rich import print
+
+from mongoManager import MongoManager
+
+
+EMPTY_STATS = {"count": 0, "min_price": None, "max_price": None, "avg_price": None}
+
+
+def stats_match(category_ids=None):
+    """Filter on candies of category_ids (all categorized candies when None)."""
+    if category_ids is None:
+        return {"category_id": {"$ne": None}}
+    return {"category_id": {"$in": list(category_ids)}}
+
+
+def category_stats_pipeline(category_ids=None):
+    """
+    Aggregation that recomputes the statistics of category_ids (all categories when
+    None) and merges them into categories.
+    """
+    return [
+        {"$match": stats_match(category_ids)},
+        {"$group": {
+            "_id": "$category_id",
+            "name": {"$first": "$category"},
+            "count": {"$sum": 1},
+            "min_price": {"$min": "$price"},
+            "max_price": {"$max": "$price"},
+            "avg_price": {"$avg": "$price"},
+        }},
+        {"$set": {
+            "avg_price": {"$round": ["$avg_price", 2]},
+            "last_updated": "$$NOW",
+        }},
+        {"$merge": {"into": "categories", "on": "_id", "whenMatched": "merge", "whenNotMatched": "insert"}},
+    ]
+
+
+def empty_categories_update(present_ids, category_ids=None):
+    """
+    Returns (filter, update) that zero the statistics of the categories in
+    category_ids (all when None) that have no candies left. present_ids are the
+    category ids that still have candies.
+
+    Emptiness is read from the candies themselves, not from which refresh wrote a
+    category last: two refreshes of the same category can overlap (two writes in a
+    row, or writes in two workers) and neither may zero a category the other filled.
+    """
+    filter_query = {"_id": {"$nin": list(present_ids)}}
+    if category_ids is not None:
+        filter_query["_id"]["$in"] = list(category_ids)
+
+    update = {"$set": {**EMPTY_STATS, "last_updated": datetime.utcnow()}}
+    return filter_query, update
+
+
+def affected_ids(category_ids):
+    """Normalizes the category ids passed to a refresh; None means every category."""
+    if category_ids is None:
+        return None
+    return sorted({category_id for category_id in category_ids if category_id is not None})
+
+
+def refresh_category_stats(mm, category_ids=None):
+    """
+    Recomputes and stores the statistics of the given categories.
+
+    :param mm: MongoManager with a database selected.
+    :param category_ids: Iterable of category ids, or None for every category.
+    :return: Dictionary with success, refreshed and emptied counts (or message on error).
+    """
+    category_ids = affected_ids(category_ids)
+    if category_ids == []:
+        return {"success": True, "refreshed": 0, "emptied": 0}
+
+    candies = mm.collection_for("candies").collection
+    categories = mm.collection_for("categories")
+
+    try:
+        # pymongo runs the aggregate command right away; $merge returns no documents
+        candies.aggregate(category_stats_pipeline(category_ids))
+        present = candies.distinct("category_id", stats_match(category_ids))
+        emptied = categories.put(*empty_categories_update(present, category_ids)).modified_count
+    except PyMongoError as e:
+        print(f"Error refreshing category stats: {e}")
+        return {"success": False, "message": str(e)}
+
+    return {"success": True, "refreshed": len(present), "emptied": emptied}
+
+
+async def refresh_category_stats_async(amm, category_ids=None):
+    """Same as refresh_category_stats for an AsyncMongoManager."""
+    category_ids = affected_ids(category_ids)
+    if category_ids == []:
+        return {"success": True, "refreshed": 0, "emptied": 0}
+
+    candies = amm.collection_for("candies").collection
+    categories = amm.collection_for("categories")
+
+    try:
+        # Motor only runs the aggregation once the cursor is iterated
+        await candies.aggregate(category_stats_pipeline(category_ids)).to_list(None)
+        present = await candies.distinct("category_id", stats_match(category_ids))
+        emptied = (await categories.put(*empty_categories_update(present, category_ids))).modified_count
+    except PyMongoError as e:
+        print(f"Error refreshing category stats: {e}")
+        return {"success": False, "message": str(e)}
+
+    return {"success": True, "refreshed": len(present), "emptied": emptied}
+
+
+# Document in counters holding the last category id handed out
+CATEGORY_COUNTER = "category_id"
+
+
+def new_category(name, category_id):
+    """The document a category starts with until its first refresh."""
+    return {"_id": category_id, "name": name, **EMPTY_STATS, "last_updated": datetime.utcnow()}
+
+
+def category_id_for(mm, name):
+    """
+    Returns the id of the category called name, creating the category with the
+    next id from the counters collection if it does not exist yet.
+
+    Ids come from an atomic $inc, and the category document is upserted on its
+    unique name, so two writes that introduce categories at the same time (in any
+    workers) never share an id, and two writes with the same new name share one.
+    """
+    categories = mm.collection_for("categories").collection
+    found = categories.find_one({"name": name}, {"_id": 1})
+    if found:
+        return found["_id"]
+
+    counters = mm.collection_for("counters").collection
+    # Never hand out an id below the ones already used (a load numbers categories itself)
+    last = categories.find_one({}, {"_id": 1}, sort=[("_id", DESCENDING)])
+    counters.update_one({"_id": CATEGORY_COUNTER}, {"$max": {"seq": last["_id"] if last else -1}}, upsert=True)
+    category_id = counters.find_one_and_update(
+        {"_id": CATEGORY_COUNTER}, {"$inc": {"seq": 1}}, return_document=ReturnDocument.AFTER)["seq"]
+
+    try:
+        created = categories.find_one_and_update(
+            {"name": name}, {"$setOnInsert": new_category(name, category_id)},
+            upsert=True, return_document=ReturnDocument.AFTER)
+    except DuplicateKeyError:
+        # Another write created it between the upsert's lookup and its insert
+        created = categories.find_one({"name": name}, {"_id": 1})
+    return created["_id"]
+
+
+async def category_id_for_async(amm, name):
+    """Same as category_id_for for an AsyncMongoManager."""
+    categories = amm.collection_for("categories").collection
+    found = await categories.find_one({"name": name}, {"_id": 1})
+    if found:
+        return found["_id"]
+
+    counters = amm.collection_for("counters").collection
+    last = await categories.find_one({}, {"_id": 1}, sort=[("_id", DESCENDING)])
+    await counters.update_one({"_id": CATEGORY_COUNTER}, {"$max": {"seq": last["_id"] if last else -1}}, upsert=True)
+    category_id = (await counters.find_one_and_update(
+        {"_id": CATEGORY_COUNTER}, {"$inc": {"seq": 1}}, return_document=ReturnDocument.AFTER))["seq"]
+
+    try:
+        created = await categories.find_one_and_update(
+            {"name": name}, {"$setOnInsert": new_category(name, category_id)},
+            upsert=True, return_document=ReturnDocument.AFTER)
+    except DuplicateKeyError:
+        created = await categories.find_one({"name": name}, {"_id": 1})
+    return created["_id"]
+
+
+if __name__ == "__main__":
+    print(refresh_category_stats(MongoManager(db="candy_store")))
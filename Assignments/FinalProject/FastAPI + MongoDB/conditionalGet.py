@@ -0,0 +1,111 @@
+"""
+Conditional GET for the catalog routes.
+
+Every catalog response carries a strong ETag derived from the request URL and the
+version of the collections it reads (QueryCache.version), plus a Cache-Control
+header. A request whose If-None-Match already holds the current ETag gets an
+empty 304 before the route touches Mongo, so an unchanged catalog view costs a
+header exchange instead of a query and serialization.
+
+A response that has to be sent in full is also stored in the query cache under
+its ETag, so the next request for that view (from any worker, with a shared cache
+backend) is served from the stored body without a query or serialization.
+
+The version lives in the query cache, so with caching turned off
+(CANDY_CACHE_TTL=0) responses get Cache-Control but no ETag.
+
+CANDY_CATALOG_MAX_AGE (seconds, default 0) is how long clients may reuse a
+response without asking. With 0 they revalidate every time, which after a write
+costs one full response and otherwise a 304.
+"""
+
+from fastapi import Request
+from fastapi.responses import Response
+import hashlib
+import os
+
+
+CATALOG_MAX_AGE = int(os.environ.get("CANDY_CATALOG_MAX_AGE", 0))
+
+
+def catalog_etag(request: Request, *handles):
+    """
+    Strong ETag for request's view of the handles' collections, or None when a
+    handle has no query cache to version its collection or its shared backend is
+    unavailable (then the response is sent in full, without an ETag).
+    """
+    versions = []
+    for handle in handles:
+        if handle.query_cache is None:
+            return None
+        version = handle.query_cache.version(handle.collection.full_name)
+        if version is None:
+            return None
+        versions.append(version)
+
+    # Query parameters are sorted so ?a=1&b=2 and ?b=2&a=1 share an ETag
+    parts = [request.url.path, repr(sorted(request.query_params.multi_items())), *versions]
+    return '"' + hashlib.sha1("\n".join(parts).encode()).hexdigest()[:24] + '"'
+
+
+def etag_matches(etag, if_none_match):
+    """Weak comparison of etag against an If-None-Match header value (RFC 9110 13.1.2)."""
+    if not if_none_match:
+        return False
+    if if_none_match.strip() == "*":
+        return True
+    for tag in if_none_match.split(","):
+        tag = tag.strip()
+        if tag.startswith("W/"):
+            tag = tag[2:]
+        if tag == etag:
+            return True
+    return False
+
+
+def catalog_headers(etag, headers=None):
+    """headers plus the Cache-Control and (when there is one) ETag of a catalog response."""
+    headers = dict(headers or {})
+    headers["Cache-Control"] = f"public, max-age={CATALOG_MAX_AGE}, must-revalidate"
+    if etag:
+        headers["ETag"] = etag
+    return headers
+
+
+def conditional(request: Request, *handles):
+    """
+    Checks request against the current version of the handles' collections.
+    Call it before querying, so a write racing the query leaves the response with
+    an older ETag and the next request fetches again.
+
+    :return: (etag, response): a 304 when the client's copy is current, the stored
+             response when one was already built for this ETag, else None.
+    """
+    etag = catalog_etag(request, *handles)
+    if etag is None:
+        return None, None
+    if etag_matches(etag, request.headers.get("if-none-match")):
+        return etag, Response(status_code=304, headers=catalog_headers(etag))
+
+    cache = handles[0].query_cache
+    stored = cache.get(cache.response_key(handles[0].collection.full_name, etag))
+    if stored is None:
+        return etag, None
+    return etag, Response(stored["body"], headers=stored["headers"])
+
+
+def catalog_response(response, result, etag, *handles):
+    """
+    Adds the catalog headers to response, built from the get() result, and stores
+    it under the first handle's collection for conditional() to serve. A failed
+    read is sent without an ETag so it is never reused.
+    """
+    if not result.get("success", False):
+        etag = None
+
+    response.headers.update(catalog_headers(etag))
+    if etag is not None:
+        cache = handles[0].query_cache
+        headers = {name: value for name, value in response.headers.items() if name != "content-length"}
+        cache.put(cache.response_key(handles[0].collection.full_name, etag), {"body": response.body, "headers": headers})
+    return response
@@ -0,0 +1,316 @@
+"""
+Generates scale test data for candy_store: millions of candies, hundreds of
+thousands of users and one location per user.
+
+Schemas come from the data and models the api already uses:
+    candies    - every field of the real candies in categoryJson. Each generated candy
+                 starts from a real candy of a random category and gets a new id,
+                 a varied name and a jittered price.
+    users      - models.UserRegistration, with the password stored as a bcrypt hash
+                 exactly like MongoManager.register_user does.
+    locations  - models.LocationData, stored as a GeoJSON point like add_location,
+                 scattered around real cities weighted by population.
+
+bcrypt is deliberately slow (about a quarter second per hash at the default cost), so
+a pool of distinct hashes is computed up front in a process pool and shared by the
+users: user n has password "password<n % hash_pool>", so any user can log in.
+
+Documents are generated in chunks by a process pool and written through the same
+bounded queue and bulk insert writers as loadMongo.load(). Every chunk (and every
+bcrypt salt) is derived from the seed, so the same seed gives the same data.
+
+The generated collections replace candies, categories, users and locations.
+
+    python generateData.py --candies 2000000 --users 200000 --seed 42
+"""
+
+from concurrent.futures import ProcessPoolExecutor
+from datetime import datetime, timedelta
+from threading import Thread, Lock
+from passlib.hash import bcrypt
+from rich import print
+import argparse
+import glob
+import json
+import math
+import os
+import queue
+import random
+import time
+
+from mongoManager import MongoManager
+from models import UserRegistration, LocationData
+from loadMongo import category_name, bounded_map, writer
+from categoryStats import refresh_category_stats
+
+
+# Documents generated per worker task (and per bulk insert)
+GENERATE_CHUNK_SIZE = 10000
+
+# (city, latitude, longitude, population in millions)
+CITIES = [
+    ("New York", 40.7128, -74.0060, 8.3),
+    ("Los Angeles", 34.0522, -118.2437, 3.9),
+    ("Chicago", 41.8781, -87.6298, 2.7),
+    ("Houston", 29.7604, -95.3698, 2.3),
+    ("Phoenix", 33.4484, -112.0740, 1.6),
+    ("Philadelphia", 39.9526, -75.1652, 1.6),
+    ("San Antonio", 29.4241, -98.4936, 1.5),
+    ("Dallas", 32.7767, -96.7970, 1.3),
+    ("Austin", 30.2672, -97.7431, 1.0),
+    ("Wichita Falls", 33.9137, -98.4934, 0.1),
+    ("Oklahoma City", 35.4676, -97.5164, 0.7),
+    ("Denver", 39.7392, -104.9903, 0.7),
+    ("Seattle", 47.6062, -122.3321, 0.7),
+    ("Atlanta", 33.7490, -84.3880, 0.5),
+    ("Miami", 25.7617, -80.1918, 0.4),
+    ("Toronto", 43.6532, -79.3832, 2.8),
+    ("Mexico City", 19.4326, -99.1332, 9.2),
+    ("London", 51.5074, -0.1278, 8.9),
+    ("Mumbai", 19.0760, 72.8777, 12.4),
+    ("Hyderabad", 17.3850, 78.4867, 6.8),
+]
+
+# Spread of the points around a city center, in km
+CITY_SPREAD_KM = 12
+
+FIRST_NAMES = [
+    "James", "Mary", "Robert", "Patricia", "John", "Jennifer", "Michael", "Linda", "David",
+    "Elizabeth", "William", "Barbara", "Richard", "Susan", "Joseph", "Jessica", "Thomas",
+    "Sarah", "Priya", "Arjun", "Ananya", "Rahul", "Wei", "Mei", "Carlos", "Sofia", "Omar",
+    "Fatima", "Kenji", "Yuki", "Liam", "Emma", "Noah", "Olivia", "Mateo", "Isabella",
+]
+LAST_NAMES = [
+    "Smith", "Johnson", "Williams", "Brown", "Jones", "Garcia", "Miller", "Davis",
+    "Rodriguez", "Martinez", "Hernandez", "Lopez", "Gonzalez", "Wilson", "Anderson",
+    "Thomas", "Taylor", "Moore", "Jackson", "Martin", "Reddy", "Patel", "Kumar", "Chen",
+    "Wang", "Nguyen", "Kim", "Tanaka", "Khan", "Silva", "Rossi", "Muller",
+]
+NAME_PREFIXES = ["", "", "", "Mini ", "Giant ", "Sugar Free ", "Sour ", "Assorted ", "Classic ", "Tropical "]
+PACK_SIZES = ["", "", "- 1lb", "- 2lb", "- 5lb", "- 12ct", "- 24ct", "- 36ct", "- 80ct", "- 3oz"]
+
+# First id handed to generated candies, above every real candy id
+CANDY_ID_START = 90000000000000
+
+_BCRYPT_CHARS = "./ABCDEFGHIJKLMNOPQRSTUVWXYZabcdefghijklmnopqrstuvwxyz0123456789"
+
+
+def load_templates(directory="./categoryJson"):
+    """Returns [(category, category_id, [candy, ...])] from the category files, in load() order."""
+    templates = []
+    for category_id, path in enumerate(sorted(glob.glob(os.path.join(directory, "*.json")))):
+        with open(path) as f:
+            templates.append((category_name(path), category_id, list(json.load(f).values())))
+    return templates
+
+
+def bcrypt_salt(rng):
+    """A valid 22 character bcrypt salt drawn from rng (the last character only carries 2 bits)."""
+    return "".join(rng.choice(_BCRYPT_CHARS) for _ in range(21)) + rng.choice(".Oeu")
+
+
+def hash_password(job):
+    """bcrypt hash of one pool password. Runs in a worker process."""
+    index, seed, rounds = job
+    salt = bcrypt_salt(random.Random(f"{seed}-salt-{index}"))
+    return bcrypt.using(rounds=rounds, salt=salt).hash(f"password{index}")
+
+
+def generate_candies(job):
+    """
+    Generates candies [start, start + count) from the category templates.
+    Runs in a worker process.
+    """
+    start, count, seed, templates = job
+    rng = random.Random(f"{seed}-candies-{start}")
+
+    candies = []
+    for n in range(start, start + count):
+        category, category_id, examples = rng.choice(templates)
+        candy = dict(rng.choice(examples))
+        base_name = candy["name"].split(" - ")[0]
+
+        candy["id"] = str(CANDY_ID_START + n)
+        candy["name"] = f"{rng.choice(NAME_PREFIXES)}{base_name} {rng.choice(PACK_SIZES)}".strip()
+        candy["price"] = round(max(0.49, candy["price"] * rng.lognormvariate(0, 0.35)), 2)
+        candy["category"] = category
+        candy["category_id"] = category_id
+        candies.append(candy)
+    return candies
+
+
+def city_point(rng):
+    """A (latitude, longitude) near a city picked by population."""
+    _, latitude, longitude, _ = rng.choices(CITIES, weights=[city[3] for city in CITIES])[0]
+    north_km = rng.gauss(0, CITY_SPREAD_KM)
+    east_km = rng.gauss(0, CITY_SPREAD_KM)
+    latitude += north_km / 111.32
+    longitude += east_km / (111.32 * math.cos(math.radians(latitude)))
+    return round(latitude, 6), round(longitude, 6)
+
+
+def generate_users(job):
+    """
+    Generates users [start, start + count) and one location for each.
+    Runs in a worker process.
+
+    :return: (users, locations)
+    """
+    start, count, seed, hashes = job
+    rng = random.Random(f"{seed}-users-{start}")
+    now = datetime(2024, 5, 1)
+
+    users, locations = [], []
+    for n in range(start, start + count):
+        first = rng.choice(FIRST_NAMES)
+        last = rng.choice(LAST_NAMES)
+        email = f"{first}.{last}{n}@example.com".lower()
+
+        user = UserRegistration(first=first, last=last, email=email, password=hashes[n % len(hashes)])
+        users.append(user.dict())
+
+        latitude, longitude = city_point(rng)
+        timestamp = now - timedelta(seconds=rng.randrange(30 * 24 * 3600))
+        location = LocationData(email=email, latitude=latitude, longitude=longitude, timestamp=timestamp)
+        locations.append({
+            "email": location.email,
+            "location": {"type": "Point", "coordinates": [location.longitude, location.latitude]},
+            "timestamp": location.timestamp,
+        })
+    return users, locations
+
+
+def chunks(total, size):
+    """(start, count) pairs covering range(total)."""
+    return [(start, min(size, total - start)) for start in range(0, total, size)]
+
+
+def generate(**kwargs):
+    """
+    Drops and regenerates candies, categories, users and locations.
+
+    :param db: Database name (default candy_store).
+    :param candies: Number of candies (default 1,000,000).
+    :param users: Number of users, each with one location (default 100,000).
+    :param seed: Seed for every random choice (default 5373).
+    :param hash_pool: Distinct bcrypt hashes shared by the users (default 1000).
+    :param rounds: bcrypt cost (default 12, what passlib uses for register_user).
+    :param workers: Generator processes (default: number of cores).
+    :param writers: Insert threads (default 4).
+    :param queue_size: Chunks allowed to wait for a writer (default 8).
+    :return: Dictionary with candies, users, locations, errors and seconds.
+    """
+    db_name = kwargs.get("db", None) or "candy_store"
+    candy_count = kwargs.get("candies", 1_000_000)
+    user_count = kwargs.get("users", 100_000)
+    seed = kwargs.get("seed", 5373)
+    hash_pool = max(1, min(kwargs.get("hash_pool", 1000), user_count or 1))
+    rounds = kwargs.get("rounds", 12)
+    workers = kwargs.get("workers", None) or os.cpu_count()
+    writers = kwargs.get("writers", 4)
+    queue_size = kwargs.get("queue_size", 8)
+
+    db = MongoManager()
+
+    db.setDb(db_name)
+
+    for name in ("candies", "categories", "users", "locations"):
+        db.dropCollection(name)
+
+    templates = load_templates()
+    start = time.perf_counter()
+
+    def start_writers(name):
+        """A bounded queue with its own writer threads inserting into collection name."""
+        pipe = {"queue": queue.Queue(maxsize=queue_size), "stats": {"inserted": 0, "errors": []}, "lock": Lock()}
+        pipe["threads"] = [
+            Thread(target=writer, args=(db.collection_for(name), pipe["queue"], pipe["stats"], pipe["lock"],
+                                        GENERATE_CHUNK_SIZE), daemon=True)
+            for _ in range(writers)
+        ]
+        for thread in pipe["threads"]:
+            thread.start()
+        return pipe
+
+    def stop_writers(pipe):
+        for _ in pipe["threads"]:
+            pipe["queue"].put(None)
+        for thread in pipe["threads"]:
+            thread.join()
+        return pipe["stats"]
+
+    def progress(name, generated, total, since):
+        print(f"{name:<10}{generated:>12,} / {total:,}  {generated / (time.perf_counter() - since):,.0f} docs/sec")
+
+    result = {"errors": []}
+
+    with ProcessPoolExecutor(max_workers=workers) as pool:
+        # Candies
+        candies_pipe = start_writers("candies")
+        jobs = [(chunk_start, count, seed, templates) for chunk_start, count in chunks(candy_count, GENERATE_CHUNK_SIZE)]
+        generated = 0
+        for i, candies in enumerate(bounded_map(pool, generate_candies, jobs, workers * 2)):
+            # Blocks while the writers are queue_size chunks behind
+            candies_pipe["queue"].put(candies)
+            generated += len(candies)
+            if i % 10 == 9 or generated == candy_count:
+                progress("candies", generated, candy_count, start)
+        written = stop_writers(candies_pipe)
+        result["candies"] = written["inserted"]
+        result["errors"] += written["errors"]
+
+        db.collection_for("categories").bulk(
+            {"op": "insert", "document": {"_id": category_id, "name": category, "count": 0}}
+            for category, category_id, _ in templates
+        )
+
+        # Password hashes, then users and their locations
+        hash_start = time.perf_counter()
+        hashes = list(pool.map(hash_password, [(i, seed, rounds) for i in range(hash_pool)], chunksize=8))
+        print(f"{hash_pool:,} bcrypt hashes (cost {rounds}) in {time.perf_counter() - hash_start:.1f}s")
+
+        users_pipe = start_writers("users")
+        locations_pipe = start_writers("locations")
+        jobs = [(chunk_start, count, seed, hashes) for chunk_start, count in chunks(user_count, GENERATE_CHUNK_SIZE)]
+        users_start = time.perf_counter()
+        generated = 0
+        for i, (users, locations) in enumerate(bounded_map(pool, generate_users, jobs, workers * 2)):
+            users_pipe["queue"].put(users)
+            locations_pipe["queue"].put(locations)
+            generated += len(users)
+            if i % 10 == 9 or generated == user_count:
+                progress("users", generated, user_count, users_start)
+        for name, pipe in (("users", users_pipe), ("locations", locations_pipe)):
+            written = stop_writers(pipe)
+            result[name] = written["inserted"]
+            result["errors"] += written["errors"]
+
+    print(refresh_category_stats(db))
+    print(db.ensure_indexes())
+
+    result["seconds"] = round(time.perf_counter() - start, 2)
+    print(f"Generated {result['candies']:,} candies, {result['users']:,} users and {result['locations']:,} "
+          f"locations in {result['seconds']}s, {len(result['errors'])} errors")
+    return result
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Generate scale test data for candy_store.")
+    parser.add_argument("--db", default="candy_store")
+    parser.add_argument("--candies", type=int, default=1_000_000)
+    parser.add_argument("--users", type=int, default=100_000)
+    parser.add_argument("--seed", type=int, default=5373)
+    parser.add_argument("--hash-pool", type=int, default=1000)
+    parser.add_argument("--rounds", type=int, default=12)
+    parser.add_argument("--workers", type=int, default=None)
+    args = parser.parse_args()
+
+    generate(
+        db=args.db,
+        candies=args.candies,
+        users=args.users,
+        seed=args.seed,
+        hash_pool=args.hash_pool,
+        rounds=args.rounds,
+        workers=args.workers,
+    )
@@ -1,13 +1,33 @@
-# gunicorn_conf.py
-from multiprocessing import cpu_count
-
-bind = "kidsinvans.fun:8084"
-
-# Worker Options
-workers = cpu_count() + 1
-worker_class = 'uvicorn.workers.UvicornWorker'
-
-# Logging Options
-loglevel = 'debug'
-accesslog = '/var/log/fastapi/access_log/access.log'
-errorlog =  '/var/log/fastapi/error_log/error.log'
\ No newline at end of file
+# gunicorn_conf.py
+from multiprocessing import cpu_count
+import os
+
+bind = "kidsinvans.fun:8084"
+
+# Worker Options
+workers = cpu_count() + 1
+worker_class = 'uvicorn.workers.UvicornWorker'
+
+# Cache Options
+# All workers share one catalog cache (queryCache.py) instead of keeping a copy each,
+# so a write in any worker invalidates every worker's entries and ETags match across
+# workers. shm keeps it in /dev/shm on this host; set CANDY_CACHE_BACKEND=redis and
+# CANDY_CACHE_URL=redis://host:6379/0 to share it between hosts (or run cacheServer.py).
+os.environ.setdefault("CANDY_CACHE_BACKEND", "shm")
+
+
+def on_starting(server):
+    # Start every deployment with an empty shm cache and a new epoch, so no entry or
+    # ETag from the previous code version is served
+    if os.environ["CANDY_CACHE_BACKEND"] == "shm":
+        from cacheBackends import default_shm_path
+        path = os.environ.get("CANDY_CACHE_URL") or default_shm_path()
+        for suffix in ("", "-wal", "-shm"):
+            if os.path.exists(path + suffix):
+                os.remove(path + suffix)
+
+
+# Logging Options
+loglevel = 'debug'
+accesslog = '/var/log/fastapi/access_log/access.log'
+errorlog =  '/var/log/fastapi/error_log/error.log'
@@ -0,0 +1,269 @@
+"""
+Pre-renders every catalog and uploaded image into fixed size WebP variants, so
+/images/{image_id}?size= serves a file straight from disk and nothing is resized
+while a request waits.
+
+Sources:
+    uploaded images - the `path` of every upload in the images collection
+    catalog images  - ./catalogImages/<candy id>.<ext>, optionally downloaded from
+                      each candy's img_url first (--download)
+
+Each source is decoded once in a worker process and shrunk to every size in
+IMAGE_SIZES. Variants are content addressed (rendered_images/ab/ab12....webp), so
+identical images share one file and rebuilding never rewrites a file. The images
+collection records the variants of each image:
+
+    {"_id": ..., "metadata": {...}, "path": "...", "source_hash": "...",
+     "variants": {"thumb": {"path": ..., "width": ..., "height": ..., "bytes": ...}, ...}}
+
+Sources whose hash and variant files are unchanged are skipped.
+
+    python imageBuild.py             # render what is on disk
+    python imageBuild.py --download  # fetch missing catalog images first
+"""
+
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor
+from datetime import datetime
+from urllib.parse import urlsplit
+from urllib.request import urlopen
+from PIL import Image, ImageOps
+from rich import print
+import hashlib
+import glob
+import io
+import os
+import sys
+
+from mongoManager import MongoManager
+from loadMongo import file_hash
+
+
+# size name -> (longest side in pixels, WebP quality), largest first
+IMAGE_SIZES = {
+    "full": (1600, 85),
+    "medium": (640, 80),
+    "thumb": (160, 75),
+}
+
+RENDER_DIRECTORY = "./rendered_images/"
+CATALOG_IMAGE_DIRECTORY = "./catalogImages/"
+
+
+def write_content_addressed(data, directory, extension):
+    """
+    Stores data under directory/<first two hex chars>/<sha256>.<extension> unless a
+    file with that content already exists.
+
+    :return: Path of the stored file.
+    """
+    digest = hashlib.sha256(data).hexdigest()
+    folder = os.path.join(directory, digest[:2])
+    path = os.path.join(folder, f"{digest}.{extension}")
+
+    if not os.path.isfile(path):
+        os.makedirs(folder, exist_ok=True)
+        # Write to a temp name first so a reader never sees half a file
+        tmp_path = f"{path}.{os.getpid()}.tmp"
+        with open(tmp_path, "wb") as f:
+            f.write(data)
+        os.replace(tmp_path, path)
+
+    return path
+
+
+def render_variants(job):
+    """
+    Decodes one image and writes a WebP file for every size in IMAGE_SIZES.
+    Runs in a worker process. Images are never scaled up.
+
+    :param job: (source path, output directory)
+    :return: {"variants": {size: {path, width, height, bytes}}} or {"error": message}
+    """
+    source_path, directory = job
+
+    try:
+        with Image.open(source_path) as img:
+            # Apply the camera rotation before the EXIF data is dropped
+            img = ImageOps.exif_transpose(img)
+            has_alpha = img.mode in ("RGBA", "LA") or "transparency" in img.info
+            img = img.convert("RGBA" if has_alpha else "RGB")
+
+        variants = {}
+        for size, (longest_side, quality) in IMAGE_SIZES.items():
+            # Each size is shrunk from the previous (larger) one
+            img.thumbnail((longest_side, longest_side), Image.LANCZOS)
+
+            buffer = io.BytesIO()
+            img.save(buffer, format="WEBP", quality=quality, method=4)
+            data = buffer.getvalue()
+
+            variants[size] = {
+                "path": write_content_addressed(data, directory, "webp"),
+                "width": img.width,
+                "height": img.height,
+                "bytes": len(data),
+            }
+        return {"variants": variants}
+    except Exception as e:
+        return {"error": f"{source_path}: {e}"}
+
+
+def is_current(image_doc, source_hash):
+    """True when an images document already has every variant of this exact source."""
+    if not image_doc or image_doc.get("source_hash") != source_hash:
+        return False
+    variants = image_doc.get("variants", {})
+    return all(size in variants and os.path.isfile(variants[size]["path"]) for size in IMAGE_SIZES)
+
+
+def image_update(path, source_hash, rendered, metadata=None):
+    """The fields build_images and render_and_record $set on an images document."""
+    update = {
+        "path": path,
+        "source_hash": source_hash,
+        "variants": rendered["variants"],
+        "rendered_at": datetime.utcnow(),
+    }
+    if metadata is not None:
+        update["metadata"] = metadata
+    return update
+
+
+def render_and_record(images, image_id, path, directory=RENDER_DIRECTORY):
+    """
+    Renders the variants of a single (just uploaded) image in the calling process
+    and stores them on its images document.
+
+    :param images: MongoManager handle on the images collection.
+    :return: The variants, or None if the image could not be rendered.
+    """
+    rendered = render_variants((path, directory))
+    if "error" in rendered:
+        print(f"[red]{rendered['error']}[/red]")
+        return None
+
+    images.bulk([{
+        "op": "update",
+        "filter": {"_id": image_id},
+        "update": image_update(path, file_hash(path), rendered),
+    }])
+    return rendered["variants"]
+
+
+def catalog_image_sources(images, directory=CATALOG_IMAGE_DIRECTORY):
+    """Returns (filter, path, metadata, existing doc) for every catalog image file."""
+    existing = {
+        doc["candy_id"]: doc
+        for doc in images.get(query={"candy_id": {"$exists": True}}, raw=True)["data"]
+    }
+
+    sources = []
+    for path in sorted(glob.glob(os.path.join(directory, "*"))):
+        filename = os.path.basename(path)
+        candy_id = os.path.splitext(filename)[0]
+        metadata = {"candy_id": candy_id, "filename": filename}
+        sources.append(({"candy_id": candy_id}, path, metadata, existing.get(candy_id)))
+    return sources
+
+
+def uploaded_image_sources(images):
+    """Returns (filter, path, metadata, existing doc) for every uploaded image."""
+    uploads = images.get(query={"path": {"$exists": True}, "candy_id": {"$exists": False}}, raw=True)["data"]
+    return [({"_id": doc["_id"]}, doc["path"], None, doc) for doc in uploads]
+
+
+def download_catalog_images(mm, directory=CATALOG_IMAGE_DIRECTORY, threads=16):
+    """
+    Downloads the img_url of every candy that has no file in directory yet.
+    Downloads are I/O bound, so they run on a thread pool.
+
+    :return: Dictionary with downloaded, present and errors.
+    """
+    os.makedirs(directory, exist_ok=True)
+    present = {os.path.splitext(name)[0] for name in os.listdir(directory)}
+
+    urls = {}
+    for candy in mm.collection_for("candies").get(projection={"id": 1, "img_url": 1}, raw=True)["data"]:
+        if candy.get("img_url") and candy["id"] not in present:
+            urls[candy["id"]] = candy["img_url"]
+
+    def download(item):
+        candy_id, url = item
+        extension = os.path.splitext(urlsplit(url).path)[1] or ".jpg"
+        try:
+            with urlopen(url, timeout=30) as response:
+                data = response.read()
+            with open(os.path.join(directory, f"{candy_id}{extension}"), "wb") as f:
+                f.write(data)
+            return None
+        except Exception as e:
+            return f"{url}: {e}"
+
+    with ThreadPoolExecutor(max_workers=threads) as pool:
+        errors = [error for error in pool.map(download, urls.items()) if error]
+
+    return {"downloaded": len(urls) - len(errors), "present": len(present), "errors": errors}
+
+
+def build_images(mm, **kwargs):
+    """
+    Renders the variants of every catalog and uploaded image that changed since the
+    last build and records them in the images collection.
+
+    :param mm: MongoManager with a database selected.
+    :param workers: Render processes (default: number of cores).
+    :param directory: Where variants are written (default ./rendered_images/).
+    :param catalog_directory: Where catalog images are read from (default ./catalogImages/).
+    :return: Dictionary with rendered, unchanged, missing and errors.
+    """
+    workers = kwargs.get("workers", None) or os.cpu_count()
+    directory = kwargs.get("directory", RENDER_DIRECTORY)
+    catalog_directory = kwargs.get("catalog_directory", CATALOG_IMAGE_DIRECTORY)
+
+    images = mm.collection_for("images")
+    sources = uploaded_image_sources(images) + catalog_image_sources(images, catalog_directory)
+
+    result = {"rendered": 0, "unchanged": 0, "missing": [], "errors": []}
+    jobs = []
+    for filter_query, path, metadata, existing in sources:
+        if not path or not os.path.isfile(path):
+            result["missing"].append(path)
+            continue
+        source_hash = file_hash(path)
+        if is_current(existing, source_hash):
+            result["unchanged"] += 1
+        else:
+            jobs.append((filter_query, path, metadata, source_hash))
+
+    with ProcessPoolExecutor(max_workers=workers) as pool:
+        rendered = pool.map(render_variants, [(path, directory) for _, path, _, _ in jobs], chunksize=8)
+
+        operations = []
+        for (filter_query, path, metadata, source_hash), output in zip(jobs, rendered):
+            if "error" in output:
+                result["errors"].append(output["error"])
+                continue
+            operations.append({
+                "op": "upsert",
+                "filter": filter_query,
+                "update": image_update(path, source_hash, output, metadata),
+            })
+
+    written = images.bulk(operations)
+    result["rendered"] = len(operations)
+    result["errors"].extend(written["errors"])
+
+    print(
+        f"Rendered {result['rendered']} images ({len(IMAGE_SIZES)} sizes each), "
+        f"{result['unchanged']} unchanged, {len(result['missing'])} missing, {len(result['errors'])} errors"
+    )
+    return result
+
+
+if __name__ == "__main__":
+    mm = MongoManager(db="candy_store")
+
+    if "--download" in sys.argv[1:]:
+        print(download_catalog_images(mm))
+
+    build_images(mm)
@@ -1,11 +1,43 @@
 """
 This file opens up the folder categoryJson and processes each json file
 adding the category name to each candy document and posting it to mongodb
+
+The load is a streaming pipeline:
+
+    category files --(process pool: parse + stamp category)--> batches
+        --(bounded queue)--> writer threads --(unordered bulk inserts)--> mongo
+
+Parsing runs in parallel across cores, the bounded queue keeps memory flat when
+mongo is slower than the parsers, and each writer sends whole batches per round trip.
+
+Both load() and reload() keep a manifest collection with one entry per category
+file: the file's hash, its category id and a hash of every candy in it. reload()
+uses it to only re-parse files whose hash changed, upsert the candies that are new
+or different, and delete the ones that disappeared, without dropping anything:
+
+    python loadMongo.py            # full drop and load
+    python loadMongo.py reload     # incremental
+
+Both write through the catalog query cache (queryCache.py) and bump the candies and
+categories generations when they finish. With a shared cache backend (shm or redis,
+as the api runs under gunicorn) that invalidates the workers' cached reads and
+ETags, and their in-memory indexes see the new generation and rebuild. With the
+default per-process memory backend the api only catches up when its cache entries
+expire and its indexes reach max_age.
 """
 
 from mongoManager import MongoManager
+from categoryStats import refresh_category_stats
+from queryCache import catalog_cache
+from concurrent.futures import ProcessPoolExecutor
+from threading import Thread, Lock
+from datetime import datetime
+import hashlib
+import queue
 import json
 import glob
+import os
+import time
 from rich import print
 import base64
 from PIL import Image
@@ -22,62 +54,354 @@ def convert_jpg_to_png_in_memory(jpg_path):
         # Seek to the beginning of the stream
         in_memory_file.seek(0)
         return in_memory_file.getvalue()
-    
-def load(**kwargs):
-    json_files = glob.glob("./categoryJson/*.json")
 
-    username = kwargs.get("username", None)
-    password = kwargs.get("password", None)
-    db = kwargs.get("db", None)
-    collection1 = kwargs.get("collection1", None)
-    collection2 = kwargs.get("collection2", None)
 
-    print(collection1)
-    print(collection2)
+def category_name(path):
+    """Turns ./categoryJson/hard-candy.json into 'Hard Candy'."""
+    return os.path.basename(path)[:-5].replace("-", " ").title()
 
-    # db1 = MongoManager(username=username, password=password, db=db)
-    # db2 = MongoManager(username=username, password=password, db=db)
 
-    db = MongoManager()
-    # db2 = MongoManager()
+MANIFEST_COLLECTION = "manifest"
 
-    db.setDb("candy_store")
 
-    db.dropCollection("candies")
+def file_hash(path):
+    """sha256 of a file's bytes."""
+    digest = hashlib.sha256()
+    with open(path, "rb") as f:
+        for chunk in iter(lambda: f.read(1 << 20), b""):
+            digest.update(chunk)
+    return digest.hexdigest()
+
+
+def candy_hash(item):
+    """Stable hash of a candy record as it appears in its category file."""
+    return hashlib.sha1(json.dumps(item, sort_keys=True).encode()).hexdigest()
+
+
+def parse_category_file(job):
+    """
+    Reads one category file and stamps every candy with its category.
+    Runs in a worker process.
+
+    :param job: (category_id, path)
+    :return: (category summary document, list of candy documents, manifest entry)
+    """
+    category_id, path = job
+    category = category_name(path)
+
+    with open(path, "rb") as f:
+        raw = f.read()
+    data = json.loads(raw)
+
+    candies = []
+    hashes = {}
+    for id, item in data.items():
+        hashes[id] = candy_hash(item)
+        item["category"] = category
+        item["category_id"] = category_id
+        candies.append(item)
+
+    summary = {"_id": category_id, "name": category, "count": len(candies)}
+    entry = {
+        "_id": os.path.basename(path),
+        "category": category,
+        "category_id": category_id,
+        "file_hash": hashlib.sha256(raw).hexdigest(),
+        "candies": hashes,
+        "updated_at": datetime.utcnow(),
+    }
+    return summary, candies, entry
 
-    db.setCollection("categories")
+
+def bounded_map(pool, fn, jobs, window):
+    """
+    Like pool.map but keeps at most `window` jobs in flight, so parsed results do
+    not pile up in memory while the writers are behind. Results come back in order.
+    """
+    pending = []
+    for job in jobs:
+        pending.append(pool.submit(fn, job))
+        if len(pending) >= window:
+            yield pending.pop(0).result()
+    for future in pending:
+        yield future.result()
+
+
+def invalidate_catalog(db):
+    """Starts new cache generations for the catalog collections after a load or reload."""
+    if db.query_cache is None:
+        return
+    for name in ("candies", "categories"):
+        db.query_cache.bump(db.collection_for(name).collection.full_name)
+
+
+def writer(handle, batches, stats, lock, batch_size):
+    """
+    Writer thread: inserts batches from the queue until it receives None. A batch
+    that fails with anything bulk() does not handle (a document BSON cannot encode)
+    is recorded as an error and the thread keeps draining, because a dead writer
+    would leave load() blocked forever on the full queue.
+    """
+    while True:
+        batch = batches.get()
+        if batch is None:
+            break
+
+        try:
+            result = handle.bulk(({"op": "insert", "document": doc} for doc in batch), batch_size=batch_size)
+        except Exception as e:
+            result = {"inserted": 0, "errors": [{"message": f"{type(e).__name__}: {e}", "documents": len(batch)}]}
+
+        with lock:
+            stats["inserted"] += result["inserted"]
+            stats["errors"].extend(result["errors"])
+
+
+def load(**kwargs):
+    """
+    Drops and reloads the candies, categories and images collections.
+
+    :param db: Database name (default candy_store).
+    :param workers: Parser processes (default: number of cores).
+    :param writers: Insert threads (default 4).
+    :param batch_size: Candies per bulk insert (default 1000).
+    :param queue_size: Batches allowed to wait for a writer (default 8).
+    :return: Dictionary with categories, inserted, errors, seconds and docs_per_sec.
+    """
+    json_files = sorted(glob.glob("./categoryJson/*.json"))
+
+    db_name = kwargs.get("db", None) or "candy_store"
+    workers = kwargs.get("workers", None) or os.cpu_count()
+    writers = kwargs.get("writers", 4)
+    batch_size = kwargs.get("batch_size", 1000)
+    queue_size = kwargs.get("queue_size", 8)
+
+    db = MongoManager(query_cache=catalog_cache)
+
+    db.setDb(db_name)
+
+    db.dropCollection("candies")
 
     db.dropCollection("categories")
 
     db.dropCollection("images")
 
-    i = 0
-    for file in json_files:
+    db.dropCollection(MANIFEST_COLLECTION)
+
+    candies = db.collection_for("candies")
+    batches = queue.Queue(maxsize=queue_size)
+    stats = {"inserted": 0, "errors": []}
+    lock = Lock()
+
+    threads = [
+        Thread(target=writer, args=(candies, batches, stats, lock, batch_size), daemon=True)
+        for _ in range(writers)
+    ]
+    for thread in threads:
+        thread.start()
+
+    categories = []
+    manifest = []
+    parsed = 0
+    start = time.perf_counter()
+
+    with ProcessPoolExecutor(max_workers=workers) as pool:
+        for summary, docs, entry in bounded_map(pool, parse_category_file, enumerate(json_files), workers * 2):
+            categories.append(summary)
+            manifest.append(entry)
+
+            for i in range(0, len(docs), batch_size):
+                # Blocks while the writers are queue_size batches behind
+                batches.put(docs[i:i + batch_size])
+
+            parsed += len(docs)
+            elapsed = time.perf_counter() - start
+            with lock:
+                inserted = stats["inserted"]
+            print(
+                f"{summary['name']:<32} {len(docs):>6} candies | parsed {parsed:,} "
+                f"inserted {inserted:,} | {inserted / elapsed:,.0f} docs/sec"
+            )
+
+    for _ in threads:
+        batches.put(None)
+    for thread in threads:
+        thread.join()
+
+    db.collection_for("categories").bulk({"op": "insert", "document": summary} for summary in categories)
+
+    # Add price ranges, averages and last_updated to the category documents
+    print(refresh_category_stats(db))
+
+    # Only record the manifest for a clean load, so reload() redoes everything otherwise
+    if not stats["errors"]:
+        db.collection_for(MANIFEST_COLLECTION).bulk({"op": "insert", "document": entry} for entry in manifest)
+
+    elapsed = time.perf_counter() - start
+    result = {
+        "categories": len(categories),
+        "inserted": stats["inserted"],
+        "errors": stats["errors"],
+        "seconds": round(elapsed, 2),
+        "docs_per_sec": round(stats["inserted"] / elapsed) if elapsed else 0,
+    }
+    print(f"Loaded {result['inserted']:,} candies in {result['categories']} categories "
+          f"in {result['seconds']}s ({result['docs_per_sec']:,} docs/sec), {len(result['errors'])} errors")
+
+    # Recreate the indexes the api relies on (the collections were dropped above)
+    print(db.ensure_indexes())
+    invalidate_catalog(db)
+
+    return result
+
+
+def category_ids(db, manifest, json_files):
+    """
+    Returns {file name: category_id} for json_files. Files already in the manifest
+    (or, on the first reload after an old style load, already in categories by name)
+    keep their id; new files get the next free ids in sorted order.
+    """
+    by_name = {
+        category["name"]: category["_id"]
+        for category in db.collection_for("categories").get(raw=True)["data"]
+    }
+
+    ids = {}
+    for path in json_files:
+        name = os.path.basename(path)
+        if name in manifest:
+            ids[name] = manifest[name]["category_id"]
+        elif category_name(path) in by_name:
+            ids[name] = by_name[category_name(path)]
+
+    used = set(ids.values()) | {entry["category_id"] for entry in manifest.values()}
+    next_id = max(used, default=-1) + 1
+    for path in json_files:
+        name = os.path.basename(path)
+        if name not in ids:
+            ids[name] = next_id
+            next_id += 1
+    return ids
+
+
+def diff_operations(docs, entry, old_entry):
+    """
+    Returns the bulk() operations that bring one category's candies from old_entry
+    to entry: a replace/upsert for every new or changed candy and a delete for every
+    candy that is no longer in the file. Candies are keyed on (id, category_id)
+    because the same candy is listed under several categories.
+    """
+    category_id = entry["category_id"]
+    old_hashes = old_entry["candies"] if old_entry else {}
+    new_hashes = entry["candies"]
+
+    operations = [
+        {
+            "op": "replace",
+            "filter": {"id": doc["id"], "category_id": category_id},
+            "document": doc,
+            "upsert": True,
+        }
+        for doc in docs
+        if old_hashes.get(doc["id"]) != new_hashes[doc["id"]]
+    ]
+    operations += [
+        {"op": "delete", "filter": {"id": id, "category_id": category_id}}
+        for id in old_hashes.keys() - new_hashes.keys()
+    ]
+    return operations
+
+
+def reload(**kwargs):
+    """
+    Incrementally brings the catalog in line with categoryJson without dropping
+    anything. Unchanged files are skipped on their hash alone, changed files only
+    write the candies that differ, and files that were removed take their candies
+    and category with them. Running it twice in a row writes nothing the second time.
+
+    :param db: Database name (default candy_store).
+    :param workers: Parser processes (default: number of cores).
+    :param batch_size: Operations per bulk write (default 1000).
+    :return: Dictionary with unchanged, changed, added, removed (file names),
+             upserted, deleted and errors.
+    """
+    json_files = sorted(glob.glob("./categoryJson/*.json"))
+
+    db_name = kwargs.get("db", None) or "candy_store"
+    workers = kwargs.get("workers", None) or os.cpu_count()
+    batch_size = kwargs.get("batch_size", 1000)
+
+    db = MongoManager(query_cache=catalog_cache)
+
+    db.setDb(db_name)
+
+    candies = db.collection_for("candies")
+    categories = db.collection_for("categories")
+    manifests = db.collection_for(MANIFEST_COLLECTION)
+
+    manifest = {entry["_id"]: entry for entry in manifests.get(raw=True)["data"]}
+    ids = category_ids(db, manifest, json_files)
+
+    result = {"unchanged": [], "changed": [], "added": [], "removed": [], "upserted": 0, "deleted": 0, "errors": []}
+    start = time.perf_counter()
+
+    jobs = []
+    touched = []
+    for path in json_files:
+        name = os.path.basename(path)
+        old_entry = manifest.get(name)
+        if old_entry and old_entry["file_hash"] == file_hash(path):
+            result["unchanged"].append(name)
+        else:
+            jobs.append((ids[name], path))
+
+    with ProcessPoolExecutor(max_workers=workers) as pool:
+        for summary, docs, entry in bounded_map(pool, parse_category_file, jobs, workers * 2):
+            name = entry["_id"]
+            old_entry = manifest.get(name)
+
+            written = candies.bulk(diff_operations(docs, entry, old_entry), batch_size=batch_size)
+            written["errors"] += categories.bulk([{
+                "op": "upsert",
+                "filter": {"_id": summary["_id"]},
+                "update": {"name": summary["name"], "count": summary["count"]},
+            }])["errors"]
+            touched.append(summary["_id"])
+
+            result["upserted"] += written["upserted"] + written["matched"]
+            result["deleted"] += written["deleted"]
+            result["changed" if old_entry else "added"].append(name)
 
-        print(file)
-        parts = file.split("/")
-        category = parts[-1][:-5].replace("-", " ").title()
+            if written["errors"]:
+                # Leave the old manifest entry so the next reload retries this file
+                result["errors"].extend(written["errors"])
+                print(f"[red]{name}: {len(written['errors'])} errors[/red]")
+                continue
 
-        print(category)
+            manifests.bulk([{"op": "replace", "filter": {"_id": name}, "document": entry, "upsert": True}])
+            print(f"{summary['name']:<32} {written['upserted'] + written['matched']:>6} upserted {written['deleted']:>6} deleted")
 
-        summary = {}
+    on_disk = {os.path.basename(path) for path in json_files}
+    for name, entry in manifest.items():
+        if name in on_disk:
+            continue
+        written = candies.bulk([{"op": "delete", "filter": {"category_id": entry["category_id"]}, "many": True}])
+        categories.bulk([{"op": "delete", "filter": {"_id": entry["category_id"]}}])
+        manifests.bulk([{"op": "delete", "filter": {"_id": name}}])
+        result["deleted"] += written["deleted"]
+        result["removed"].append(name)
+        print(f"{entry['category']:<32} removed ({written['deleted']} candies)")
 
-        with open(file) as f:
-            data = json.load(f)
+    print(refresh_category_stats(db, touched))
+    invalidate_catalog(db)
 
-            summary["count"] = len(data)
-            summary["name"] = category
-            summary["_id"] = i
+    print(
+        f"Reloaded in {time.perf_counter() - start:.2f}s: {len(result['unchanged'])} unchanged, "
+        f"{len(result['changed'])} changed, {len(result['added'])} added, {len(result['removed'])} removed files; "
+        f"{result['upserted']} upserted, {result['deleted']} deleted, {len(result['errors'])} errors"
+    )
 
-            for id, item in data.items():
-                item["category"] = category
-                item["category_id"] = i
-                print(item)
-                db.setCollection("candies")
-                db.post(item)
-        db.setCollection("categories")
-        db.post(summary)
-        i += 1
+    return result
 
 
 if __name__ == "__main__":
@@ -90,4 +414,7 @@ if __name__ == "__main__":
         "collection2": "categories",
     }
 
-    load(**kwargs)
+    if len(sys.argv) > 1 and sys.argv[1] == "reload":
+        reload(**kwargs)
+    else:
+        load(**kwargs)
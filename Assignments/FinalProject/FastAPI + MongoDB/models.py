@@ -0,0 +1,68 @@
+"""
+Pydantic models shared by the sync routes in api.py and the async routes in asyncApi.py.
+"""
+
+from pydantic import BaseModel
+from datetime import datetime
+from typing import Optional
+
+
+class Person(BaseModel):
+    firstName: str
+    lastName: str 
+    email: str
+    password: str 
+
+class Candy(BaseModel):
+    name: str
+    category: str
+    description: str
+    price: float
+    quantity: int
+    image_url: str
+
+# Partial update for PUT /candies/{candy_id}: only the fields sent are changed
+class CandyUpdate(BaseModel):
+    name: Optional[str] = None
+    category: Optional[str] = None
+    description: Optional[str] = None
+    price: Optional[float] = None
+    quantity: Optional[int] = None
+    image_url: Optional[str] = None
+
+# Data model for user registration
+class UserRegistration(BaseModel):
+    first: str
+    last: str
+    email: str
+    password: str
+
+# Data model for user login
+class UserLogin(BaseModel):
+    email: str
+    password: str
+
+class LocationData(BaseModel):
+    email: str
+    latitude: float
+    longitude: float
+    timestamp: datetime = datetime.utcnow()
+
+
+# Fields each route is allowed to send back. They are passed to MongoManager.get
+# as the projection, so everything else (candy descriptions, product links,
+# password hashes, server file paths) stays in the database.
+ROUTE_FIELDS = {
+    "/candies": {"id": 1, "name": 1, "price": 1, "category": 1, "category_id": 1},
+    "/categories": {"name": 1, "count": 1, "min_price": 1, "max_price": 1, "avg_price": 1, "last_updated": 1},
+    # SearchingPage renders the image and product link of every candy in a category
+    "/candies/category/{category}": {"id": 1, "name": 1, "price": 1, "img_url": 1, "prod_url": 1},
+    "/candies/id/{id}": {"_id": 0, "id": 1, "name": 1, "price": 1, "category": 1},
+    "/candies/price": {"_id": 0, "name": 1, "price": 1, "category": 1},
+    "/candies/search": {"_id": 0, "id": 1, "name": 1, "price": 1, "category": 1, "img_url": 1},
+    "/candies/suggest": {"_id": 0, "id": 1, "name": 1},
+    "/candies/facets": {"_id": 0, "id": 1, "name": 1, "price": 1, "category": 1, "img_url": 1},
+    "/users": {"first": 1, "last": 1, "email": 1, "image": 1, "created_at": 1},
+    "/locations": {"email": 1, "location": 1, "timestamp": 1},
+    "/images": {"metadata": 1},
+}
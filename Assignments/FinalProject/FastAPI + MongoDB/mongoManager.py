@@ -1,5 +1,6 @@
-from pymongo import MongoClient, ASCENDING, DESCENDING, GEOSPHERE
-from pymongo.errors import PyMongoError
+from pymongo import MongoClient, ASCENDING, DESCENDING, GEOSPHERE, monitoring
+from pymongo import InsertOne, UpdateOne, UpdateMany, ReplaceOne, DeleteOne, DeleteMany
+from pymongo.errors import PyMongoError, ConnectionFailure, OperationFailure, BulkWriteError
 from rich import print
 from rich.console import Console
 from rich.traceback import install
@@ -8,13 +9,19 @@ import sys
 from bson.objectid import ObjectId
 from bson.errors import InvalidId
 import base64
+import copy
 from PIL import Image
 from passlib.hash import bcrypt
 import io
 from datetime import datetime
-from bson import ObjectId
+from bson import ObjectId, json_util
 import logging
+import os
+from threading import Lock
 from typing import Optional
+from urllib.parse import urlsplit, urlunsplit
+
+from queryCache import invalidates_cache
 
 
 
@@ -36,10 +43,525 @@ def is_valid_object_id(id_str):
         return False
 
 
+def id_query(value, field="id"):
+    """
+    Query for a document addressed by either its ObjectId or its own id field,
+    e.g. a candy by _id or by its catalog id.
+    """
+    if is_valid_object_id(value):
+        return {"_id": ObjectId(value)}
+    return {field: value}
+
+
 # Set up Rich to pretty-print tracebacks
 install()
 
 
+# Pool settings used when a client is first opened for a connection url.
+# They can be overridden per url through the MongoManager keyword arguments
+# max_pool_size, min_pool_size, max_idle_time_ms and wait_queue_timeout_ms.
+DEFAULT_POOL_OPTIONS = {
+    "maxPoolSize": 100,
+    "minPoolSize": 0,
+    "maxIdleTimeMS": 60000,
+    "waitQueueTimeoutMS": 5000,
+}
+
+
+def mask_connection_url(connection_url):
+    """Returns the connection url with any password replaced by ***."""
+    parts = urlsplit(connection_url)
+    if parts.password is None:
+        return connection_url
+    netloc = parts.netloc.replace(f":{parts.password}@", ":***@", 1)
+    return urlunsplit(parts._replace(netloc=netloc))
+
+
+class PoolStatsListener(monitoring.ConnectionPoolListener):
+    """
+    Counts connection pool events for a single client so the registry can
+    report how many sockets are open, busy and how often checkouts fail.
+    """
+
+    def __init__(self):
+        self._lock = Lock()
+        self.counts = {
+            "created": 0,
+            "closed": 0,
+            "checked_out": 0,
+            "checkouts": 0,
+            "checkout_failures": 0,
+            "pool_cleared": 0,
+        }
+
+    def _bump(self, key, amount=1):
+        with self._lock:
+            self.counts[key] += amount
+
+    def snapshot(self):
+        with self._lock:
+            counts = dict(self.counts)
+        counts["open"] = counts["created"] - counts["closed"]
+        counts["idle"] = counts["open"] - counts["checked_out"]
+        return counts
+
+    def pool_created(self, event):
+        pass
+
+    def pool_ready(self, event):
+        pass
+
+    def pool_cleared(self, event):
+        self._bump("pool_cleared")
+
+    def pool_closed(self, event):
+        pass
+
+    def connection_created(self, event):
+        self._bump("created")
+
+    def connection_ready(self, event):
+        pass
+
+    def connection_closed(self, event):
+        self._bump("closed")
+
+    def connection_check_out_started(self, event):
+        pass
+
+    def connection_check_out_failed(self, event):
+        self._bump("checkout_failures")
+
+    def connection_checked_out(self, event):
+        with self._lock:
+            self.counts["checked_out"] += 1
+            self.counts["checkouts"] += 1
+
+    def connection_checked_in(self, event):
+        self._bump("checked_out", -1)
+
+
+class ClientRegistry:
+    """
+    Process-wide registry of MongoClient instances keyed by connection url.
+
+    MongoClient is thread safe and keeps its own connection pool, so every
+    MongoManager talking to the same server should borrow the same client
+    instead of opening a new one (and paying for the TCP handshake and the
+    ismaster ping) on every request.
+    """
+
+    def __init__(self, client_class=None, ping=True):
+        """
+        :param client_class: Client type to create. Defaults to MongoClient; the async
+                             manager passes AsyncIOMotorClient.
+        :param ping: Send an ismaster ping when a client is created (sync clients only).
+        """
+        self._lock = Lock()
+        self._clients = {}
+        self._pid = os.getpid()
+        self.client_class = client_class
+        self.ping = ping
+
+    def get(self, connection_url, **pool_options):
+        """
+        Returns the shared client for connection_url, creating it on first use.
+
+        :param connection_url: Mongo connection url.
+        :param pool_options: MongoClient pool options (maxPoolSize, maxIdleTimeMS, ...).
+                             Only used when the client is created.
+        :return: MongoClient
+        """
+        with self._lock:
+            # Clients must not be shared across a fork (gunicorn workers).
+            if os.getpid() != self._pid:
+                self._clients = {}
+                self._pid = os.getpid()
+
+            entry = self._clients.get(connection_url)
+            if entry is not None:
+                return entry["client"]
+
+            options = {**DEFAULT_POOL_OPTIONS, **pool_options}
+            listener = PoolStatsListener()
+            client_class = self.client_class or MongoClient
+            client = client_class(connection_url, event_listeners=[listener], **options)
+
+            self._clients[connection_url] = {
+                "client": client,
+                "listener": listener,
+                "options": options,
+            }
+
+        # Outside the lock: an unreachable server must not hold up other urls' lookups
+        if self.ping:
+            try:
+                # The ismaster command is cheap and does not require auth.
+                client.admin.command("ismaster")
+            except ConnectionFailure:
+                print("Server not available")
+        return client
+
+    def stats(self):
+        """
+        Returns pool statistics for every registered client keyed by masked url.
+        """
+        with self._lock:
+            entries = list(self._clients.items())
+
+        return {
+            mask_connection_url(url): {
+                "options": entry["options"],
+                "pool": entry["listener"].snapshot(),
+            }
+            for url, entry in entries
+        }
+
+    def close_all(self):
+        """Closes every registered client and empties the registry."""
+        with self._lock:
+            entries = list(self._clients.values())
+            self._clients = {}
+
+        for entry in entries:
+            entry["client"].close()
+
+
+client_registry = ClientRegistry()
+
+
+def pool_stats():
+    """Shortcut for client_registry.stats()."""
+    return client_registry.stats()
+
+
+def build_connection_url(**kwargs):
+    """
+    Builds a mongo connection url from username, password, host, port and db.
+    Without credentials a plain mongodb://host:port/ url is returned.
+    """
+    username = kwargs.get("username", None)
+    password = kwargs.get("password", None)
+    host = kwargs.get("host", "localhost")
+    port = kwargs.get("port", "27017")
+    db = kwargs.get("db", None)
+
+    if username is None and password is None:
+        return f"mongodb://{host}:{port}/"
+    return f"mongodb://{username}:{password}@{host}:{port}/{db}?authSource=admin"
+
+
+def pool_options_from(kwargs):
+    """
+    Maps the MongoManager pool keyword arguments onto MongoClient option names,
+    dropping the ones that were not given.
+    """
+    pool_options = {
+        "maxPoolSize": kwargs.get("max_pool_size"),
+        "minPoolSize": kwargs.get("min_pool_size"),
+        "maxIdleTimeMS": kwargs.get("max_idle_time_ms"),
+        "waitQueueTimeoutMS": kwargs.get("wait_queue_timeout_ms"),
+    }
+    return {k: v for k, v in pool_options.items() if v is not None}
+
+
+# Indexes every hot query relies on, per collection. Applied idempotently by
+# MongoManager.ensure_indexes() at worker start and at the end of loadMongo.load().
+# Each spec is passed to create_index: keys plus any create_index options.
+INDEX_SPECS = {
+    "candies": [
+        # /candies/category/{category}, paged in _id order
+        {"keys": [("category", ASCENDING), ("_id", ASCENDING)]},
+        {"keys": [("category_id", ASCENDING), ("_id", ASCENDING)]},
+        # /candies/price range scans, returned in price order
+        {"keys": [("price", ASCENDING), ("_id", ASCENDING)]},
+        {"keys": [("category_id", ASCENDING), ("price", ASCENDING), ("_id", ASCENDING)]},
+        # /candies/id/{id}, /image and PUT /candies/{id}
+        {"keys": [("id", ASCENDING)]},
+        # name ordered listings (query 8 demo)
+        {"keys": [("name", ASCENDING), ("_id", ASCENDING)]},
+    ],
+    "categories": [
+        # category_id_for() upserts new categories on their name
+        {"keys": [("name", ASCENDING)], "unique": True},
+    ],
+    "users": [
+        {"keys": [("email", ASCENDING)], "unique": True},
+    ],
+    "locations": [
+        {"keys": [("email", ASCENDING)], "unique": True},
+        {"keys": [("location", GEOSPHERE)]},
+    ],
+    "images": [
+        # catalog images rendered by imageBuild.py, looked up by candy id
+        {"keys": [("candy_id", ASCENDING)], "unique": True, "sparse": True},
+    ],
+}
+
+
+def index_name(keys):
+    """Returns the name mongo gives an index on keys by default (e.g. price_1)."""
+    return "_".join(f"{field}_{direction}" for field, direction in keys)
+
+
+def query_shape(value):
+    """
+    Returns the shape of a query: the same structure with every literal value
+    replaced by its type name, so {"price": {"$gte": 1}} and {"price": {"$gte": 5}}
+    share one shape.
+    """
+    if isinstance(value, dict):
+        return {k: query_shape(v) for k, v in sorted(value.items())}
+    if isinstance(value, (list, tuple)):
+        shapes = []
+        for item in value:
+            shape = query_shape(item)
+            if shape not in shapes:
+                shapes.append(shape)
+        return shapes
+    return type(value).__name__
+
+
+def summarize_plan(explain):
+    """
+    Pulls the winning plan and execution counters out of an explain() result.
+    Handles both the classic planner and the slot based engine layout.
+    """
+    planner = explain.get("queryPlanner", {})
+    plan = planner.get("winningPlan", {})
+    plan = plan.get("queryPlan", plan)
+
+    stages = []
+    indexes = []
+    node = plan
+    while node:
+        stages.append(node.get("stage", "?"))
+        if node.get("indexName"):
+            indexes.append(node["indexName"])
+        children = node.get("inputStages") or ([node["inputStage"]] if "inputStage" in node else [])
+        # Follow the first child; OR/SORT_MERGE children are summarized by their stage names
+        for child in children[1:]:
+            stages.append(child.get("stage", "?"))
+            if child.get("indexName"):
+                indexes.append(child["indexName"])
+        node = children[0] if children else None
+
+    execution = explain.get("executionStats", {})
+    return {
+        "winning_plan": " <- ".join(stages),
+        "indexes": indexes,
+        "collscan": "COLLSCAN" in stages,
+        "keys_examined": execution.get("totalKeysExamined"),
+        "docs_examined": execution.get("totalDocsExamined"),
+        "docs_returned": execution.get("nReturned"),
+        "execution_ms": execution.get("executionTimeMillis"),
+    }
+
+
+class PlanRecorder:
+    """
+    Keeps the explain() summary of each distinct query shape seen by MongoManagers
+    running with explain enabled. Each shape is explained once per process (until
+    reset) so turning explain on does not double the cost of every query.
+    """
+
+    def __init__(self):
+        self._lock = Lock()
+        self._plans = {}
+
+    def seen(self, key):
+        with self._lock:
+            return key in self._plans
+
+    def record(self, key, entry):
+        with self._lock:
+            previous = self._plans.get(key)
+            entry["times_explained"] = (previous["times_explained"] if previous else 0) + 1
+            self._plans[key] = entry
+
+    def stats(self):
+        """Returns the recorded plans, COLLSCANs first."""
+        with self._lock:
+            plans = [dict(entry) for entry in self._plans.values()]
+        return sorted(plans, key=lambda entry: (not entry["collscan"], entry["collection"]))
+
+    def reset(self):
+        with self._lock:
+            self._plans = {}
+
+
+plan_recorder = PlanRecorder()
+
+
+# Operations sent per bulk_write round trip by MongoManager.bulk()
+DEFAULT_BULK_BATCH_SIZE = 1000
+
+# pymongo write models bulk() passes through untouched
+WRITE_MODELS = (InsertOne, UpdateOne, UpdateMany, ReplaceOne, DeleteOne, DeleteMany)
+
+
+def as_update(update_data):
+    """Wraps plain field updates in $set, the same way put() does."""
+    if not any(key.startswith("$") for key in update_data.keys()):
+        return {"$set": update_data}
+    return update_data
+
+
+def to_write_model(operation):
+    """
+    Converts one bulk() operation dict into a pymongo write model.
+
+        {"op": "insert", "document": {...}}
+        {"op": "update", "filter": {...}, "update": {...}, "many": False, "upsert": False}
+        {"op": "upsert", "filter": {...}, "update": {...}}
+        {"op": "replace", "filter": {...}, "document": {...}, "upsert": False}
+        {"op": "delete", "filter": {...}, "many": False}
+
+    :raises ValueError: For an unknown op or missing fields.
+    """
+    if isinstance(operation, WRITE_MODELS):
+        return operation
+
+    try:
+        op = operation["op"]
+        if op == "insert":
+            return InsertOne(operation["document"])
+        if op in ("update", "upsert"):
+            upsert = op == "upsert" or operation.get("upsert", False)
+            model = UpdateMany if operation.get("many", False) else UpdateOne
+            return model(operation["filter"], as_update(operation["update"]), upsert=upsert)
+        if op == "replace":
+            return ReplaceOne(operation["filter"], operation["document"], upsert=operation.get("upsert", False))
+        if op == "delete":
+            model = DeleteMany if operation.get("many", False) else DeleteOne
+            return model(operation["filter"])
+    except (KeyError, TypeError, AttributeError) as e:
+        raise ValueError(f"Malformed bulk operation {operation!r}: {e}")
+
+    raise ValueError(f"Unknown bulk operation {op!r}")
+
+
+# Number of documents the server returns per cursor round trip in get()
+DEFAULT_BATCH_SIZE = 500
+
+
+def convert_document(item):
+    """Returns a copy of a document with its top level ObjectIds converted to strings."""
+    return {k: str(v) if isinstance(v, ObjectId) else v for k, v in item.items()}
+
+
+def normalize_sort(sort_criteria):
+    """
+    Returns sort criteria as a list of (field, direction) tuples that always ends
+    with _id, so the order is total and can drive keyset pagination.
+    Accepts a field name, a dict or a list of tuples.
+    """
+    if isinstance(sort_criteria, str):
+        sort_criteria = [(sort_criteria, ASCENDING)]
+    elif isinstance(sort_criteria, dict):
+        sort_criteria = list(sort_criteria.items())
+
+    sort_criteria = [(field, int(direction)) for field, direction in sort_criteria]
+    if not any(field == "_id" for field, _ in sort_criteria):
+        sort_criteria.append(("_id", ASCENDING))
+    return sort_criteria
+
+
+def get_field(document, field):
+    """Returns the value of a (possibly dotted) field of a document, or None."""
+    value = document
+    for part in field.split("."):
+        if not isinstance(value, dict):
+            return None
+        value = value.get(part)
+    return value
+
+
+def encode_page_token(document, sort_criteria):
+    """
+    Builds an opaque continuation token from the sort key values of the last
+    document on a page. Values are stored as extended JSON so ObjectIds and
+    dates survive the round trip.
+    """
+    values = [get_field(document, field) for field, _ in sort_criteria]
+    payload = json_util.dumps({"s": [field for field, _ in sort_criteria], "v": values})
+    return base64.urlsafe_b64encode(payload.encode()).decode().rstrip("=")
+
+
+def decode_page_token(token, sort_criteria):
+    """
+    Returns the sort key values stored in a continuation token.
+
+    :raises ValueError: If the token is malformed or was built for a different sort.
+    """
+    try:
+        padded = token + "=" * (-len(token) % 4)
+        payload = json_util.loads(base64.urlsafe_b64decode(padded.encode()).decode())
+        fields, values = payload["s"], payload["v"]
+    except Exception:
+        raise ValueError("Invalid page token.")
+
+    if fields != [field for field, _ in sort_criteria] or len(values) != len(fields):
+        raise ValueError("Page token does not match the sort order of this query.")
+    return values
+
+
+def normalize_projection(projection):
+    """
+    Returns a projection as a {field: 0|1} dict, or None for "all fields".
+    Accepts a dict, or a set/list/tuple of field names to include.
+    """
+    if not projection:
+        return None
+    if isinstance(projection, (set, list, tuple)):
+        return {field: 1 for field in projection}
+    return dict(projection)
+
+
+def projection_for_sort(projection, sort_criteria):
+    """
+    Makes sure the sort fields come back from the server so a continuation token
+    can be built, even when the caller's projection leaves them out.
+
+    :return: (projection to send to the server, top level fields to strip from results)
+    """
+    if projection is None:
+        return None, set()
+
+    projection = dict(projection)
+    strip = set()
+    inclusive = any(value and field != "_id" for field, value in projection.items())
+
+    for field, _ in sort_criteria:
+        top = field.split(".")[0]
+        if field == "_id" or not inclusive:
+            if projection.get(field, 1) == 0:
+                del projection[field]
+                strip.add(top)
+        elif not projection.get(field) and not projection.get(top):
+            projection[field] = 1
+            strip.add(top)
+
+    # An inclusion projection that only carried _id:0 would now be empty
+    if not projection:
+        projection = None
+    return projection, strip
+
+
+def keyset_query(sort_criteria, values):
+    """
+    Builds the query matching every document that sorts after the given key values:
+    (f1 > v1) or (f1 == v1 and f2 > v2) or ...  with $lt for descending fields.
+    Documents missing a sort field are not matched once paging has started.
+    """
+    clauses = []
+    for i, (field, direction) in enumerate(sort_criteria):
+        clause = {sort_criteria[j][0]: values[j] for j in range(i)}
+        clause[field] = {"$gt" if direction >= 0 else "$lt": values[i]}
+        clauses.append(clause)
+    return {"$or": clauses}
+
+
 class MongoManager:
     def __init__(self, **kwargs):
         self.console = Console()
@@ -51,19 +573,21 @@ class MongoManager:
         self.db = kwargs.get("db", None)
         self.collection = kwargs.get("collection", None)
 
-        if self.username is None and self.password is None:
-            self.connection_url = f"mongodb://{self.host}:{self.port}/"
-        else:
-            # Need to check that a db name was passed in
-            # Create the connection URL
-            self.connection_url = f"mongodb://{self.username}:{self.password}@{self.host}:{self.port}/{self.db}?authSource=admin"
+        # When True, get()/get2() explain each new query shape into plan_recorder
+        self.explain_queries = kwargs.get("explain", False)
 
-        try:
-            self.client = MongoClient(self.connection_url)
-            # The ismaster command is cheap and does not require auth.
-            self.client.admin.command("ismaster")
-        except ConnectionFailure:
-            print("Server not available")
+        # Optional queryCache.QueryCache for get(cache=True); writes invalidate it
+        self.query_cache = kwargs.get("query_cache", None)
+
+        # Cache of read-only handles handed out by collection_for()
+        self._handles = {}
+        self._handles_lock = Lock()
+        self._frozen = False
+
+        self.connection_url = build_connection_url(**kwargs)
+
+        # Borrow the process-wide client for this url instead of opening a new one
+        self.client = client_registry.get(self.connection_url, **pool_options_from(kwargs))
 
         # if a db is specified then make connection
         if self.db is not None:
@@ -90,6 +614,10 @@ class MongoManager:
 
     def setCollection(self, collection_name):
         """Sets the current collection."""
+        if self._frozen:
+            raise ValueError(
+                f"This handle is bound to {self.collection.name}. Use collection_for('{collection_name}') instead."
+            )
         if self.db is not None:  # Corrected the check here
             if collection_name in self.db.list_collection_names():
                 self.collection = self.db[collection_name]
@@ -102,7 +630,120 @@ class MongoManager:
         else:
             print("No database selected. Use set_database() first.")
 
-    
+
+    def collection_for(self, collection_name):
+        """
+        Returns a MongoManager bound to a single collection.
+
+        Handles are resolved once, cached, and share this manager's client and db.
+        They cannot be re-pointed with setCollection, so concurrent requests can use
+        them without swapping the collection out from under each other.
+
+        :param collection_name: Name of the collection to bind to.
+        :return: MongoManager bound to collection_name.
+        """
+        if self.db is None:
+            raise ValueError("No database selected. Use setDb() first.")
+
+        with self._handles_lock:
+            handle = self._handles.get(collection_name)
+            if handle is None:
+                handle = copy.copy(self)
+                handle.collection = self.db[collection_name]
+                handle._frozen = True
+                self._handles[collection_name] = handle
+        return handle
+
+
+    def ensure_collections(self, collection_names):
+        """
+        Checks that the given collections exist and warms the handle cache.
+        Meant to run once at startup so requests never call list_collection_names.
+
+        :param collection_names: Iterable of collection names.
+        :return: List of collection names that do not exist yet.
+        """
+        existing = set(self.db.list_collection_names())
+        missing = []
+
+        for collection_name in collection_names:
+            if collection_name not in existing:
+                print(f"Collection {collection_name} does not exist. It will be created on first write.")
+                missing.append(collection_name)
+            self.collection_for(collection_name)
+
+        return missing
+
+
+    def ensure_indexes(self, specs=None):
+        """
+        Creates every index in specs (INDEX_SPECS by default) that does not exist yet.
+        Safe to run on every worker start: existing indexes are left alone.
+
+        :param specs: {collection: [ {"keys": [...], **create_index options}, ... ]}
+        :return: {collection: {"created": [...], "existing": [...], "errors": {name: message}}}
+        """
+        specs = INDEX_SPECS if specs is None else specs
+        report = {}
+
+        for collection_name, indexes in specs.items():
+            collection = self.db[collection_name]
+            entry = report[collection_name] = {"created": [], "existing": [], "errors": {}}
+
+            try:
+                existing = collection.index_information()
+            except PyMongoError:
+                existing = {}
+
+            for spec in indexes:
+                options = {k: v for k, v in spec.items() if k != "keys"}
+                name = options.setdefault("name", index_name(spec["keys"]))
+
+                if name in existing:
+                    entry["existing"].append(name)
+                    continue
+
+                try:
+                    collection.create_index(spec["keys"], **options)
+                    entry["created"].append(name)
+                except PyMongoError as e:
+                    # e.g. duplicate emails blocking a unique index, or option conflicts
+                    entry["errors"][name] = str(e)
+                    print(f"Could not create index {collection_name}.{name}: {e}")
+
+        return report
+
+
+    def index_report(self, specs=None):
+        """
+        Compares the indexes in the database with specs (INDEX_SPECS by default).
+
+        :return: {collection: {"missing": [...], "unexpected": [...], "unused": [...]}}
+                 where unused lists indexes with no recorded accesses since the server
+                 started (from $indexStats).
+        """
+        specs = INDEX_SPECS if specs is None else specs
+        report = {}
+
+        for collection_name, indexes in specs.items():
+            collection = self.db[collection_name]
+            wanted = [spec.get("name", index_name(spec["keys"])) for spec in indexes]
+
+            existing = collection.index_information()
+            try:
+                stats = {s["name"]: s["accesses"]["ops"] for s in collection.aggregate([{"$indexStats": {}}])}
+            except OperationFailure:
+                stats = {}
+
+            report[collection_name] = {
+                "missing": [name for name in wanted if name not in existing],
+                "unexpected": [name for name in existing if name != "_id_" and name not in wanted],
+                "unused": [name for name, ops in stats.items() if name != "_id_" and ops == 0],
+            }
+
+        return report
+
+
     def list_all_categories(self, field):
         """
         Retrieves a list of distinct values for a specified field in the collection.
@@ -110,7 +751,7 @@ class MongoManager:
         :param field: The field for which to retrieve distinct values.
         :return: List of distinct values.
         """
-        if not self.collection:
+        if self.collection is None:
             raise ValueError("Collection not set.")
         
         try:
@@ -152,25 +793,61 @@ class MongoManager:
         """
         Retrieves documents from the collection based on the provided criteria.
 
-        :param filter_query: Dictionary for filtering documents.
-        :param pagination: Tuple or dictionary with 'skip' and 'limit' for pagination.
-        :param sort_order: List of tuples specifying field and direction to sort by.
-        :return: List of documents matching the criteria.
+        :param query: Dictionary for filtering documents.
+        :param projection: Fields to return, as a {field: 0|1} dict or a set/list of names.
+                           `filter` is accepted as an alias. Applied by the server, so
+                           excluded fields never leave the database.
+        :param skip: Integer specifying the number of documents to skip.
+        :param limit: Integer specifying the maximum number of documents to return.
+        :param sort_criteria: List of tuples specifying field and direction to sort by.
+        :param after: Continuation token from a previous page's next_token. The page
+                      starts right after that document in sort_criteria order, so
+                      page N costs the same as page 1 (no skip).
+        :param batch_size: Number of documents fetched from the server per round trip.
+        :param stream: If True, return a generator that yields converted documents
+                       straight from the cursor instead of building a list.
+        :param raw: If True, leave ObjectIds and other BSON values as they are, for
+                    callers that encode with bsonResponse.dumps_bson.
+        :param explain: Record the query plan of this query shape in plan_recorder.
+                        Defaults to the manager's explain setting.
+        :param cache: Serve the result from (and store it in) the manager's query_cache.
+                      Cached documents are shared between callers and must not be modified.
+        :return: The keyword arguments plus success, result_size, data and next_token,
+                 or a generator of documents when stream is True.
+        :raises ValueError: If after is not a valid continuation token.
         """
+        find_args = self._find_args(**kwargs)
 
-        query = kwargs.get("query", {})
-        projection = kwargs.get("projection", {})
-        sort_criteria = kwargs.get("sort_criteria", [("_id", 1)])
-        skip = kwargs.get("skip", 0)
-        limit = kwargs.get("limit", 0)
+        if kwargs.get("stream", False):
+            self._maybe_explain(find_args, kwargs)
+            return self._iter_documents(find_args)
+
+        cache = self.query_cache if kwargs.get("cache", False) else None
+        if cache is not None:
+            key = cache.key(self.collection.full_name, find_args)
+            cached = cache.get(key)
+            if cached is not None:
+                kwargs["success"] = True
+                kwargs["result_size"] = len(cached["data"])
+                kwargs["data"] = cached["data"]
+                kwargs["next_token"] = cached["next_token"]
+                return kwargs
+
+        self._maybe_explain(find_args, kwargs)
 
         try:
-            results = self.collection.find(query).sort(sort_criteria).skip(skip).limit(limit)
-            resultList = list(results)
+            state = {}
+            data = list(self._iter_documents(find_args, state))
 
             kwargs["success"] = True
-            kwargs["result_size"] = len(resultList)
-            kwargs["data"] = [{k: str(v) if isinstance(v, ObjectId) else v for k, v in item.items()} for item in resultList]
+            kwargs["result_size"] = len(data)
+            kwargs["data"] = data
+            kwargs["next_token"] = None
+            if find_args["limit"] and len(data) == find_args["limit"]:
+                kwargs["next_token"] = encode_page_token(state["last"], find_args["sort"])
+
+            if cache is not None:
+                cache.put(key, {"data": data, "next_token": kwargs["next_token"]})
             return kwargs
         except PyMongoError as e:
             kwargs["success"] = False
@@ -178,30 +855,156 @@ class MongoManager:
             return kwargs
 
 
+    def _find_args(self, **kwargs):
+        """
+        Turns get() keyword arguments into the query, projection, sort, skip, limit and
+        batch size for a find, folding a continuation token into the query as a keyset
+        condition.
+        """
+        query = kwargs.get("query", {})
+        sort_criteria = normalize_sort(kwargs.get("sort_criteria", [("_id", 1)]))
+        after = kwargs.get("after", None)
+
+        # Callers have historically passed the projection as `filter`
+        projection = normalize_projection(kwargs.get("projection", kwargs.get("filter")))
+        projection, strip = projection_for_sort(projection, sort_criteria)
+
+        if after:
+            keyset = keyset_query(sort_criteria, decode_page_token(after, sort_criteria))
+            query = {"$and": [query, keyset]} if query else keyset
+
+        return {
+            "query": query,
+            "projection": projection,
+            "strip": strip,
+            "sort": sort_criteria,
+            "skip": kwargs.get("skip", 0),
+            "limit": kwargs.get("limit", 0),
+            "batch_size": kwargs.get("batch_size", DEFAULT_BATCH_SIZE),
+            "raw": kwargs.get("raw", False),
+        }
+
+
+    def explain(self, **kwargs):
+        """
+        Explains the find that get(**kwargs) would run and records it in plan_recorder.
+
+        :return: Dictionary with the collection, query shape, winning plan, indexes used,
+                 whether it is a COLLSCAN, and keys/docs examined and docs returned.
+        """
+        find_args = self._find_args(**kwargs)
+        cursor = (
+            self.collection.find(find_args["query"], find_args["projection"])
+            .sort(find_args["sort"])
+            .skip(find_args["skip"])
+            .limit(find_args["limit"])
+        )
+        shape = self._shape_key(find_args)
+        entry = {
+            "collection": self.collection.name,
+            "shape": shape,
+            **summarize_plan(cursor.explain()),
+        }
+        plan_recorder.record(shape, entry)
+        return entry
+
+
+    def _shape_key(self, find_args):
+        """Identifies a query shape: collection, filter shape, sort and projection."""
+        return json_util.dumps({
+            "collection": self.collection.name,
+            "filter": query_shape(find_args["query"]),
+            "sort": find_args["sort"],
+            "projection": sorted((find_args["projection"] or {}).items()),
+        })
+
+
+    def _maybe_explain(self, find_args, kwargs):
+        """Explains find_args the first time its shape is seen, if explain is on."""
+        if not kwargs.get("explain", self.explain_queries):
+            return
+        if plan_recorder.seen(self._shape_key(find_args)):
+            return
+        try:
+            self.explain(**kwargs)
+        except PyMongoError as e:
+            # Instrumentation must never fail the query itself
+            print(f"Could not explain query: {e}")
+
+
+    def _iter_documents(self, find_args, state=None):
+        """
+        Runs the find described by find_args and yields each document with its
+        ObjectIds converted to strings (unless find_args["raw"]). Only one batch of raw documents is held
+        in memory at a time. The last raw document is kept in state["last"] so
+        a continuation token can be built from it. Fields that were only fetched
+        to build that token are dropped before the document is yielded.
+        """
+        strip = find_args["strip"]
+        raw = find_args["raw"]
+        cursor = (
+            self.collection.find(find_args["query"], find_args["projection"])
+            .sort(find_args["sort"])
+            .skip(find_args["skip"])
+            .limit(find_args["limit"])
+            .batch_size(find_args["batch_size"])
+        )
+        try:
+            for item in cursor:
+                if state is not None:
+                    state["last"] = item
+                doc = item if raw else convert_document(item)
+                if strip:
+                    # state["last"] still needs the stripped sort fields for the page token
+                    if doc is item:
+                        doc = dict(item)
+                    for field in strip:
+                        doc.pop(field, None)
+                yield doc
+        finally:
+            cursor.close()
+
+
     def get2(self, **kwargs):
         """
         Retrieves documents from the collection based on the provided criteria.
 
         :param query: Dictionary for filtering documents using MongoDB query syntax.
+        :param projection: Fields to return, as a {field: 0|1} dict or a set/list of names.
         :param skip: Integer specifying the number of documents to skip.
         :param limit: Integer specifying the maximum number of documents to return.
         :param sort_criteria: List of tuples specifying field and direction to sort by.
-        :return: Dictionary with the operation's success status, result size, and data.
+        :param after: Continuation token from a previous page's next_token.
+        :return: Dictionary with the operation's success status, result size, data and next_token.
+        :raises ValueError: If after is not a valid continuation token.
         """
 
-        query = kwargs.get("query", {})
-        skip = kwargs.get("skip", 0)
-        limit = kwargs.get("limit", 10)  # Assuming a default limit might be helpful
-        sort_criteria = kwargs.get("sort_criteria", [("_id", 1)])  # Fixed the sort criteria syntax
+        kwargs.setdefault("limit", 10)  # Assuming a default limit might be helpful
+        find_args = self._find_args(**kwargs)
+        self._maybe_explain(find_args, kwargs)
 
         try:
-            results = self.collection.find(query).sort(sort_criteria).skip(skip).limit(limit)
-            
+            results = (
+                self.collection.find(find_args["query"], find_args["projection"])
+                .sort(find_args["sort"])
+                .skip(find_args["skip"])
+                .limit(find_args["limit"])
+            )
+
             resultList = list(results)
+            next_token = None
+            if find_args["limit"] and len(resultList) == find_args["limit"]:
+                next_token = encode_page_token(resultList[-1], find_args["sort"])
+
+            for item in resultList:
+                for field in find_args["strip"]:
+                    item.pop(field, None)
+
             return {
                 "success": True,
                 "result_size": len(resultList),
-                "data": resultList
+                "data": resultList,
+                "next_token": next_token
             }
         except PyMongoError as e:
             return {
@@ -210,6 +1013,7 @@ class MongoManager:
             }
 
 
+    @invalidates_cache
     def post(self, document):
         # Implement the logic to insert data
         if isinstance(document, dict):
@@ -218,6 +1022,91 @@ class MongoManager:
             self.collection.insert_many(document)
 
 
+    @invalidates_cache
+    def bulk(self, operations, batch_size=DEFAULT_BULK_BATCH_SIZE, ordered=False):
+        """
+        Applies a mix of insert/update/upsert/replace/delete operations with as few
+        round trips as possible. Operations are consumed lazily (a generator works)
+        and sent as unordered bulk_write batches of batch_size, so one failing
+        operation does not stop the rest.
+
+        :param operations: Iterable of operation dicts (see to_write_model) or pymongo write models.
+        :param batch_size: Operations per bulk_write call.
+        :param ordered: Pass True to stop each batch at its first error.
+        :return: Dictionary with success, operations, batches, inserted, matched, modified,
+                 upserted, deleted counts and a list of per-operation errors. Error
+                 indexes refer to the position in operations.
+        """
+        if self.collection is None:
+            raise ValueError("Collection not set.")
+
+        summary = {
+            "success": True,
+            "operations": 0,
+            "batches": 0,
+            "inserted": 0,
+            "matched": 0,
+            "modified": 0,
+            "upserted": 0,
+            "deleted": 0,
+            "errors": [],
+        }
+
+        batch = []
+        batch_start = 0
+        for index, operation in enumerate(operations):
+            summary["operations"] += 1
+            try:
+                batch.append((index, to_write_model(operation)))
+            except ValueError as e:
+                summary["errors"].append({"index": index, "message": str(e)})
+
+            if len(batch) >= batch_size:
+                self._bulk_batch(batch, ordered, summary)
+                batch = []
+
+        if batch:
+            self._bulk_batch(batch, ordered, summary)
+
+        summary["success"] = not summary["errors"]
+        return summary
+
+
+    def _bulk_batch(self, batch, ordered, summary):
+        """Sends one bulk_write batch and folds its counts and errors into summary."""
+        summary["batches"] += 1
+        indexes = [index for index, _ in batch]
+
+        try:
+            result = self.collection.bulk_write([model for _, model in batch], ordered=ordered)
+            details = result.bulk_api_result
+        except BulkWriteError as e:
+            details = e.details
+            for error in details.get("writeErrors", []):
+                summary["errors"].append({
+                    "index": indexes[error["index"]],
+                    "code": error.get("code"),
+                    "message": error.get("errmsg"),
+                })
+            for error in details.get("writeConcernErrors", []):
+                summary["errors"].append({
+                    "index": None,
+                    "code": error.get("code"),
+                    "message": error.get("errmsg"),
+                })
+        except PyMongoError as e:
+            # The whole batch failed (network, auth, ...)
+            summary["errors"].append({"index": None, "batch": indexes, "message": str(e)})
+            return
+
+        summary["inserted"] += details.get("nInserted", 0)
+        summary["matched"] += details.get("nMatched", 0)
+        summary["modified"] += details.get("nModified", 0)
+        summary["upserted"] += details.get("nUpserted", 0)
+        summary["deleted"] += details.get("nRemoved", 0)
+
+
+    @invalidates_cache
     def put(self, filter_query, update_data, upsert=False):
         """
         Updates documents in the collection based on the provided criteria.
@@ -227,7 +1116,7 @@ class MongoManager:
         :param upsert: If True, a new document is inserted if no document matches the filter_query.
         :return: Result of the update operation.
         """
-        if not self.collection:
+        if self.collection is None:
             raise ValueError("Collection not set.")
 
         # MongoDB requires update operations to be prefixed with operators like '$set', '$unset', etc.
@@ -250,6 +1139,7 @@ class MongoManager:
         )
 
 
+    @invalidates_cache
     def register_user(self, user_data):
         """
         Registers a new user by inserting their information into the users collection.
@@ -301,6 +1191,8 @@ class MongoManager:
     def add_location(self, email, latitude, longitude, timestamp):
         """
         Inserts or updates a user's location in the 'locations' collection as a GeoJSON point.
+        Runs on the locations handle whatever handle it is called on, so the write
+        and the cache invalidation hit the same collection.
     
         :param email: The email address of the user.
         :param latitude: The latitude of the location.
@@ -308,10 +1200,15 @@ class MongoManager:
         :param timestamp: The timestamp when the location was recorded.
         :return: Dictionary indicating the success status of the operation.
         """
+        return self.collection_for("locations")._upsert_location(email, latitude, longitude, timestamp)
+
+
+    @invalidates_cache
+    def _upsert_location(self, email, latitude, longitude, timestamp):
+        """add_location() on the locations handle: self.collection is the collection written."""
         try:
-            # Ensure the collection is set to 'locations'
-            self.setCollection("locations")
-        
+            locations = self.collection
+
             # Create GeoJSON point
             location = {"type": "Point", "coordinates": [longitude, latitude]}
         
@@ -323,7 +1220,7 @@ class MongoManager:
             }
         
             # Use upsert to ensure only one location per user
-            result = self.collection.update_one(
+            result = locations.update_one(
                 {"email": email},  # Query to find existing location by email
                 {"$set": location_data},  # Update with the new data
                 upsert=True  # Insert if it doesn't exist
@@ -344,9 +1241,7 @@ class MongoManager:
 
     def get_locations_within_radius(self, latitude, longitude, radius):
         try:
-            # Ensure geospatial indexing
-            if "location_2dsphere" not in self.collection.index_information():
-                self.collection.create_index([("location", GEOSPHERE)])
+            # The 2dsphere index comes from INDEX_SPECS (ensure_indexes at startup)
 
             # Construct geospatial query
             query = {
@@ -366,6 +1261,7 @@ class MongoManager:
             return None  # Return None on error
 
         
+    @invalidates_cache
     def save_image(self, file_path, metadata):
         try:
             result = self.collection.insert_one({
@@ -396,13 +1292,17 @@ class MongoManager:
 
     def get_image(self, image_id):
         try:
-                # Ensure that the image_id is a valid ObjectId
-                image_doc = self.collection.find_one({"_id": ObjectId(image_id)})
+                # Uploaded images are looked up by ObjectId, catalog images by candy id
+                if is_valid_object_id(image_id):
+                        image_doc = self.collection.find_one({"_id": ObjectId(image_id)})
+                else:
+                        image_doc = self.collection.find_one({"candy_id": image_id})
                 
                 if image_doc:
                         return {
                                 "metadata": image_doc["metadata"],
-                                "path": image_doc.get("path")
+                                "path": image_doc.get("path"),
+                                "variants": image_doc.get("variants", {})
                         }
                 else:
                         return None
@@ -426,6 +1326,7 @@ class MongoManager:
             return {"success": False, "error": str(e)}
 
 
+    @invalidates_cache
     def delete(self, query):
         """
         Deletes data from the collection based on the provided query.
@@ -467,6 +1368,7 @@ class MongoManager:
  
 
 
+    @invalidates_cache
     def put2(self, id_key, id_val, update_key, update_value):
         """
         Updates the price of a specific item in the collection.
@@ -493,6 +1395,7 @@ class MongoManager:
 
 
 
+    @invalidates_cache
     def delete(self, query):
         """
         Deletes data from the collection based on the provided query.
@@ -500,7 +1403,7 @@ class MongoManager:
         :param query: Dictionary specifying the criteria for deleting documents.
         :return: Result of the delete operation.
         """
-        if not self.collection:
+        if self.collection is None:
             raise ValueError("Collection not set.")
 
         try:
@@ -511,6 +1414,7 @@ class MongoManager:
             return None
 
 
+    @invalidates_cache
     def store_image_in_mongodb(self,product_id,png_data):
 
         self.collection.insert_one({"_id":product_id,"image_data": png_data})
@@ -606,14 +1510,19 @@ if __name__ == "__main__":
         # print(list(results))
 
         mm.setCollection("candies")
+        token = None
         for i in range(10):
+            # Each page starts after the last name of the previous one instead of skipping
             result = mm.get(
                 sort_criteria=[('name',1)],
-                skip=(i * 3), 
                 limit=3,
+                after=token,
                 filter={"_id":0,"name":1})
             print(result)
             print("=" * 30)
+            token = result["next_token"]
+            if token is None:
+                break
 
     elif query == "9":  # Example to add a new location
         mm.setCollection("locations")
@@ -636,3 +1545,13 @@ if __name__ == "__main__":
         mm.setCollection('categories')
         doc = { 'count': 23, 'name': 'Dirt Candy' ,'tast':'awesome','color':'pink','price':99999.99}
         mm.post(doc)
+
+    elif query == 'indexes':
+        # Report missing, unexpected and unused indexes compared to INDEX_SPECS
+        for collection_name, entry in mm.index_report().items():
+            print(f"[bold]{collection_name}[/bold]")
+            for kind in ("missing", "unexpected", "unused"):
+                print(f"  {kind:<11} {', '.join(entry[kind]) or '-'}")
+
+    elif query == 'ensure-indexes':
+        print(mm.ensure_indexes())
@@ -0,0 +1,82 @@
+"""
+Guards the hot catalog queries against plan regressions.
+
+HOT_QUERIES lists the queries the api runs most, in the same keyword form the
+routes pass to MongoManager.get. check_hot_queries() explains each one and
+assert_no_collscan() fails with the offending plans if any of them falls back to
+a COLLSCAN (for example because an index in INDEX_SPECS was dropped or a query
+changed shape).
+
+Run it against a loaded candy_store (exits 1 on a regression):
+
+    python planCheck.py
+
+or call assert_no_collscan(mm) from a test.
+"""
+
+import sys
+from rich import print
+
+from mongoManager import MongoManager
+
+
+# name -> (collection, get() keyword arguments)
+HOT_QUERIES = {
+    "price range": ("candies", {"query": {"price": {"$gte": 10.0, "$lte": 20.0}}, "sort_criteria": [("price", 1)]}),
+    "category price range": ("candies", {"query": {"price": {"$gte": 10.0, "$lte": 20.0}, "category_id": 12},
+                                         "sort_criteria": [("price", 1)]}),
+    "category lookup": ("candies", {"query": {"category": "Retro"}, "limit": 50}),
+    "category id lookup": ("candies", {"query": {"category_id": 12}}),
+    "candy by id": ("candies", {"query": {"id": "42689216610491"}}),
+    "names in order": ("candies", {"sort_criteria": [("name", 1)], "limit": 3}),
+    "user by email": ("users", {"query": {"email": "someone@example.com"}}),
+    "location by email": ("locations", {"query": {"email": "someone@example.com"}}),
+}
+
+
+def check_hot_queries(mm, queries=None):
+    """
+    Explains every registered hot query.
+
+    :param mm: MongoManager with a database selected.
+    :param queries: {name: (collection, get kwargs)}, HOT_QUERIES by default.
+    :return: {name: plan summary} as returned by MongoManager.explain.
+    """
+    queries = HOT_QUERIES if queries is None else queries
+    return {
+        name: mm.collection_for(collection).explain(**kwargs)
+        for name, (collection, kwargs) in queries.items()
+    }
+
+
+def assert_no_collscan(mm, queries=None):
+    """
+    Raises AssertionError naming every hot query whose winning plan is a COLLSCAN.
+
+    :return: The plan summaries when none regressed.
+    """
+    plans = check_hot_queries(mm, queries)
+    regressions = {name: plan for name, plan in plans.items() if plan["collscan"]}
+
+    if regressions:
+        lines = [
+            f"{name}: {plan['winning_plan']} "
+            f"(keys examined {plan['keys_examined']}, docs examined {plan['docs_examined']})"
+            for name, plan in regressions.items()
+        ]
+        raise AssertionError("Hot queries regressed to COLLSCAN:\n" + "\n".join(lines))
+
+    return plans
+
+
+if __name__ == "__main__":
+    mm = MongoManager(db="candy_store")
+
+    try:
+        plans = assert_no_collscan(mm)
+    except AssertionError as e:
+        print(f"[red]{e}[/red]")
+        sys.exit(1)
+
+    for name, plan in plans.items():
+        print(f"{name:<20} {plan['winning_plan']:<30} keys={plan['keys_examined']} docs={plan['docs_examined']} returned={plan['docs_returned']}")
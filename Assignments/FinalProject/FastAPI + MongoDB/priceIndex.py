@@ -0,0 +1,240 @@
+"""
+Columnar in-memory index that answers /candies/price without a Mongo round trip.
+
+Set CANDY_PRICE_INDEX=1 and every worker loads the price, category_id and
+response fields of all candies once at startup (in the background; until then the
+route asks Mongo). Prices are kept in a NumPy array sorted by price, so a price
+range is two binary searches (np.searchsorted) and a category filter is a
+vectorized mask over that slice. Matches come back in price order.
+
+Writes never re-sort the arrays. The write routes pass the _ids they touched to
+refresh(), which marks the old rows dead and appends the new versions to a small
+unsorted delta that queries mask as well. Once the delta reaches merge_threshold
+rows it is merged into the sorted arrays in one O(n) pass.
+
+Building, refreshing after writes and falling back to Mongo while the index is
+behind a write are shared with the search index (catalogIndex.py).
+
+Needs numpy (only imported when the index is turned on).
+
+    python priceIndex.py [candies]    # synthetic build time and lookup latency
+"""
+
+from rich import print
+import os
+import time
+
+from catalogIndex import CatalogIndex
+from models import ROUTE_FIELDS
+
+
+# Categories stored for candies without a category_id
+NO_CATEGORY = -1
+
+
+class IndexState:
+    """
+    Columns of one build. Row ids index docs and the per-row arrays; rows are
+    only ever appended, a changed candy gets a new row and its old one is marked dead.
+    """
+
+    def __init__(self, np, capacity=1024):
+        self.np = np
+        self.docs = []
+        self.row_of = {}
+        self.price = np.empty(capacity, dtype=np.float64)
+        self.category = np.empty(capacity, dtype=np.int64)
+        self.live = np.zeros(capacity, dtype=bool)
+        self.dead = 0
+
+        # Live rows merged so far, sorted by price, with their prices and categories
+        self.order = np.empty(0, dtype=np.int64)
+        self.sorted_prices = np.empty(0, dtype=np.float64)
+        self.sorted_categories = np.empty(0, dtype=np.int64)
+
+        # Rows added since the last merge
+        self.delta = []
+
+    def add(self, key, doc, price, category_id):
+        row = len(self.docs)
+        if row == len(self.price):
+            self._grow()
+        self.docs.append(doc)
+        self.price[row] = price
+        self.category[row] = category_id
+        self.live[row] = True
+        self.row_of[key] = row
+        self.delta.append(row)
+
+    def remove(self, key):
+        row = self.row_of.pop(key, None)
+        if row is not None:
+            self.live[row] = False
+            self.dead += 1
+
+    def merge(self):
+        """Merges the live delta rows into the sorted arrays and drops dead ones from them."""
+        np = self.np
+        delta = np.array(self.delta, dtype=np.int64)
+        delta = delta[self.live[delta]]
+        delta = delta[np.argsort(self.price[delta], kind="stable")]
+
+        main = self.order[self.live[self.order]]
+        positions = np.searchsorted(self.price[main], self.price[delta], side="right")
+        self.order = np.insert(main, positions, delta)
+        self.sorted_prices = self.price[self.order]
+        self.sorted_categories = self.category[self.order]
+        self.delta = []
+
+    def lookup(self, min_price, max_price, category_id=None):
+        """Row ids of the live candies priced in [min_price, max_price], in price order."""
+        np = self.np
+        low = np.searchsorted(self.sorted_prices, min_price, side="left")
+        high = np.searchsorted(self.sorted_prices, max_price, side="right")
+
+        rows = self.order[low:high]
+        mask = self.live[rows]
+        if category_id is not None:
+            mask &= self.sorted_categories[low:high] == category_id
+        rows = rows[mask]
+
+        if self.delta:
+            delta = np.array(self.delta, dtype=np.int64)
+            prices = self.price[delta]
+            mask = (prices >= min_price) & (prices <= max_price) & self.live[delta]
+            if category_id is not None:
+                mask &= self.category[delta] == category_id
+            if mask.any():
+                rows = np.concatenate([rows, delta[mask]])
+                rows = rows[np.argsort(self.price[rows], kind="stable")]
+        return rows
+
+    def _grow(self):
+        np = self.np
+        capacity = 2 * len(self.price)
+        for name in ("price", "category", "live"):
+            old = getattr(self, name)
+            new = np.zeros(capacity, dtype=old.dtype)
+            new[:len(old)] = old
+            setattr(self, name, new)
+
+
+def numeric_price(value):
+    """The price as a float, or None for values a numeric range query never matches."""
+    if isinstance(value, bool) or value is None:
+        return None
+    if isinstance(value, (int, float)):
+        return float(value)
+    if hasattr(value, "to_decimal"):  # Decimal128
+        return float(value.to_decimal())
+    return None
+
+
+class PriceIndex(CatalogIndex):
+    name = "price index"
+
+    def __init__(self, fields, **kwargs):
+        """
+        :param fields: Projection of the documents lookups return (the route's ROUTE_FIELDS entry).
+        :param merge_threshold: Delta rows that trigger a merge (default 4096).
+        Other keyword arguments go to CatalogIndex (max_age, stale_grace).
+        """
+        import numpy
+        self.np = numpy
+
+        self.fields = [field for field, include in fields.items() if include and field != "_id"]
+        self.merge_threshold = kwargs.get("merge_threshold", 4096)
+        super().__init__({field: 1 for field in {*self.fields, "price", "category_id"}}, **kwargs)
+
+    def new_state(self):
+        return IndexState(self.np)
+
+    def add(self, state, doc):
+        price = numeric_price(doc.get("price"))
+        if price is None:
+            return
+        category_id = doc.get("category_id")
+        if not isinstance(category_id, int) or isinstance(category_id, bool):
+            category_id = NO_CATEGORY
+        state.add(doc["_id"], {field: doc[field] for field in self.fields if field in doc}, price, category_id)
+
+    def remove(self, state, key):
+        state.remove(key)
+
+    def after_load(self, state):
+        state.merge()
+
+    def after_refresh(self, state):
+        if len(state.delta) >= self.merge_threshold:
+            state.merge()
+
+    def needs_compaction(self, state):
+        return state.dead > len(state.row_of) // 4
+
+    def state_stats(self, state):
+        return {"candies": len(state.row_of), "delta": len(state.delta), "dead_rows": state.dead}
+
+    def price_range(self, min_price, max_price, category_id=None):
+        """
+        Candies priced in [min_price, max_price] (and in category_id), in price order.
+
+        :return: Dictionary with success, result_size and data (the route's Mongo
+                 fallback answers with the same keys), or None when the index is
+                 not built yet or behind a write (ask Mongo instead).
+        """
+        generation = self.current_generation()
+        with self._lock:
+            state = self.readable_state(generation)
+            if state is None:
+                return None
+            rows = state.lookup(min_price, max_price, category_id)
+
+        # Rows are append only, so the documents can be read without the lock
+        data = [state.docs[row] for row in rows.tolist()]
+        return {"success": True, "result_size": len(data), "data": data, "source": "price_index"}
+
+
+def price_index_from_env(fields):
+    """The PriceIndex when CANDY_PRICE_INDEX=1, else None."""
+    if os.environ.get("CANDY_PRICE_INDEX") != "1":
+        return None
+    return PriceIndex(fields)
+
+
+# Shared by api.py and asyncApi.py; api.py starts it once the collections are checked
+catalog_price_index = price_index_from_env(ROUTE_FIELDS["/candies/price"])
+
+
+if __name__ == "__main__":
+    import random
+    import sys
+    from bson import ObjectId
+
+    count = int(sys.argv[1]) if len(sys.argv) > 1 else 1_000_000
+    rng = random.Random(5373)
+    index = PriceIndex({"_id": 0, "name": 1, "price": 1, "category": 1})
+    index.load(
+        {"_id": ObjectId(), "name": f"Candy {n}", "price": round(rng.uniform(0.5, 60), 2),
+         "category": f"Category {n % 40}", "category_id": n % 40}
+        for n in range(count)
+    )
+    print(f"built {count:,} candies in {index.stats()['build_seconds']}s")
+
+    def percentiles(label, call, runs=2000):
+        timings = []
+        for _ in range(runs):
+            low = rng.uniform(0.5, 59)
+            start = time.perf_counter()
+            result = call(low)
+            timings.append(time.perf_counter() - start)
+        timings.sort()
+        p50, p99 = timings[len(timings) // 2] * 1e3, timings[int(len(timings) * 0.99)] * 1e3
+        print(f"{label:<30} p50 {p50:6.3f} ms  p99 {p99:6.3f} ms  ({result['result_size']:,} rows)")
+
+    state = index._state
+    percentiles("rows, $0.50 range",
+                lambda low: {"result_size": len(state.lookup(low, low + 0.5))})
+    percentiles("rows, $5 range + category",
+                lambda low: {"result_size": len(state.lookup(low, low + 5, 7))})
+    percentiles("documents, $0.50 range", lambda low: index.price_range(low, low + 0.5))
+    percentiles("documents, $5 range + category", lambda low: index.price_range(low, low + 5, 7))
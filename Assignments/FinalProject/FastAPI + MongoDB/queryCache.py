@@ -0,0 +1,231 @@
+"""
+Read cache for MongoManager.get() and the catalog responses (conditionalGet.py).
+
+Entries are keyed on the collection, the collection's generation and the
+normalized find arguments (query with any page token folded in, projection, sort,
+skip, limit, raw). Every write made through a MongoManager that shares the cache
+bumps that collection's generation and drops its entries, so a cached read never
+outlives a write made through the cache.
+
+Entries also expire after ttl seconds, which bounds how stale a read can get after
+a write made somewhere else (loadMongo.py, the mongo shell). The least recently used
+entries are evicted once max_entries or max_bytes is reached. An entry's size is the
+BSON size of its value.
+
+Where entries and generations live is up to the backend (cacheBackends.py): a
+per-process LRU by default, or a tier shared by every gunicorn worker on the host
+(shm) or across hosts (redis). With a shared backend a write in one worker
+invalidates the entries of every worker at once, and all workers hand out the same
+ETags. Note the shared backends do blocking I/O, also when called from the /async
+routes (a local sqlite read or a Redis round trip).
+
+Reads opt in per call with get(cache=True); the api does so for the catalog routes.
+"""
+
+from functools import wraps
+from threading import Lock
+import bson
+from bson import json_util
+import os
+import time
+
+from cacheBackends import MemoryBackend, SharedMemoryBackend, RedisBackend
+from respClient import RespClient
+
+
+# find arguments that decide what a query returns (batch_size only changes round trips)
+KEY_FIELDS = ("query", "projection", "strip", "sort", "skip", "limit", "raw")
+
+CACHE_BACKENDS = ("memory", "shm", "redis")
+
+# Namespace of the compressed catalog responses (responseCompression.py). Their keys
+# hold the ETag, which already names the collection versions, so it is never bumped
+COMPRESSED_NAMESPACE = "compressed responses"
+
+
+class QueryCache:
+    """Thread-safe TTL + LRU cache of query results with per-collection generations."""
+
+    def __init__(self, ttl=60, max_entries=1024, max_bytes=64 * 1024 * 1024, clock=time.time, backend=None):
+        """
+        :param ttl: Seconds an entry may be served for.
+        :param max_entries: Most entries kept before the least recently used is evicted.
+        :param max_bytes: Most bytes kept before the least recently used is evicted.
+        :param clock: Wall clock; shared backends compare its readings across processes.
+        :param backend: Storage tier from cacheBackends (default a MemoryBackend of this size).
+        """
+        self.ttl = ttl
+        self.max_entries = max_entries
+        self.max_bytes = max_bytes
+        self.clock = clock
+        self.backend = backend if backend is not None else MemoryBackend(max_entries, max_bytes)
+
+        self._lock = Lock()
+        self._counters = self._zero_counters()
+
+    @staticmethod
+    def _zero_counters():
+        return {"hits": 0, "misses": 0, "invalidations": 0, "too_large": 0}
+
+    def _count(self, counter):
+        with self._lock:
+            self._counters[counter] += 1
+
+    def generation(self, namespace):
+        return self.backend.generation(namespace)
+
+    def version(self, namespace):
+        """
+        Opaque version of namespace for ETags, or None while the backend is
+        unavailable. It changes on every write through this cache and at least every
+        ttl seconds, so a version is never trusted longer than a cached read would be.
+        """
+        epoch, generation = self.backend.epoch, self.backend.generation(namespace)
+        if epoch is None or generation is None:
+            return None
+        return f"{epoch}.{generation}.{int(self.clock() // self.ttl)}"
+
+    def key(self, namespace, find_args, kind="find"):
+        """
+        Cache key for a find on namespace (db.collection) at its current generation.
+        kind keeps results of different shapes apart: the async get() stores no
+        next_token, so its entries must not answer the sync get().
+        """
+        arguments = json_util.dumps([
+            sorted(find_args[field]) if isinstance(find_args[field], set) else find_args[field]
+            for field in KEY_FIELDS
+        ])
+        return (namespace, self.generation(namespace), f"{kind} {arguments}")
+
+    def pipeline_key(self, namespace, pipeline):
+        """Cache key for an aggregation pipeline on namespace at its current generation."""
+        return (namespace, self.generation(namespace), "aggregate " + json_util.dumps(pipeline))
+
+    def response_key(self, namespace, etag):
+        """Cache key for the encoded catalog response sent with etag."""
+        return (namespace, self.generation(namespace), "response " + etag)
+
+    def compressed_key(self, etag, encoding):
+        """Cache key for the body of the catalog response sent with etag, compressed with encoding."""
+        return (COMPRESSED_NAMESPACE, self.generation(COMPRESSED_NAMESPACE), f"{encoding} {etag}")
+
+    def get(self, key):
+        """Returns the cached value for key, or None."""
+        value = self.backend.get(key, self.clock()) if key[1] is not None else None
+        if value is None:
+            self._count("misses")
+            return None
+
+        self._count("hits")
+        return bson.decode(value) if self.backend.shared else value
+
+    def put(self, key, value):
+        """
+        Stores value, a BSON encodable dict, under key. Nothing is stored if the
+        collection was written to since key was made, or if the entry alone is bigger
+        than max_bytes.
+        """
+        namespace, generation, _ = key
+        try:
+            payload = bson.encode(value)
+        except (bson.errors.InvalidDocument, TypeError):
+            return False
+
+        if len(payload) > self.max_bytes:
+            self._count("too_large")
+            return False
+        if generation is None or generation != self.backend.generation(namespace):
+            return False
+
+        stored = payload if self.backend.shared else value
+        return self.backend.set(key, stored, len(payload), self.clock() + self.ttl)
+
+    def bump(self, namespace):
+        """Starts a new generation for namespace and drops its entries. Called after every write."""
+        self.backend.bump(namespace)
+        self._count("invalidations")
+
+    def clear(self):
+        self.backend.clear()
+
+    def stats(self):
+        """
+        Counters, current size and the generation of every collection written to.
+        Counters are this worker's; sizes and generations are the backend's.
+        """
+        with self._lock:
+            counters = dict(self._counters)
+        lookups = counters["hits"] + counters["misses"]
+        return {
+            **counters,
+            **self.backend.stats(),
+            "hit_rate": round(counters["hits"] / lookups, 4) if lookups else None,
+            "backend": type(self.backend).__name__,
+            "max_entries": self.max_entries,
+            "max_bytes": self.max_bytes,
+            "ttl": self.ttl,
+        }
+
+    def reset_stats(self):
+        with self._lock:
+            self._counters = self._zero_counters()
+        self.backend.reset_stats()
+
+
+def cache_from_env():
+    """
+    The catalog cache configured by:
+
+        CANDY_CACHE_TTL          seconds, default 60; 0 turns caching off
+        CANDY_CACHE_MAX_ENTRIES  default 1024 (memory and shm)
+        CANDY_CACHE_MAX_MB       default 64 (memory and shm; size Redis with maxmemory)
+        CANDY_CACHE_BACKEND      memory (default), shm or redis
+        CANDY_CACHE_URL          the shm database file, or redis://host:port/db
+    """
+    ttl = float(os.environ.get("CANDY_CACHE_TTL", 60))
+    if ttl <= 0:
+        return None
+
+    max_entries = int(os.environ.get("CANDY_CACHE_MAX_ENTRIES", 1024))
+    max_bytes = int(float(os.environ.get("CANDY_CACHE_MAX_MB", 64)) * 1024 * 1024)
+    backend_name = os.environ.get("CANDY_CACHE_BACKEND", "memory")
+    url = os.environ.get("CANDY_CACHE_URL", None)
+
+    if backend_name == "memory":
+        backend = MemoryBackend(max_entries, max_bytes)
+    elif backend_name == "shm":
+        backend = SharedMemoryBackend(url, max_entries, max_bytes)
+    elif backend_name == "redis":
+        backend = RedisBackend(RespClient(url) if url else None)
+    else:
+        raise ValueError(f"Unknown CANDY_CACHE_BACKEND {backend_name!r}, expected one of {CACHE_BACKENDS}")
+
+    return QueryCache(ttl=ttl, max_entries=max_entries, max_bytes=max_bytes, backend=backend)
+
+
+def invalidates_cache(method):
+    """Marks a MongoManager write method: bumps the collection's cache generation after it runs."""
+    @wraps(method)
+    def wrapper(self, *args, **kwargs):
+        try:
+            return method(self, *args, **kwargs)
+        finally:
+            if self.query_cache is not None and self.collection is not None:
+                self.query_cache.bump(self.collection.full_name)
+    return wrapper
+
+
+def invalidates_cache_async(method):
+    """invalidates_cache for AsyncMongoManager coroutines."""
+    @wraps(method)
+    async def wrapper(self, *args, **kwargs):
+        try:
+            return await method(self, *args, **kwargs)
+        finally:
+            if self.query_cache is not None and self.collection is not None:
+                self.query_cache.bump(self.collection.full_name)
+    return wrapper
+
+
+# Shared by api.py and asyncApi.py so a write on either path invalidates both
+catalog_cache = cache_from_env()
@@ -0,0 +1,203 @@
+"""
+Minimal client for the Redis protocol (RESP2), enough for the shared cache tier.
+
+It speaks to redis-server, or to cacheServer.py when no Redis is installed. The
+client keeps a small pool of connections per process (it is safe to share between
+threads and across a gunicorn fork), and subscribe() hands out a dedicated
+connection for pub/sub.
+
+    client = RespClient("redis://localhost:6379/0")
+    client.execute("SET", "greeting", "hello", "PX", 60000)
+    client.execute("GET", "greeting")   # b"hello"
+"""
+
+from threading import Lock
+from urllib.parse import urlsplit, unquote
+import os
+import socket
+
+
+DEFAULT_URL = "redis://localhost:6379/0"
+
+
+class RespError(Exception):
+    """An error reply from the server (-ERR ...)."""
+
+
+def encode_command(*args):
+    """Encodes a command as a RESP array of bulk strings."""
+    parts = [b"*%d\r\n" % len(args)]
+    for arg in args:
+        if not isinstance(arg, bytes):
+            arg = str(arg).encode()
+        parts.append(b"$%d\r\n%s\r\n" % (len(arg), arg))
+    return b"".join(parts)
+
+
+def read_reply(f):
+    """
+    Reads one reply from the buffered socket file f.
+
+    :return: str for simple strings, int, bytes or None for bulk strings, list for arrays.
+             Error replies are returned as RespError instances so a pipeline can keep reading.
+    :raises ConnectionError: If the server closed the connection.
+    """
+    line = f.readline()
+    if not line.endswith(b"\r\n"):
+        raise ConnectionError("connection closed by server")
+
+    prefix, body = line[:1], line[1:-2]
+    if prefix == b"+":
+        return body.decode()
+    if prefix == b"-":
+        return RespError(body.decode())
+    if prefix == b":":
+        return int(body)
+    if prefix == b"$":
+        length = int(body)
+        if length < 0:
+            return None
+        data = f.read(length + 2)
+        if len(data) != length + 2:
+            raise ConnectionError("connection closed by server")
+        return data[:-2]
+    if prefix == b"*":
+        length = int(body)
+        if length < 0:
+            return None
+        return [read_reply(f) for _ in range(length)]
+    raise ConnectionError(f"unexpected reply {line[:20]!r}")
+
+
+class Connection:
+    def __init__(self, host, port, timeout):
+        self.sock = socket.create_connection((host, port), timeout=timeout)
+        self.sock.setsockopt(socket.IPPROTO_TCP, socket.TCP_NODELAY, 1)
+        self.file = self.sock.makefile("rb")
+
+    def send(self, *commands):
+        self.sock.sendall(b"".join(encode_command(*command) for command in commands))
+
+    def read(self):
+        return read_reply(self.file)
+
+    def close(self):
+        try:
+            self.file.close()
+            self.sock.close()
+        except OSError:
+            pass
+
+
+class RespClient:
+    def __init__(self, url=DEFAULT_URL, **kwargs):
+        """
+        :param url: redis://[:password@]host[:port][/db]
+        :param timeout: Socket timeout in seconds (default 1).
+        :param pool_size: Idle connections kept per process (default 8).
+        """
+        parts = urlsplit(url)
+        if parts.scheme != "redis":
+            raise ValueError(f"Unsupported cache url {url!r}, expected redis://host:port/db")
+
+        self.url = url
+        self.host = parts.hostname or "localhost"
+        self.port = parts.port or 6379
+        self.password = unquote(parts.password) if parts.password else None
+        self.db = int(parts.path.lstrip("/") or 0)
+        self.timeout = kwargs.get("timeout", 1.0)
+        self.pool_size = kwargs.get("pool_size", 8)
+
+        self._pool = []
+        self._pid = os.getpid()
+        self._lock = Lock()
+
+    def connect(self, blocking=False):
+        """
+        Opens a new authenticated connection with the db selected. A blocking
+        connection waits on reads forever (for pub/sub); connecting still times out.
+        """
+        connection = Connection(self.host, self.port, self.timeout)
+        try:
+            if self.password:
+                self._check(connection, "AUTH", self.password)
+            if self.db:
+                self._check(connection, "SELECT", self.db)
+        except Exception:
+            connection.close()
+            raise
+        if blocking:
+            connection.sock.settimeout(None)
+        return connection
+
+    @staticmethod
+    def _check(connection, *command):
+        connection.send(command)
+        reply = connection.read()
+        if isinstance(reply, RespError):
+            raise reply
+        return reply
+
+    def _acquire(self):
+        with self._lock:
+            # A forked worker must not share the parent's sockets
+            if self._pid != os.getpid():
+                self._pool, self._pid = [], os.getpid()
+            if self._pool:
+                return self._pool.pop()
+        return self.connect()
+
+    def _release(self, connection):
+        with self._lock:
+            if self._pid == os.getpid() and len(self._pool) < self.pool_size:
+                self._pool.append(connection)
+                return
+        connection.close()
+
+    def pipeline(self, *commands):
+        """
+        Sends commands in one write and reads all replies (one round trip).
+
+        :return: List of replies; error replies are RespError instances.
+        :raises OSError: On connection problems (the connection is dropped).
+        """
+        connection = self._acquire()
+        try:
+            connection.send(*commands)
+            replies = [connection.read() for _ in commands]
+        except Exception:
+            connection.close()
+            raise
+        self._release(connection)
+        return replies
+
+    def execute(self, *args):
+        """Runs one command and returns its reply, raising RespError on an error reply."""
+        reply = self.pipeline(args)[0]
+        if isinstance(reply, RespError):
+            raise reply
+        return reply
+
+    def subscribe(self, *channels):
+        """
+        Subscribes a dedicated blocking connection to channels and yields
+        (kind, channel, data) as bytes: kind is b"subscribe" once per channel when the
+        subscription is live, then b"message" for every message. The generator ends
+        with ConnectionError when the connection drops; the caller reconnects by
+        calling subscribe again.
+        """
+        connection = self.connect(blocking=True)
+        try:
+            connection.send(("SUBSCRIBE", *channels))
+            while True:
+                reply = connection.read()
+                if isinstance(reply, list) and reply[0] in (b"subscribe", b"message"):
+                    yield reply[0], reply[1], reply[2]
+        finally:
+            connection.close()
+
+    def close(self):
+        with self._lock:
+            pool, self._pool = self._pool, []
+        for connection in pool:
+            connection.close()
@@ -0,0 +1,309 @@
+"""
+gzip / brotli response compression for the api.
+
+CompressionMiddleware picks the client's preferred Accept-Encoding (br when the
+brotli package is installed, else gzip) and compresses text and JSON responses of
+at least CANDY_COMPRESS_MIN_BYTES (default 1024) bytes. Smaller bodies, images
+and responses that are already encoded are sent as they are. Streamed responses
+(the NDJSON /candies) are compressed chunk by chunk, with each chunk flushed so
+the client can decode candies as they arrive.
+
+How hard to compress is set per route in ROUTE_QUALITY: per request responses
+(search, facets) favour latency over ratio.
+
+The stable catalog views (PRECOMPRESSED_ROUTES without a query string: /categories,
+the full /candies and each full /candies/category/{category}; pages are compressed
+per request) are compressed once per catalog version, and
+the result is kept in the query cache under the response's ETag (conditionalGet.py).
+Later requests for the same view and encoding get the stored bytes, and no CPU is
+spent compressing them again. Because the ETag changes with every write, a new
+version is compressed on its first request. That request gets the route's quick
+setting; a small background pool then recompresses the view at PRECOMPRESS_QUALITY
+and replaces the stored bytes. The pool has UPGRADE_WORKERS threads and takes at most
+MAX_PENDING_UPGRADES views; views beyond that keep their quick version, so a write
+never starts a burst of slow compressions. Without a query cache there are no ETags,
+and every response is compressed when it is sent.
+
+For clients that accept an encoding every response with an ETag carries it weak
+(W/"...") with Vary: Accept-Encoding, compressed or not and 304s included, as one
+ETag now names several byte sequences and a 304 must repeat the validator of the
+200 it confirms. conditionalGet.py compares If-None-Match weakly, so revalidation
+works with either form.
+"""
+
+from fastapi.concurrency import run_in_threadpool
+from starlette.datastructures import Headers, MutableHeaders
+from concurrent.futures import ThreadPoolExecutor
+from threading import Lock
+import gzip
+import os
+import zlib
+
+try:
+    import brotli
+except ImportError:  # gzip only
+    brotli = None
+
+
+MINIMUM_SIZE = int(os.environ.get("CANDY_COMPRESS_MIN_BYTES", 1024))
+
+# Bodies this big are compressed on the threadpool instead of the event loop
+OFFLOAD_BYTES = 64 * 1024
+
+# (path prefix, gzip level, brotli quality); the longest matching prefix wins
+ROUTE_QUALITY = [
+    ("/", 6, 5),
+    ("/candies/search", 4, 4),
+    ("/candies/suggest", 4, 4),
+    ("/candies/facets", 5, 5),
+]
+
+# Catalog views are recompressed at this setting in the background, once per catalog
+# version. On the full /candies brotli 11 is 14% smaller than 5 but takes ~0.6s
+PRECOMPRESS_QUALITY = (9, 11)
+PRECOMPRESSED_ROUTES = ["/categories", "/candies", "/candies/category/"]
+
+# Threads recompressing views at PRECOMPRESS_QUALITY, and views allowed to wait for them
+UPGRADE_WORKERS = 1
+MAX_PENDING_UPGRADES = 16
+
+COMPRESSIBLE_TYPES = ("application/json", "application/x-ndjson", "application/javascript", "image/svg+xml")
+
+
+def available_encodings():
+    """Encodings this server can produce, most preferred first."""
+    return ["br", "gzip"] if brotli is not None else ["gzip"]
+
+
+def negotiate(accept_encoding):
+    """The encoding to answer an Accept-Encoding header with, or None for identity."""
+    weights = {}
+    for part in accept_encoding.split(","):
+        name, _, parameters = part.partition(";")
+        weight = 1.0
+        parameter = parameters.strip()
+        if parameter.startswith("q="):
+            try:
+                weight = float(parameter[2:])
+            except ValueError:
+                weight = 0.0
+        weights[name.strip().lower()] = weight
+
+    best, best_weight = None, 0.0
+    for encoding in available_encodings():
+        weight = weights.get(encoding, weights.get("*", 0.0))
+        if weight > best_weight:
+            best, best_weight = encoding, weight
+    return best
+
+
+def route_path(path):
+    """The path without the /async prefix, so both api variants share their settings."""
+    if path.startswith("/async/"):
+        return path[len("/async"):]
+    return path
+
+
+def route_quality(path):
+    """(gzip level, brotli quality) for a request path."""
+    path = route_path(path)
+    _, level, quality = max(
+        (entry for entry in ROUTE_QUALITY if path.startswith(entry[0])), key=lambda entry: len(entry[0]))
+    return level, quality
+
+
+def is_precompressed(path, query_string=b""):
+    """True for the stable catalog views whose compressed bodies are cached (whole views only, not pages)."""
+    if query_string:
+        return False
+    path = route_path(path)
+    return any(path == route or (route.endswith("/") and path.startswith(route)) for route in PRECOMPRESSED_ROUTES)
+
+
+def is_compressible(headers):
+    if "content-encoding" in headers:
+        return False
+    content_type = headers.get("content-type", "").split(";")[0].strip().lower()
+    return content_type.startswith("text/") or content_type.endswith("+json") or content_type in COMPRESSIBLE_TYPES
+
+
+def vary_on_encoding(headers):
+    """Adds Accept-Encoding to the Vary header once."""
+    vary = [value.strip().lower() for value in headers.get("vary", "").split(",")]
+    if "accept-encoding" not in vary:
+        headers.add_vary_header("Accept-Encoding")
+
+
+def compress(body, encoding, quality):
+    """body compressed with encoding at quality, a (gzip level, brotli quality) pair."""
+    if encoding == "br":
+        return brotli.compress(body, quality=quality[1])
+    return gzip.compress(body, compresslevel=quality[0], mtime=0)
+
+
+class StreamCompressor:
+    """Compresses a streamed body chunk by chunk, flushing after each chunk."""
+
+    def __init__(self, encoding, quality):
+        self.encoding = encoding
+        if encoding == "br":
+            self.compressor = brotli.Compressor(quality=quality[1])
+        else:
+            # wbits 16 + 15 writes a gzip header and trailer
+            self.compressor = zlib.compressobj(quality[0], zlib.DEFLATED, 16 + zlib.MAX_WBITS)
+
+    def chunk(self, data):
+        if self.encoding == "br":
+            return self.compressor.process(data) + self.compressor.flush()
+        return self.compressor.compress(data) + self.compressor.flush(zlib.Z_SYNC_FLUSH)
+
+    def finish(self):
+        if self.encoding == "br":
+            return self.compressor.finish()
+        return self.compressor.flush()
+
+
+class CompressionMiddleware:
+    def __init__(self, app, **kwargs):
+        """
+        :param minimum_size: Smallest body in bytes worth compressing (default MINIMUM_SIZE).
+        :param cache: QueryCache to keep the compressed catalog views in (default None: compress every time).
+        """
+        self.app = app
+        self.minimum_size = kwargs.get("minimum_size", MINIMUM_SIZE)
+        self.cache = kwargs.get("cache", None)
+
+        # Cache keys queued or being recompressed at PRECOMPRESS_QUALITY
+        self._upgrading = set()
+        self._lock = Lock()
+        self._upgrades = ThreadPoolExecutor(max_workers=UPGRADE_WORKERS, thread_name_prefix="compression-upgrade")
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+
+        encoding = negotiate(Headers(scope=scope).get("accept-encoding", ""))
+        if encoding is None:
+            await self.app(scope, receive, send)
+            return
+
+        responder = CompressingResponder(self, scope, encoding, send)
+        await self.app(scope, receive, responder.send)
+
+    def upgrade(self, key, body, encoding):
+        """
+        Queues a stored catalog view for recompression at PRECOMPRESS_QUALITY, unless
+        it is already queued or MAX_PENDING_UPGRADES views are waiting.
+        """
+        with self._lock:
+            if key in self._upgrading or len(self._upgrading) >= MAX_PENDING_UPGRADES:
+                return
+            self._upgrading.add(key)
+        self._upgrades.submit(self._upgrade, key, body, encoding)
+
+    def _upgrade(self, key, body, encoding):
+        try:
+            self.cache.put(key, {"body": compress(body, encoding, PRECOMPRESS_QUALITY)})
+        finally:
+            with self._lock:
+                self._upgrading.discard(key)
+
+
+class CompressingResponder:
+    """Wraps send for one response, compressing its body once it knows its size and type."""
+
+    def __init__(self, middleware, scope, encoding, send):
+        self.middleware = middleware
+        self.path = scope["path"]
+        self.query_string = scope.get("query_string", b"")
+        self.encoding = encoding
+        self.inner_send = send
+
+        self.start = None
+        self.stream = None
+        self.passthrough = False
+
+    async def send(self, message):
+        if message["type"] == "http.response.start":
+            # Held back until the first body chunk tells whether to compress
+            self.start = message
+            return
+        if message["type"] != "http.response.body" or self.passthrough:
+            await self.inner_send(message)
+            return
+        if self.stream is not None:
+            await self.send_chunk(message)
+            return
+
+        headers = MutableHeaders(raw=self.start["headers"])
+        body = message.get("body", b"")
+        more_body = message.get("more_body", False)
+
+        if "etag" in headers:
+            # Same validator whether this response ends up compressed, small or a 304
+            vary_on_encoding(headers)
+            self.weaken_etag(headers)
+
+        if not is_compressible(headers):
+            await self.pass_through(message)
+            return
+        vary_on_encoding(headers)
+
+        if more_body:
+            self.stream = StreamCompressor(self.encoding, route_quality(self.path))
+            headers["Content-Encoding"] = self.encoding
+            del headers["Content-Length"]
+            self.weaken_etag(headers)
+            await self.inner_send(self.start)
+            await self.send_chunk(message)
+            return
+
+        if len(body) < self.middleware.minimum_size:
+            await self.pass_through(message)
+            return
+
+        body = await self.compressed(body, headers.get("etag"))
+        headers["Content-Encoding"] = self.encoding
+        headers["Content-Length"] = str(len(body))
+        self.weaken_etag(headers)
+        await self.inner_send(self.start)
+        await self.inner_send({"type": "http.response.body", "body": body})
+
+    async def pass_through(self, message):
+        self.passthrough = True
+        await self.inner_send(self.start)
+        await self.inner_send(message)
+
+    async def send_chunk(self, message):
+        data = self.stream.chunk(message.get("body", b""))
+        more_body = message.get("more_body", False)
+        if not more_body:
+            data += self.stream.finish()
+        await self.inner_send({"type": "http.response.body", "body": data, "more_body": more_body})
+
+    async def compressed(self, body, etag):
+        """body compressed for this response, from the cache for the precompressed catalog views."""
+        cache = self.middleware.cache
+        precompressed = cache is not None and etag is not None and is_precompressed(self.path, self.query_string)
+        if precompressed:
+            key = cache.compressed_key(etag, self.encoding)
+            stored = cache.get(key)
+            if stored is not None:
+                return stored["body"]
+
+        quality = route_quality(self.path)
+        if len(body) >= OFFLOAD_BYTES:
+            compressed = await run_in_threadpool(compress, body, self.encoding, quality)
+        else:
+            compressed = compress(body, self.encoding, quality)
+
+        if precompressed:
+            cache.put(key, {"body": compressed})
+            self.middleware.upgrade(key, body, self.encoding)
+        return compressed
+
+    def weaken_etag(self, headers):
+        etag = headers.get("etag")
+        if etag and not etag.startswith("W/"):
+            headers["ETag"] = "W/" + etag
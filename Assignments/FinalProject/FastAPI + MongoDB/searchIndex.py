@@ -0,0 +1,245 @@
+"""
+Inverted index behind /candies/search: tokenized candy names and categories,
+trigram fuzzy matching for misspelled or partial words, and BM25 ranking.
+
+Text is normalized (accents and apostrophes dropped, lowercased) and split into
+alphanumeric tokens, so "Reese's" and "reeses" are the same term. Name tokens
+count NAME_WEIGHT times as much as category tokens (a BM25F style field weight),
+so "sour" ranks Sour Patch Kids above a candy that is merely in the Sour category.
+
+A query token that is in the vocabulary matches exactly. One that is not is
+expanded to the closest vocabulary terms by trigram similarity (Dice coefficient
+over the trigrams of the space padded words, as in pg_trgm): at most
+FUZZY_EXPANSIONS terms scoring FUZZY_THRESHOLD or more, each weighted by its
+similarity. A candy's score is the sum, over the query tokens, of its best
+weighted BM25 score among that token's terms, so candies matching more of the
+query rank higher.
+
+The index is built when the api starts and kept current after candy writes
+(catalogIndex.py). Until it is ready, or with CANDY_SEARCH_INDEX=0, the route
+falls back to a case-insensitive $regex on the name, answered in the same shape
+(result_size counts every match; matched is empty and source is "database").
+
+    python searchIndex.py "sour gumy worms"    # search the local candy_store
+"""
+
+from collections import Counter, defaultdict
+import heapq
+import math
+import os
+import re
+import unicodedata
+
+from catalogIndex import CatalogIndex
+from models import ROUTE_FIELDS
+
+
+NAME_WEIGHT = 2
+
+# BM25 parameters (the usual defaults)
+BM25_K1 = 1.2
+BM25_B = 0.75
+
+FUZZY_THRESHOLD = 0.45
+FUZZY_EXPANSIONS = 4
+# Shorter tokens have too few trigrams to match fuzzily without noise
+MIN_FUZZY_LENGTH = 3
+
+TOKEN = re.compile(r"[a-z0-9]+")
+
+
+def normalize(text):
+    """Lowercases text and strips accents and apostrophes."""
+    text = unicodedata.normalize("NFKD", text).encode("ascii", "ignore").decode()
+    return text.lower().replace("'", "")
+
+
+def tokenize(text):
+    """The alphanumeric tokens of text, normalized."""
+    return TOKEN.findall(normalize(text or ""))
+
+
+def trigrams(term):
+    """Trigrams of the term padded like pg_trgm ("  ab" + "c "), so short words and word starts count."""
+    padded = f"  {term} "
+    return {padded[i:i + 3] for i in range(len(padded) - 2)}
+
+
+def weighted_terms(doc):
+    """Term -> weighted frequency over the candy's name and category."""
+    terms = Counter()
+    for token in tokenize(doc.get("name")):
+        terms[token] += NAME_WEIGHT
+    for token in tokenize(doc.get("category")):
+        terms[token] += 1
+    return terms
+
+
+class SearchState:
+    def __init__(self):
+        # term -> {_id: weighted frequency}
+        self.postings = defaultdict(dict)
+        # _id -> (response document, length, terms)
+        self.docs = {}
+        self.total_length = 0
+
+        # trigram -> terms containing it, and the trigram count of every term
+        self.trigram_terms = defaultdict(set)
+        self.trigram_count = {}
+
+    def add(self, key, doc, terms):
+        length = sum(terms.values())
+        self.docs[key] = (doc, length, terms)
+        self.total_length += length
+
+        for term, frequency in terms.items():
+            if term not in self.postings:
+                grams = trigrams(term)
+                self.trigram_count[term] = len(grams)
+                for gram in grams:
+                    self.trigram_terms[gram].add(term)
+            self.postings[term][key] = frequency
+
+    def remove(self, key):
+        entry = self.docs.pop(key, None)
+        if entry is None:
+            return
+        _, length, terms = entry
+        self.total_length -= length
+
+        for term in terms:
+            postings = self.postings[term]
+            postings.pop(key, None)
+            if not postings:
+                del self.postings[term]
+                del self.trigram_count[term]
+                for gram in trigrams(term):
+                    self.trigram_terms[gram].discard(term)
+                    if not self.trigram_terms[gram]:
+                        del self.trigram_terms[gram]
+
+    def expand(self, token):
+        """[(term, weight)] a query token matches: itself, or its closest terms by trigram similarity."""
+        if token in self.postings:
+            return [(token, 1.0)]
+        if len(token) < MIN_FUZZY_LENGTH:
+            return []
+
+        grams = trigrams(token)
+        shared = Counter()
+        for gram in grams:
+            shared.update(self.trigram_terms.get(gram, ()))
+
+        similar = [
+            (term, 2 * count / (len(grams) + self.trigram_count[term]))
+            for term, count in shared.items()
+        ]
+        similar = [(term, similarity) for term, similarity in similar if similarity >= FUZZY_THRESHOLD]
+        return heapq.nlargest(FUZZY_EXPANSIONS, similar, key=lambda pair: pair[1])
+
+    def score(self, tokens):
+        """_id -> score of every candy matching at least one token, and token -> the terms it matched."""
+        count = len(self.docs)
+        average_length = self.total_length / count if count else 0
+        scores = defaultdict(float)
+        matched = {}
+
+        for token in tokens:
+            expansions = self.expand(token)
+            matched[token] = [term for term, _ in expansions]
+
+            best = {}
+            for term, weight in expansions:
+                postings = self.postings[term]
+                idf = math.log(1 + (count - len(postings) + 0.5) / (len(postings) + 0.5))
+                for key, frequency in postings.items():
+                    length = self.docs[key][1]
+                    norm = frequency + BM25_K1 * (1 - BM25_B + BM25_B * length / average_length)
+                    value = weight * idf * frequency * (BM25_K1 + 1) / norm
+                    if value > best.get(key, 0):
+                        best[key] = value
+
+            for key, value in best.items():
+                scores[key] += value
+        return scores, matched
+
+
+class SearchIndex(CatalogIndex):
+    name = "search index"
+
+    def __init__(self, fields, **kwargs):
+        """
+        :param fields: Projection of the documents searches return (the route's ROUTE_FIELDS entry).
+        Other keyword arguments go to CatalogIndex (max_age, stale_grace).
+        """
+        self.fields = [field for field, include in fields.items() if include and field != "_id"]
+        super().__init__({field: 1 for field in {*self.fields, "name", "category"}}, **kwargs)
+
+    def new_state(self):
+        return SearchState()
+
+    def add(self, state, doc):
+        terms = weighted_terms(doc)
+        if terms:
+            state.add(doc["_id"], {field: doc[field] for field in self.fields if field in doc}, terms)
+
+    def remove(self, state, key):
+        state.remove(key)
+
+    def state_stats(self, state):
+        return {"candies": len(state.docs), "terms": len(state.postings), "trigrams": len(state.trigram_terms)}
+
+    def search(self, text, limit=20, offset=0):
+        """
+        Candies matching text, best first (ties in name order).
+
+        :return: Dictionary with success, result_size (all matches), data (this page,
+                 each with its score) and matched (query token -> terms it matched),
+                 or None when the index is not built yet or behind a write.
+        """
+        tokens = list(dict.fromkeys(tokenize(text)))
+        generation = self.current_generation()
+
+        with self._lock:
+            state = self.readable_state(generation)
+            if state is None:
+                return None
+            scores, matched = state.score(tokens)
+            page = heapq.nsmallest(
+                offset + limit, scores.items(),
+                key=lambda item: (-item[1], state.docs[item[0]][0].get("name", "")),
+            )[offset:]
+            data = [{**state.docs[key][0], "score": round(score, 4)} for key, score in page]
+
+        return {
+            "success": True,
+            "result_size": len(scores),
+            "limit": limit,
+            "offset": offset,
+            "data": data,
+            "matched": matched,
+            "source": "search_index",
+        }
+
+
+def search_index_from_env(fields):
+    """The SearchIndex unless CANDY_SEARCH_INDEX=0."""
+    if os.environ.get("CANDY_SEARCH_INDEX", "1") == "0":
+        return None
+    return SearchIndex(fields)
+
+
+# Shared by api.py and asyncApi.py; api.py starts it once the collections are checked
+catalog_search_index = search_index_from_env(ROUTE_FIELDS["/candies/search"])
+
+
+if __name__ == "__main__":
+    import sys
+    from rich import print
+    from mongoManager import MongoManager
+
+    index = SearchIndex(ROUTE_FIELDS["/candies/search"])
+    index.handle = MongoManager(db="candy_store").collection_for("candies")
+    index.build()
+    print(index.stats())
+    print(index.search(" ".join(sys.argv[1:]) or "sour gummy worms", limit=10))
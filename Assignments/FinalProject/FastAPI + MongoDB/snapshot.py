@@ -0,0 +1,285 @@
+"""
+Snapshot export and parallel restore of candy_store, so a test or staging database
+can be rebuilt in seconds instead of rerunning loadMongo.py from the raw json.
+
+A snapshot is a directory with gzip compressed chunks of every collection plus a
+snapshot.json manifest holding the chunk list, document counts and index definitions:
+
+    snapshots/candy_store/
+        snapshot.json
+        candies-00000.bson.gz
+        candies-00001.bson.gz
+        ...
+
+Formats:
+    bson    documents are copied as raw BSON (what mongodump writes), so nothing is
+            decoded or re-encoded on the way out or back in. The default.
+    ndjson  one canonical extended JSON document per line; readable and diffable,
+            but every value goes through json_util.
+
+dump reads each collection with one cursor and hands finished chunks to a thread
+pool that compresses and writes them (zlib releases the GIL), with all collections
+exported at the same time. Readers wait once PENDING_CHUNKS_PER_THREAD chunks per
+writer are pending, so memory stays flat when the disk is slower than Mongo. restore inserts every chunk concurrently through the
+unordered bulk() path and creates the indexes only after all data is in, which is
+much cheaper than maintaining them during the inserts.
+
+    python snapshot.py dump [directory] [--format ndjson] [--db candy_store]
+    python snapshot.py restore [directory] [--db candy_store]
+"""
+
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime
+from threading import BoundedSemaphore
+from bson import decode_file_iter, json_util
+from bson.codec_options import CodecOptions
+from bson.json_util import JSONOptions, JSONMode
+from bson.raw_bson import RawBSONDocument
+from rich import print
+import gzip
+import json
+import os
+import sys
+import time
+
+from mongoManager import MongoManager
+
+
+# manifest (loadMongo.py's per file hashes) keeps reload() incremental after a restore;
+# counters holds the last category id handed out (categoryStats.py)
+SNAPSHOT_COLLECTIONS = ["candies", "categories", "users", "locations", "images", "manifest", "counters"]
+SNAPSHOT_FORMATS = ("bson", "ndjson")
+DEFAULT_SNAPSHOT_DIRECTORY = "./snapshots/candy_store"
+MANIFEST_FILE = "snapshot.json"
+
+# Documents per chunk file
+DEFAULT_CHUNK_SIZE = 50000
+
+# Finished chunks allowed to wait for or sit in the writer pool, per writer thread
+PENDING_CHUNKS_PER_THREAD = 2
+
+# Canonical extended JSON keeps every BSON type (ObjectId, dates, int vs double) intact
+CANONICAL_JSON = JSONOptions(json_mode=JSONMode.CANONICAL)
+RAW_BSON = CodecOptions(document_class=RawBSONDocument)
+
+
+def encode_chunk(documents, snapshot_format):
+    """Serializes one chunk of documents (RawBSONDocument for bson, dicts for ndjson)."""
+    if snapshot_format == "bson":
+        return b"".join(document.raw for document in documents)
+    return "".join(json_util.dumps(document, json_options=CANONICAL_JSON) + "\n" for document in documents).encode()
+
+
+def write_chunk(path, documents, snapshot_format, compresslevel):
+    """Encodes, compresses and writes one chunk. Runs on the writer pool."""
+    data = encode_chunk(documents, snapshot_format)
+    with gzip.open(path, "wb", compresslevel=compresslevel) as f:
+        f.write(data)
+    return len(documents)
+
+
+def read_chunk(path, snapshot_format):
+    """Yields the documents of one chunk file."""
+    with gzip.open(path, "rb") as f:
+        if snapshot_format == "bson":
+            yield from decode_file_iter(f, codec_options=RAW_BSON)
+        else:
+            for line in f:
+                if line.strip():
+                    yield json_util.loads(line, json_options=CANONICAL_JSON)
+
+
+def index_definitions(collection):
+    """
+    Returns the collection's indexes (except _id) as create_index keyword
+    arguments: {"keys": [(field, direction)], "name": ..., <options>}.
+    """
+    definitions = []
+    for name, info in collection.index_information().items():
+        if name == "_id_":
+            continue
+        options = {k: v for k, v in info.items() if k not in ("key", "v", "ns")}
+        definitions.append({"keys": [list(key) for key in info["key"]], "name": name, **options})
+    return definitions
+
+
+def dump_collection(handle, name, directory, pool, pending, **kwargs):
+    """
+    Streams one collection into chunk files, submitting each chunk to pool.
+
+    :param pending: Semaphore bounding the chunks submitted and not yet written;
+                    the read waits on it, each finished write releases it.
+
+    :return: (futures of the chunk writes, chunk file names)
+    """
+    snapshot_format = kwargs.get("format", "bson")
+    chunk_size = kwargs.get("chunk_size", DEFAULT_CHUNK_SIZE)
+    compresslevel = kwargs.get("compresslevel", 6)
+
+    collection = handle.collection
+    if snapshot_format == "bson":
+        collection = collection.with_options(codec_options=RAW_BSON)
+
+    futures, files, chunk = [], [], []
+
+    def flush():
+        file_name = f"{name}-{len(files):05d}.{snapshot_format}.gz"
+        files.append(file_name)
+        pending.acquire()
+        future = pool.submit(write_chunk, os.path.join(directory, file_name), chunk, snapshot_format, compresslevel)
+        future.add_done_callback(lambda _: pending.release())
+        futures.append(future)
+
+    for document in collection.find().sort("_id", 1).batch_size(min(chunk_size, 10000)):
+        chunk.append(document)
+        if len(chunk) >= chunk_size:
+            flush()
+            chunk = []
+    if chunk:
+        flush()
+
+    return futures, files
+
+
+def dump(mm, directory=DEFAULT_SNAPSHOT_DIRECTORY, **kwargs):
+    """
+    Writes a snapshot of every collection in SNAPSHOT_COLLECTIONS.
+
+    :param mm: MongoManager with the source database selected.
+    :param directory: Snapshot directory (created if needed, old chunks are replaced).
+    :param format: bson (default) or ndjson.
+    :param chunk_size: Documents per chunk file.
+    :param threads: Writer threads compressing and writing chunks (default 2 per core).
+    :param collections: Collections to export (default SNAPSHOT_COLLECTIONS).
+    :return: The manifest that was written.
+    """
+    snapshot_format = kwargs.get("format", "bson")
+    if snapshot_format not in SNAPSHOT_FORMATS:
+        raise ValueError(f"Unknown snapshot format {snapshot_format!r}, expected one of {SNAPSHOT_FORMATS}")
+
+    collections = kwargs.get("collections", SNAPSHOT_COLLECTIONS)
+    threads = kwargs.get("threads", None) or 2 * os.cpu_count()
+
+    os.makedirs(directory, exist_ok=True)
+    for file_name in os.listdir(directory):
+        if file_name.endswith(".gz") or file_name == MANIFEST_FILE:
+            os.remove(os.path.join(directory, file_name))
+
+    start = time.perf_counter()
+    manifest = {
+        "db": mm.db.name,
+        "format": snapshot_format,
+        "created_at": datetime.utcnow().isoformat(),
+        "collections": {},
+    }
+
+    pending = BoundedSemaphore(PENDING_CHUNKS_PER_THREAD * threads)
+    with ThreadPoolExecutor(max_workers=threads) as pool:
+        # One reader per collection, all sharing the writer pool and its pending chunk budget
+        with ThreadPoolExecutor(max_workers=len(collections)) as readers:
+            exports = {
+                name: readers.submit(dump_collection, mm.collection_for(name), name, directory, pool, pending, **kwargs)
+                for name in collections
+            }
+
+        for name, export in exports.items():
+            futures, files = export.result()
+            manifest["collections"][name] = {
+                "count": sum(future.result() for future in futures),
+                "chunks": files,
+                "indexes": index_definitions(mm.collection_for(name).collection),
+            }
+
+    with open(os.path.join(directory, MANIFEST_FILE), "w") as f:
+        json.dump(manifest, f, indent=4)
+
+    total = sum(entry["count"] for entry in manifest["collections"].values())
+    print(f"Dumped {total:,} documents from {len(collections)} collections to {directory} "
+          f"in {time.perf_counter() - start:.2f}s")
+    return manifest
+
+
+def restore_chunk(handle, path, snapshot_format, batch_size):
+    """Inserts one chunk file through the unordered bulk path. Runs on the restore pool."""
+    return handle.bulk(
+        ({"op": "insert", "document": document} for document in read_chunk(path, snapshot_format)),
+        batch_size=batch_size,
+    )
+
+
+def restore(mm, directory=DEFAULT_SNAPSHOT_DIRECTORY, **kwargs):
+    """
+    Drops the snapshot's collections in the selected database, inserts all chunks
+    concurrently and then rebuilds the recorded indexes.
+
+    :param mm: MongoManager with the target database selected.
+    :param threads: Concurrent chunk inserts (default 2 per core).
+    :param batch_size: Documents per bulk insert (default 1000).
+    :return: Dictionary with inserted, indexes, errors and seconds.
+    """
+    threads = kwargs.get("threads", None) or 2 * os.cpu_count()
+    batch_size = kwargs.get("batch_size", 1000)
+
+    with open(os.path.join(directory, MANIFEST_FILE)) as f:
+        manifest = json.load(f)
+
+    snapshot_format = manifest["format"]
+    start = time.perf_counter()
+    result = {"inserted": 0, "indexes": 0, "errors": []}
+
+    for name in manifest["collections"]:
+        mm.dropCollection(name)
+
+    with ThreadPoolExecutor(max_workers=threads) as pool:
+        futures = [
+            pool.submit(restore_chunk, mm.collection_for(name), os.path.join(directory, file_name),
+                        snapshot_format, batch_size)
+            for name, entry in manifest["collections"].items()
+            for file_name in entry["chunks"]
+        ]
+        for future in futures:
+            written = future.result()
+            result["inserted"] += written["inserted"]
+            result["errors"].extend(written["errors"])
+
+    # Indexes last: one sorted build per index instead of updating them on every insert
+    for name, entry in manifest["collections"].items():
+        collection = mm.collection_for(name).collection
+        for definition in entry["indexes"]:
+            options = dict(definition)
+            keys = [tuple(key) for key in options.pop("keys")]
+            try:
+                collection.create_index(keys, **options)
+                result["indexes"] += 1
+            except Exception as e:
+                result["errors"].append({"collection": name, "index": options.get("name"), "message": str(e)})
+
+    result["seconds"] = round(time.perf_counter() - start, 2)
+    print(f"Restored {result['inserted']:,} documents and {result['indexes']} indexes into {mm.db.name} "
+          f"in {result['seconds']}s, {len(result['errors'])} errors")
+    return result
+
+
+if __name__ == "__main__":
+    args = sys.argv[1:]
+
+    def option(flag, default):
+        if flag in args:
+            value = args[args.index(flag) + 1]
+            del args[args.index(flag):args.index(flag) + 2]
+            return value
+        return default
+
+    db_name = option("--db", "candy_store")
+    snapshot_format = option("--format", "bson")
+    command = args[0] if args else "dump"
+    directory = args[1] if len(args) > 1 else DEFAULT_SNAPSHOT_DIRECTORY
+
+    mm = MongoManager(db=db_name)
+
+    if command == "dump":
+        dump(mm, directory, format=snapshot_format)
+    elif command == "restore":
+        restore(mm, directory)
+    else:
+        print(f"Unknown command {command!r}, expected dump or restore")
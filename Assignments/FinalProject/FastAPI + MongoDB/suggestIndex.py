@@ -0,0 +1,223 @@
+"""
+Sorted-array prefix index behind /candies/suggest, the search box's autocomplete.
+
+Candy names are normalized like the search index does it (searchIndex.py: accents
+and apostrophes dropped, lowercased, punctuation collapsed to single spaces) and
+kept in two sorted lists:
+
+    names    every distinct normalized name
+    words    "<name from its 2nd, 3rd, ... word on>\\x01<name>" for every distinct name
+
+A prefix is two binary searches (bisect) into each list and a scan of at most
+limit entries, so typing "gum" suggests names starting with "gum" first, then
+names with a word starting with it ("Sour Gummy Worms"), each group in name
+order. Candies sharing a name (the same candy listed in several categories) are
+one suggestion.
+
+Each build makes new lists and swaps them in whole, so a catalog reload never
+shows a half built index; writes through the api update the lists in place
+(catalogIndex.py). Until it is ready, or with CANDY_SUGGEST_INDEX=0, the route
+falls back to an anchored case-insensitive $regex on the name.
+
+    python suggestIndex.py [candies]    # synthetic build time and lookup latency
+"""
+
+from bisect import bisect_left, insort
+from rich import print
+import os
+import time
+
+from catalogIndex import CatalogIndex
+from models import ROUTE_FIELDS
+from searchIndex import tokenize
+
+
+# Joins a word suffix to the name it came from; sorts before any character of a name
+SEPARATOR = "\x01"
+
+
+def name_key(text):
+    """The normalized form names and prefixes are compared in."""
+    return " ".join(tokenize(text))
+
+
+def prefix_key(text):
+    """name_key of a typed prefix, keeping a trailing word break ("gummy " only matches the whole word)."""
+    key = name_key(text)
+    if key and not text[-1].isalnum():
+        key += " "
+    return key
+
+
+def word_entries(key):
+    """The words list entries of a normalized name."""
+    words = key.split(" ")
+    return [" ".join(words[n:]) + SEPARATOR + key for n in range(1, len(words))]
+
+
+def remove_sorted(items, item):
+    """Deletes item from the sorted list items, if present."""
+    position = bisect_left(items, item)
+    if position < len(items) and items[position] == item:
+        del items[position]
+
+
+class SuggestState:
+    def __init__(self):
+        self.names = []
+        self.words = []
+        # normalized name -> {_id: suggestion}; _id -> its normalized name
+        self.candies = {}
+        self.key_of = {}
+        # Lists are appended to while a build loads and sorted once at the end
+        self.sorted = False
+
+    def add(self, key, doc, name):
+        if name not in self.candies:
+            self.candies[name] = {}
+            entries = word_entries(name)
+            if self.sorted:
+                insort(self.names, name)
+                for entry in entries:
+                    insort(self.words, entry)
+            else:
+                self.names.append(name)
+                self.words.extend(entries)
+        self.candies[name][key] = doc
+        self.key_of[key] = name
+
+    def remove(self, key):
+        name = self.key_of.pop(key, None)
+        if name is None:
+            return
+        holders = self.candies[name]
+        holders.pop(key, None)
+        if not holders:
+            del self.candies[name]
+            remove_sorted(self.names, name)
+            for entry in word_entries(name):
+                remove_sorted(self.words, entry)
+
+    def finish(self):
+        self.names.sort()
+        self.words.sort()
+        self.sorted = True
+
+    def lookup(self, prefix, limit):
+        """
+        Up to limit normalized names matching prefix: name starts first, then word
+        starts. A prefix ending in a space ("kit kat ") also matches the word it
+        completes at the end of a name ("kit kat", "sour gummy worms" for "worms ").
+        """
+        whole = prefix.rstrip(" ")
+        ends_word = whole != prefix
+
+        found = []
+        position = bisect_left(self.names, whole if ends_word else prefix)
+        while len(found) < limit and position < len(self.names):
+            name = self.names[position]
+            if not (name.startswith(prefix) or (ends_word and name == whole)):
+                break
+            found.append(name)
+            position += 1
+
+        seen = set(found)
+        last_word = whole + SEPARATOR
+        position = bisect_left(self.words, last_word if ends_word else prefix)
+        while len(found) < limit and position < len(self.words):
+            entry = self.words[position]
+            if not (entry.startswith(prefix) or (ends_word and entry.startswith(last_word))):
+                break
+            name = entry.split(SEPARATOR, 1)[1]
+            if name not in seen:
+                seen.add(name)
+                found.append(name)
+            position += 1
+        return found
+
+
+class SuggestIndex(CatalogIndex):
+    name = "suggest index"
+
+    def __init__(self, fields, **kwargs):
+        """
+        :param fields: Projection of the suggestions returned (the route's ROUTE_FIELDS entry).
+        Other keyword arguments go to CatalogIndex (max_age, stale_grace).
+        """
+        self.fields = [field for field, include in fields.items() if include and field != "_id"]
+        super().__init__({field: 1 for field in {*self.fields, "name"}}, **kwargs)
+
+    def new_state(self):
+        return SuggestState()
+
+    def add(self, state, doc):
+        name = name_key(doc.get("name"))
+        if name:
+            state.add(doc["_id"], {field: doc[field] for field in self.fields if field in doc}, name)
+
+    def remove(self, state, key):
+        state.remove(key)
+
+    def after_load(self, state):
+        state.finish()
+
+    def state_stats(self, state):
+        return {"candies": len(state.key_of), "names": len(state.names), "word_entries": len(state.words)}
+
+    def suggest(self, prefix, limit=10):
+        """
+        Candy names completing prefix, name starts first.
+
+        :return: Dictionary with success, result_size and data (one document per
+                 name), or None when the index is not built yet or behind a write.
+        """
+        key = prefix_key(prefix)
+        generation = self.current_generation()
+
+        with self._lock:
+            state = self.readable_state(generation)
+            if state is None:
+                return None
+            names = state.lookup(key, limit) if key else []
+            data = [next(iter(state.candies[name].values())) for name in names]
+
+        return {"success": True, "result_size": len(data), "data": data, "source": "suggest_index"}
+
+
+def suggest_index_from_env(fields):
+    """The SuggestIndex unless CANDY_SUGGEST_INDEX=0."""
+    if os.environ.get("CANDY_SUGGEST_INDEX", "1") == "0":
+        return None
+    return SuggestIndex(fields)
+
+
+# Shared by api.py and asyncApi.py; api.py starts it once the collections are checked
+catalog_suggest_index = suggest_index_from_env(ROUTE_FIELDS["/candies/suggest"])
+
+
+if __name__ == "__main__":
+    import random
+    import sys
+    from bson import ObjectId
+    from generateData import generate_candies, load_templates
+
+    count = int(sys.argv[1]) if len(sys.argv) > 1 else 1_000_000
+    candies = generate_candies((0, count, 5373, load_templates()))
+    for candy in candies:
+        candy["_id"] = ObjectId()
+
+    index = SuggestIndex(ROUTE_FIELDS["/candies/suggest"])
+    index.load(candies)
+    print(f"built {count:,} candies in {index.stats()['build_seconds']}s: {index.stats()}")
+
+    rng = random.Random(5373)
+    names = [candy["name"] for candy in rng.sample(candies, 2000)]
+    for length in (1, 3, 6):
+        timings = []
+        for name in names:
+            start = time.perf_counter()
+            index.suggest(name[:length])
+            timings.append(time.perf_counter() - start)
+        timings.sort()
+        p50, p99 = timings[len(timings) // 2] * 1e6, timings[int(len(timings) * 0.99)] * 1e6
+        print(f"{length} character prefixes: p50 {p50:6.1f} us  p99 {p99:6.1f} us")
@@ -0,0 +1,55 @@
+"""
+Shared fixtures. Run from the FastAPI + MongoDB directory:
+
+    python -m pytest -q tests
+
+Tests that need a database use mongomock (and mongomock_motor for the async
+manager) when installed, or a real mongod at CANDY_TEST_MONGO_URL
+(default mongodb://localhost:27017) for the ones that need real query plans.
+Either is skipped when unavailable.
+"""
+
+import os
+import sys
+
+import pytest
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import asyncMongoManager
+import mongoManager
+from mongoManager import ClientRegistry
+
+
+TEST_DB = "candy_store_test"
+
+
+@pytest.fixture
+def mock_clients(monkeypatch):
+    """Points the sync and async managers at one shared in-memory mongomock server."""
+    mongomock = pytest.importorskip("mongomock")
+    mongomock_motor = pytest.importorskip("mongomock_motor")
+
+    client = mongomock.MongoClient()
+    async_client = mongomock_motor.AsyncMongoMockClient(mock_mongo_client=client)
+    monkeypatch.setattr(mongoManager, "client_registry", ClientRegistry(lambda url, **options: client, ping=False))
+    monkeypatch.setattr(
+        asyncMongoManager, "async_client_registry", ClientRegistry(lambda url, **options: async_client, ping=False))
+    return client
+
+
+@pytest.fixture
+def mongo_url():
+    """Url of a reachable mongod, or skips the test."""
+    from pymongo import MongoClient
+    from pymongo.errors import PyMongoError
+
+    url = os.environ.get("CANDY_TEST_MONGO_URL", "mongodb://localhost:27017")
+    client = MongoClient(url, serverSelectionTimeoutMS=500)
+    try:
+        client.admin.command("ping")
+    except PyMongoError:
+        pytest.skip(f"no mongod at {url}")
+    finally:
+        client.close()
+    return url
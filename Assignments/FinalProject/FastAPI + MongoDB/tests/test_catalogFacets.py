@@ -0,0 +1,59 @@
+from catalogFacets import OTHER_PRICES, PRICE_BUCKETS, candy_facets, facet_filter, facet_pipeline, format_facets
+from mongoManager import MongoManager
+from queryCache import QueryCache
+from conftest import TEST_DB
+
+
+def test_facet_filter():
+    assert facet_filter() == {}
+    assert facet_filter(3, 1.0, None) == {"category_id": 3, "price": {"$gte": 1.0}}
+    assert facet_filter(max_price=5.0) == {"price": {"$lte": 5.0}}
+
+
+def test_buckets_are_closed_and_keep_unpriced_candies_apart():
+    bucket = facet_pipeline({})[-1]["$facet"]["prices"][0]["$bucket"]
+    assert bucket["boundaries"] == PRICE_BUCKETS + [float("inf")]
+    assert bucket["default"] == OTHER_PRICES
+
+
+def test_format_facets_labels_every_bucket():
+    facets = {
+        "data": [{"name": "A"}],
+        "total": [{"count": 9}],
+        "categories": [{"_id": 2, "name": "Gummy", "count": 9}],
+        "prices": [
+            {"_id": 0, "count": 1},
+            {"_id": 100, "count": 2},
+            {"_id": 250, "count": 3},
+            {"_id": OTHER_PRICES, "count": 3},
+        ],
+    }
+    result = format_facets(facets, 20, 0)
+    assert result["prices"] == [
+        {"min_price": 0, "max_price": 10, "count": 1},
+        {"min_price": 100, "max_price": 250, "count": 2},
+        {"min_price": 250, "max_price": None, "count": 3},
+    ]
+    assert result["unpriced"] == 3
+    assert result["result_size"] == 9
+    assert result["categories"] == [{"category_id": 2, "name": "Gummy", "count": 9}]
+
+
+def test_format_facets_without_matches():
+    result = format_facets({"data": [], "total": [], "categories": [], "prices": []}, 20, 40)
+    assert (result["result_size"], result["prices"], result["unpriced"], result["offset"]) == (0, [], 0, 40)
+
+
+def test_candy_facets_runs_one_aggregation(mock_clients):
+    candies = MongoManager(db=TEST_DB, query_cache=QueryCache()).collection_for("candies")
+    candies.collection.insert_many([
+        {"id": str(n), "name": f"Candy {n}", "price": price, "category_id": n % 2, "category": f"C{n % 2}"}
+        for n, price in enumerate([1.0, 9.99, 10.0, 249.0, 250.0, 1000.0, -1.0])
+    ])
+
+    result = candy_facets(candies, facet_filter(), limit=2)
+    assert result["result_size"] == 7
+    assert [doc["price"] for doc in result["data"]] == [-1.0, 1.0]
+    assert {(bucket["min_price"], bucket["count"]) for bucket in result["prices"]} == {(0, 2), (10, 1), (100, 1), (250, 2)}
+    assert result["unpriced"] == 1
+    assert candy_facets(candies, facet_filter(), limit=2) == result
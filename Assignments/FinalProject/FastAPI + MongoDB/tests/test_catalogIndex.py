@@ -0,0 +1,49 @@
+from types import SimpleNamespace
+
+from models import ROUTE_FIELDS
+from queryCache import QueryCache
+from suggestIndex import SuggestIndex
+
+
+NAMESPACE = "candy_store_test.candies"
+
+
+class ProbedCache(QueryCache):
+    """QueryCache recording whether the index lock was held while a generation was read."""
+
+    def __init__(self):
+        super().__init__()
+        self.index = None
+        self.read_under_lock = []
+
+    def generation(self, namespace):
+        if self.index is not None:
+            self.read_under_lock.append(self.index._lock.locked())
+        return super().generation(namespace)
+
+
+def bound_index(cache):
+    index = SuggestIndex(ROUTE_FIELDS["/candies/suggest"])
+    index.cache = cache
+    index.handle = SimpleNamespace(collection=SimpleNamespace(full_name=NAMESPACE))
+    index.load([{"_id": 1, "name": "Sour Gummy Worms"}], cache.generation(NAMESPACE))
+    return index
+
+
+def test_generation_is_read_outside_the_lock():
+    cache = ProbedCache()
+    cache.index = bound_index(cache)
+    cache.read_under_lock.clear()
+
+    assert cache.index.suggest("sour")["result_size"] == 1
+    assert cache.read_under_lock == [False]
+
+
+def test_lookups_fall_back_while_behind_a_write():
+    cache = QueryCache()
+    index = bound_index(cache)
+    assert index.suggest("gum")["result_size"] == 1
+
+    cache.bump(NAMESPACE)
+    assert index.suggest("gum") is None
+    assert index.stats()["fallbacks"] == 1
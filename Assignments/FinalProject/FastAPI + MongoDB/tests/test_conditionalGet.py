@@ -0,0 +1,60 @@
+import socket
+from types import SimpleNamespace
+
+from pymongo import MongoClient
+from starlette.requests import Request
+
+from cacheBackends import RedisBackend
+from conditionalGet import catalog_etag, conditional, etag_matches
+from queryCache import QueryCache
+from respClient import RespClient
+
+
+def catalog_request(path="/categories", query_string=b"", headers=()):
+    return Request({"type": "http", "method": "GET", "path": path, "query_string": query_string,
+                    "headers": list(headers)})
+
+
+def catalog_handle(cache):
+    # connect=False: only the collection's full_name is used, no server is contacted
+    collection = MongoClient("mongodb://localhost:27017", connect=False)["candy_store"]["categories"]
+    return SimpleNamespace(query_cache=cache, collection=collection)
+
+
+def unused_port():
+    with socket.socket() as sock:
+        sock.bind(("127.0.0.1", 0))
+        return sock.getsockname()[1]
+
+
+def test_etag_ignores_query_parameter_order():
+    handle = catalog_handle(QueryCache())
+    first = catalog_etag(catalog_request("/candies", b"a=1&b=2"), handle)
+    second = catalog_etag(catalog_request("/candies", b"b=2&a=1"), handle)
+    assert first == second
+    assert first != catalog_etag(catalog_request("/candies", b"a=2&b=2"), handle)
+
+
+def test_etag_changes_after_a_write():
+    cache = QueryCache()
+    handle = catalog_handle(cache)
+    before = catalog_etag(catalog_request(), handle)
+    cache.bump(handle.collection.full_name)
+    assert catalog_etag(catalog_request(), handle) != before
+
+
+def test_unreachable_backend_sends_no_etag():
+    backend = RedisBackend(RespClient(f"redis://127.0.0.1:{unused_port()}/0", timeout=0.2))
+    handle = catalog_handle(QueryCache(backend=backend))
+
+    assert catalog_etag(catalog_request(), handle) is None
+    assert conditional(catalog_request(headers=[(b"if-none-match", b"*")]), handle) == (None, None)
+    assert backend.stats()["errors"] > 0
+
+
+def test_etag_matches_weak_and_listed_tags():
+    assert etag_matches('"abc"', 'W/"abc"')
+    assert etag_matches('"abc"', '"x", "abc"')
+    assert etag_matches('"abc"', "*")
+    assert not etag_matches('"abc"', '"abd"')
+    assert not etag_matches('"abc"', None)
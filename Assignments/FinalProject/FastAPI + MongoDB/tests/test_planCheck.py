@@ -0,0 +1,39 @@
+from urllib.parse import urlsplit
+
+import pytest
+
+from mongoManager import MongoManager
+from planCheck import HOT_QUERIES, assert_no_collscan
+from conftest import TEST_DB
+
+
+@pytest.fixture
+def indexed_db(mongo_url):
+    """A scratch database on the real mongod with INDEX_SPECS applied and a few documents."""
+    parts = urlsplit(mongo_url)
+    mm = MongoManager(host=parts.hostname, port=parts.port or 27017, db=TEST_DB)
+    mm.dropDb(TEST_DB)
+    mm.setDb(TEST_DB)
+
+    mm.db["candies"].insert_many([
+        {"id": str(n), "name": f"Candy {n}", "price": float(n), "category": "Retro", "category_id": n % 3}
+        for n in range(50)
+    ])
+    mm.db["users"].insert_one({"email": "someone@example.com"})
+    mm.db["locations"].insert_one({"email": "someone@example.com", "location": {"type": "Point", "coordinates": [0, 0]}})
+
+    report = mm.ensure_indexes()
+    assert not any(entry["errors"] for entry in report.values()), report
+    yield mm
+    mm.dropDb(TEST_DB)
+
+
+def test_hot_queries_use_an_index(indexed_db):
+    plans = assert_no_collscan(indexed_db)
+    assert set(plans) == set(HOT_QUERIES)
+
+
+def test_dropped_index_is_reported(indexed_db):
+    indexed_db.db["users"].drop_indexes()
+    with pytest.raises(AssertionError, match="user by email"):
+        assert_no_collscan(indexed_db)
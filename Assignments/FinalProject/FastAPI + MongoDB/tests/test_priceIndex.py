@@ -0,0 +1,91 @@
+from decimal import Decimal
+
+import pytest
+from bson.decimal128 import Decimal128
+
+from models import ROUTE_FIELDS
+
+np = pytest.importorskip("numpy")
+
+from priceIndex import IndexState, PriceIndex, numeric_price
+
+
+def filled_state(prices, categories=None, capacity=1024):
+    state = IndexState(np, capacity)
+    for key, price in enumerate(prices):
+        state.add(key, {"id": key}, price, categories[key] if categories else 0)
+    state.merge()
+    return state
+
+
+def keys(state, rows):
+    return [state.docs[row]["id"] for row in rows.tolist()]
+
+
+def test_lookup_is_inclusive_and_in_price_order():
+    state = filled_state([5.0, 1.0, 3.0, 3.0, 9.0])
+    assert keys(state, state.lookup(3.0, 5.0)) == [2, 3, 0]
+    assert keys(state, state.lookup(0.0, 0.5)) == []
+    assert keys(state, state.lookup(9.0, 100.0)) == [4]
+
+
+def test_lookup_filters_by_category():
+    state = filled_state([1.0, 2.0, 3.0, 4.0], categories=[7, 8, 7, 8])
+    assert keys(state, state.lookup(0.0, 10.0, 7)) == [0, 2]
+    assert keys(state, state.lookup(0.0, 10.0, 9)) == []
+
+
+def test_dead_rows_are_skipped_before_and_after_a_merge():
+    state = filled_state([1.0, 2.0, 3.0])
+    state.remove(1)
+    assert keys(state, state.lookup(0.0, 10.0)) == [0, 2]
+    assert state.dead == 1
+
+    state.merge()
+    assert keys(state, state.lookup(0.0, 10.0)) == [0, 2]
+    assert len(state.order) == 2
+
+
+def test_delta_rows_are_found_in_price_order_before_a_merge():
+    state = filled_state([1.0, 5.0])
+    # A changed candy: its old row dies, its new version is appended to the delta
+    state.remove(1)
+    state.add(1, {"id": 1}, 2.0, 0)
+    state.add(2, {"id": 2}, 4.0, 0)
+    assert state.delta
+    assert keys(state, state.lookup(0.0, 10.0)) == [0, 1, 2]
+
+    # A delta row can die before it is ever merged
+    state.remove(2)
+    assert keys(state, state.lookup(0.0, 10.0)) == [0, 1]
+
+    state.merge()
+    assert state.delta == []
+    assert keys(state, state.lookup(0.0, 10.0)) == [0, 1]
+
+
+def test_columns_grow_past_their_capacity():
+    state = filled_state([float(n) for n in range(10)], capacity=2)
+    assert keys(state, state.lookup(2.5, 5.0)) == [3, 4, 5]
+
+
+def test_numeric_price():
+    assert numeric_price(3) == 3.0
+    assert numeric_price(Decimal128(Decimal("1.25"))) == 1.25
+    assert numeric_price(True) is None
+    assert numeric_price("3.00") is None
+    assert numeric_price(None) is None
+
+
+def test_price_range_skips_unpriced_candies():
+    index = PriceIndex(ROUTE_FIELDS["/candies/price"])
+    index.load([
+        {"_id": 1, "id": "a", "name": "A", "price": 2.5, "category_id": 1},
+        {"_id": 2, "id": "b", "name": "B", "price": "free", "category_id": 1},
+        {"_id": 3, "id": "c", "name": "C", "price": 1.5},
+    ])
+
+    result = index.price_range(1.0, 3.0)
+    assert [doc["name"] for doc in result["data"]] == ["C", "A"]
+    assert result == {"success": True, "result_size": 2, "data": result["data"], "source": "price_index"}
+    assert index.price_range(1.0, 3.0, category_id=1)["result_size"] == 1
@@ -0,0 +1,52 @@
+import asyncio
+
+from asyncMongoManager import AsyncMongoManager
+from mongoManager import MongoManager
+from queryCache import QueryCache
+from conftest import TEST_DB
+
+
+def test_key_depends_on_kind():
+    cache = QueryCache()
+    find_args = {"query": {}, "projection": None, "strip": set(), "sort": [("_id", 1)], "skip": 0, "limit": 2,
+                 "raw": True}
+    assert cache.key("db.candies", find_args) != cache.key("db.candies", find_args, kind="async find")
+
+
+def test_sync_and_async_reads_share_one_cache(mock_clients):
+    cache = QueryCache()
+    candies = MongoManager(db=TEST_DB, query_cache=cache).collection_for("candies")
+    async_candies = AsyncMongoManager(db=TEST_DB, query_cache=cache).collection_for("candies")
+    candies.collection.insert_many([{"id": str(n), "price": n} for n in range(5)])
+
+    read = {"query": {}, "sort_criteria": [("_id", 1)], "limit": 2, "raw": True, "cache": True}
+    for _ in range(2):
+        first = asyncio.run(async_candies.get(**read))
+        second = candies.get(**read)
+        third = asyncio.run(async_candies.get(**read))
+
+        assert first["success"] and second["success"] and third["success"]
+        assert [doc["id"] for doc in second["data"]] == ["0", "1"]
+        assert first["data"] == second["data"] == third["data"]
+        assert second["next_token"] is not None
+        assert "next_token" not in third
+
+    assert cache.stats()["hits"] >= 4
+
+
+def test_add_location_invalidates_the_locations_collection(mock_clients):
+    cache = QueryCache()
+    mm = MongoManager(db=TEST_DB, query_cache=cache)
+    amm = AsyncMongoManager(db=TEST_DB, query_cache=cache)
+    candies = mm.collection_for("candies").collection.full_name
+    locations = mm.collection_for("locations").collection.full_name
+
+    # Called through an unrelated handle, the write still lands in (and bumps) locations only
+    before = cache.generation(candies), cache.generation(locations)
+    assert mm.collection_for("candies").add_location("a@example.com", 1.0, 2.0, "now")["success"]
+    assert asyncio.run(amm.collection_for("candies").add_location("b@example.com", 1.0, 2.0, "now"))["success"]
+
+    assert cache.generation(candies) == before[0]
+    assert cache.generation(locations) == before[1] + 2
+    assert mm.db["locations"].count_documents({}) == 2
+    assert mm.db["candies"].count_documents({}) == 0
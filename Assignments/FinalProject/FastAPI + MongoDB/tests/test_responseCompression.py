@@ -0,0 +1,114 @@
+import gzip
+import json
+
+import pytest
+from starlette.applications import Starlette
+from starlette.responses import JSONResponse, Response, StreamingResponse
+from starlette.routing import Route
+from starlette.testclient import TestClient
+
+import responseCompression
+from responseCompression import (CompressionMiddleware, StreamCompressor, is_precompressed, negotiate,
+                                 route_quality)
+
+
+@pytest.fixture
+def gzip_only(monkeypatch):
+    monkeypatch.setattr(responseCompression, "brotli", None)
+
+
+def test_negotiate_honours_q_values(gzip_only):
+    assert negotiate("gzip, deflate") == "gzip"
+    assert negotiate("gzip;q=0") is None
+    assert negotiate("identity") is None
+    assert negotiate("*") == "gzip"
+    assert negotiate("*;q=0.5, gzip;q=0") is None
+    assert negotiate("gzip;q=bogus") is None
+    assert negotiate("") is None
+
+
+def test_negotiate_prefers_the_higher_weight():
+    pytest.importorskip("brotli")
+    assert negotiate("gzip, br") == "br"
+    assert negotiate("gzip;q=1.0, br;q=0.5") == "gzip"
+    assert negotiate("br;q=0, *") == "gzip"
+    assert negotiate("GZIP;q=0.2, BR;q=0.1") == "gzip"
+
+
+def test_route_quality_uses_the_longest_prefix():
+    assert route_quality("/candies/search") == (4, 4)
+    assert route_quality("/async/candies/facets") == (5, 5)
+    assert route_quality("/candies") == (6, 5)
+
+
+def test_only_whole_catalog_views_are_precompressed():
+    assert is_precompressed("/candies")
+    assert is_precompressed("/async/categories")
+    assert is_precompressed("/candies/category/Gummy Candy")
+    assert not is_precompressed("/candies", b"limit=10")
+    assert not is_precompressed("/candies/search")
+
+
+def test_stream_compressor_output_decodes_chunk_by_chunk(gzip_only):
+    compressor = StreamCompressor("gzip", (6, 5))
+    first = compressor.chunk(b'{"a": 1}\n')
+    rest = compressor.chunk(b'{"b": 2}\n') + compressor.finish()
+    assert gzip.decompress(first + rest) == b'{"a": 1}\n{"b": 2}\n'
+
+
+BIG = {"data": [{"name": f"Candy {n}", "price": n} for n in range(200)]}
+
+
+def catalog(request):
+    etag = '"v1"'
+    if request.headers.get("if-none-match") == etag:
+        return Response(status_code=304, headers={"ETag": etag})
+    return JSONResponse(BIG, headers={"ETag": etag})
+
+
+def small(request):
+    return JSONResponse({"ok": True}, headers={"ETag": '"s1"'})
+
+
+def stream(request):
+    return StreamingResponse(iter([b'{"a": 1}\n', b'{"b": 2}\n']), media_type="application/x-ndjson")
+
+
+@pytest.fixture
+def client(gzip_only):
+    app = Starlette(routes=[Route("/catalog", catalog), Route("/small", small), Route("/stream", stream)])
+    return TestClient(CompressionMiddleware(app, minimum_size=512))
+
+
+def test_large_bodies_are_compressed_with_a_weak_etag(client):
+    response = client.get("/catalog", headers={"Accept-Encoding": "gzip"})
+    assert response.headers["content-encoding"] == "gzip"
+    assert response.headers["etag"] == 'W/"v1"'
+    assert response.headers["vary"] == "Accept-Encoding"
+    assert response.json() == BIG
+
+
+def test_304_repeats_the_weak_etag(client):
+    response = client.get("/catalog", headers={"Accept-Encoding": "gzip", "If-None-Match": '"v1"'})
+    assert response.status_code == 304
+    assert response.headers["etag"] == 'W/"v1"'
+    assert response.headers["vary"] == "Accept-Encoding"
+
+
+def test_small_bodies_are_sent_as_they_are(client):
+    response = client.get("/small", headers={"Accept-Encoding": "gzip"})
+    assert "content-encoding" not in response.headers
+    assert response.headers["etag"] == 'W/"s1"'
+    assert response.headers["vary"] == "Accept-Encoding"
+
+
+def test_identity_clients_keep_the_strong_etag(client):
+    response = client.get("/catalog", headers={"Accept-Encoding": "identity"})
+    assert "content-encoding" not in response.headers
+    assert response.headers["etag"] == '"v1"'
+
+
+def test_streams_are_compressed(client):
+    response = client.get("/stream", headers={"Accept-Encoding": "gzip"})
+    assert response.headers["content-encoding"] == "gzip"
+    assert [json.loads(line) for line in response.text.splitlines()] == [{"a": 1}, {"b": 2}]
@@ -0,0 +1,88 @@
+from models import ROUTE_FIELDS
+from searchIndex import FUZZY_EXPANSIONS, SearchIndex, SearchState, tokenize, trigrams, weighted_terms
+
+
+CANDIES = [
+    {"_id": 1, "id": "1", "name": "Sour Patch Kids", "category": "Gummy Candy"},
+    {"_id": 2, "id": "2", "name": "Sour Gummy Worms", "category": "Gummy Candy"},
+    {"_id": 3, "id": "3", "name": "Lemon Heads", "category": "Sour Candy"},
+    {"_id": 4, "id": "4", "name": "Reese's Peanut Butter Cups", "category": "Chocolate Candy"},
+    {"_id": 5, "id": "5", "name": "Gummy Bears", "category": "Gummy Candy"},
+]
+
+
+def loaded_index(candies=CANDIES):
+    index = SearchIndex(ROUTE_FIELDS["/candies/search"])
+    index.load(candies)
+    return index
+
+
+def ids(result):
+    return [doc["id"] for doc in result["data"]]
+
+
+def test_tokenize_drops_accents_apostrophes_and_punctuation():
+    assert tokenize("Reese's Crème-Brûlée!") == ["reeses", "creme", "brulee"]
+    assert tokenize(None) == []
+
+
+def test_trigrams_are_padded_like_pg_trgm():
+    assert trigrams("ab") == {"  a", " ab", "ab "}
+
+
+def test_name_terms_outweigh_category_terms():
+    terms = weighted_terms({"name": "Sour Worms", "category": "Sour Candy"})
+    assert terms["sour"] == 3
+    assert terms["worms"] == 2
+    assert terms["candy"] == 1
+
+
+def test_expand_prefers_exact_terms_then_similar_ones():
+    state = SearchState()
+    for candy in CANDIES:
+        state.add(candy["_id"], candy, weighted_terms(candy))
+
+    assert state.expand("gummy") == [("gummy", 1.0)]
+    expanded = state.expand("gumy")
+    assert expanded[0][0] == "gummy"
+    assert len(expanded) <= FUZZY_EXPANSIONS
+    assert all(0 < weight < 1 for _, weight in expanded)
+    # Too short to match fuzzily
+    assert state.expand("zz") == []
+
+
+def test_name_matches_rank_above_category_matches():
+    result = loaded_index().search("sour")
+    assert ids(result)[-1] == "3"
+    assert set(ids(result)) == {"1", "2", "3"}
+
+
+def test_candies_matching_more_tokens_rank_first():
+    result = loaded_index().search("sour gumy worms")
+    assert ids(result)[0] == "2"
+    assert result["matched"]["worms"] == ["worms"]
+    assert "gummy" in result["matched"]["gumy"]
+
+
+def test_apostrophes_do_not_matter():
+    assert ids(loaded_index().search("reeses"))[0] == "4"
+    assert ids(loaded_index().search("Reese's"))[0] == "4"
+
+
+def test_pages_report_the_total():
+    index = loaded_index()
+    everything = index.search("gummy", limit=20)
+    page = index.search("gummy", limit=1, offset=1)
+    assert page["result_size"] == everything["result_size"] == 3
+    assert ids(page) == ids(everything)[1:2]
+    assert (page["limit"], page["offset"], page["source"]) == (1, 1, "search_index")
+
+
+def test_removed_candies_leave_no_terms_behind():
+    state = SearchState()
+    candy = CANDIES[3]
+    state.add(candy["_id"], candy, weighted_terms(candy))
+    state.remove(candy["_id"])
+    assert state.docs == {}
+    assert not state.postings and not state.trigram_count and not state.trigram_terms
+    assert state.total_length == 0
@@ -0,0 +1,60 @@
+from models import ROUTE_FIELDS
+from suggestIndex import SuggestIndex, SuggestState, name_key, prefix_key
+
+
+NAMES = ["Kit Kat", "Kit Kat Big", "Kitty Chews", "Gummy Worms", "Sour Gummy Worms", "Worms Alive", "Gumballs"]
+
+
+def loaded_index(names=NAMES):
+    index = SuggestIndex(ROUTE_FIELDS["/candies/suggest"])
+    index.load([{"_id": n, "id": str(n), "name": name} for n, name in enumerate(names)])
+    return index
+
+
+def names(result):
+    return [doc["name"] for doc in result["data"]]
+
+
+def test_prefix_key_keeps_a_trailing_word_break():
+    assert name_key("Reese's  Pieces!") == "reeses pieces"
+    assert prefix_key("Kit Kat") == "kit kat"
+    assert prefix_key("kit kat ") == "kit kat "
+    assert prefix_key("!!") == ""
+
+
+def test_name_starts_come_before_word_starts():
+    assert names(loaded_index().suggest("gum")) == ["Gumballs", "Gummy Worms", "Sour Gummy Worms"]
+    assert names(loaded_index().suggest("worms")) == ["Worms Alive", "Gummy Worms", "Sour Gummy Worms"]
+
+
+def test_trailing_space_matches_whole_words_only():
+    assert names(loaded_index().suggest("kit ")) == ["Kit Kat", "Kit Kat Big"]
+    assert names(loaded_index().suggest("kit kat ")) == ["Kit Kat", "Kit Kat Big"]
+    assert names(loaded_index().suggest("worms ")) == ["Worms Alive", "Gummy Worms", "Sour Gummy Worms"]
+
+
+def test_limit_and_empty_prefix():
+    assert names(loaded_index().suggest("k", limit=2)) == ["Kit Kat", "Kit Kat Big"]
+    assert loaded_index().suggest("?")["data"] == []
+
+
+def test_shared_names_are_one_suggestion_until_the_last_is_removed():
+    state = SuggestState()
+    state.add(1, {"id": "1"}, "kit kat")
+    state.add(2, {"id": "2"}, "kit kat")
+    state.finish()
+    assert state.lookup("kit", 10) == ["kit kat"]
+
+    state.remove(1)
+    assert state.lookup("kat", 10) == ["kit kat"]
+    state.remove(2)
+    assert state.lookup("kit", 10) == [] and state.words == []
+
+
+def test_added_names_stay_sorted_after_a_build():
+    state = SuggestState()
+    state.add(1, {}, "gummy worms")
+    state.finish()
+    state.add(2, {}, "gum drops")
+    assert state.names == ["gum drops", "gummy worms"]
+    assert state.lookup("gum", 10) == ["gum drops", "gummy worms"]